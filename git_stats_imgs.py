@@ -4,11 +4,27 @@
 Generates images for visualizing GitHub repository statistics
 """
 
-from src.generate_images import GenerateImages
+from os import getenv
 
 
 def main():
-    GenerateImages()
+    # only the modules of the mode run are imported, for a fast startup
+    if getenv("BATCH_USERS"):
+        from src.batch import BatchGenerateImages
+
+        BatchGenerateImages()
+    elif getenv("DAEMON_INTERVAL"):
+        from src.daemon import DaemonGenerateImages
+
+        DaemonGenerateImages()
+    elif getenv("SERVER_PORT"):
+        from src.badge_server import serve
+
+        serve()
+    else:
+        from src.generate_images import GenerateImages
+
+        GenerateImages()
 
 
 if __name__ == "__main__":
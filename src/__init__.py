@@ -1,8 +1,31 @@
 __all__ = [
+    "badge_server",
+    "batch",
+    "cassette",
+    "checkpoint",
+    "cost_estimate",
+    "daemon",
     "db",
+    "deadline_stats",
     "env_vars",
     "generate_images",
     "github_api_queries",
+    "github_org_stats",
     "github_repo_stats",
+    "hyperloglog",
+    "json_file",
+    "repo_filter",
+    "request_metrics",
+    "shard",
+    "stats_artifact",
+    "stats_client",
+    "stats_history",
+    "stats_partial",
+    "stats_plan",
+    "svg_template",
     "templates",
+    "token_pool",
+    "trace_events",
+    "webhooks",
+    "weekly_changes",
 ]
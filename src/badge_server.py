@@ -0,0 +1,264 @@
+#!/usr/bin/python3
+
+from aiohttp import web
+from collections import OrderedDict
+from gzip import compress
+from hashlib import sha256
+from json import loads
+from os import getenv
+from os.path import getmtime, join
+from time import monotonic, time_ns
+from typing import Dict, List, Optional, Tuple
+
+from src.generate_images import (
+    GenerateImages,
+    TEMPLATE_PATH,
+    OVERVIEW_FILE_NAME,
+    LANGUAGES_FILE_NAME,
+    DEFAULT_ARTIFACT_PATH,
+    find_files,
+)
+from src.stats_artifact import StatsArtifact
+from src.stats_plan import IMAGE_FIELDS
+from src.svg_template import SvgTemplate, THEMES, DEFAULT_THEME
+from src.webhooks import (
+    DEFAULT_WEBHOOK_DIR,
+    WEBHOOK_EVENTS,
+    WebhookEvent,
+    verify_signature,
+)
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8080
+DEFAULT_CACHE_SIZE = 1024  # rendered badges kept in memory
+DEFAULT_MAX_AGE = 300  # seconds clients and proxies may cache badges for
+SNAPSHOT_CHECK_INTERVAL = 1.0  # seconds between checks for newer snapshots
+IMAGES = {
+    "overview": OVERVIEW_FILE_NAME,
+    "languages": LANGUAGES_FILE_NAME,
+}
+
+###############################################################################
+# RenderedBadge class
+###############################################################################
+
+
+class RenderedBadge(object):
+    """
+    A rendered badge with its gzip compressed body and strong ETag, computed
+    once when rendered instead of per request
+    """
+
+    __slots__ = ("body", "gzipped_body", "etag")
+
+    def __init__(self, svg: str):
+        self.body = svg.encode("utf-8")
+        self.gzipped_body = compress(self.body, compresslevel=9)
+        self.etag = f'"{sha256(self.body).hexdigest()[:32]}"'
+
+
+###############################################################################
+# BadgeServer class
+###############################################################################
+
+
+class BadgeServer(object):
+    """
+    HTTP server rendering badges from the latest stats artifacts of one or
+    more users, keeping recently rendered badges in a bounded LRU cache keyed
+    by user, image, theme and artifact, so most requests are answered from
+    memory, or with 304 Not Modified if the client's copy is current.
+
+    Badges are served at /<user>/overview.svg and /<user>/languages.svg, and
+    at /overview.svg and /languages.svg if there is only one user, with the
+    theme set by the theme query parameter, e.g. ?theme=monochrome.
+
+    With a webhook secret, signed GitHub webhook events posted to /webhook are
+    recorded for the next run to update the saved stats with.
+    """
+
+    def __init__(
+        self,
+        artifact_paths: List[str],
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        max_age: int = DEFAULT_MAX_AGE,
+        webhook_secret: Optional[str] = None,
+        webhook_dir: str = DEFAULT_WEBHOOK_DIR,
+    ):
+        """
+        :param artifact_paths: paths of the stats artifacts of the users
+        :param cache_size: maximum number of rendered badges to keep in memory
+        :param max_age: seconds clients and proxies may cache badges for
+        :param webhook_secret: secret webhooks are signed with, to receive
+        webhook events, if any
+        :param webhook_dir: directory to record received webhook events in
+        """
+        self.__cache: "OrderedDict[Tuple, RenderedBadge]" = OrderedDict()
+        self.__cache_size = cache_size
+        self.__cache_control = f"public, max-age={max_age}"
+        self.__webhook_secret = webhook_secret
+        self.__webhook_dir = webhook_dir
+
+        # path, modification time, time last checked and artifact, by user
+        self.__snapshots: Dict[str, List] = dict()
+        for path in artifact_paths:
+            artifact = StatsArtifact.load(path)
+            self.__snapshots[artifact.username] = [
+                path,
+                getmtime(path),
+                monotonic(),
+                artifact,
+            ]
+        if not self.__snapshots:
+            raise RuntimeError("No stats artifacts found to serve badges from")
+
+    def snapshot(self, user: str) -> Optional[StatsArtifact]:
+        """
+        :param user: username of the stats artifact
+        :return: the latest stats artifact of the user, reloaded if its file
+        has been replaced since last checked, if any
+        """
+        snapshot = self.__snapshots.get(user)
+        if snapshot is None:
+            return None
+        path, mtime, checked, artifact = snapshot
+        now = monotonic()
+        if now - checked >= SNAPSHOT_CHECK_INTERVAL:
+            snapshot[2] = now
+            try:
+                new_mtime = getmtime(path)
+                if new_mtime != mtime:
+                    snapshot[3] = StatsArtifact.load(path)
+                    snapshot[1] = new_mtime
+            except (OSError, ValueError) as e:
+                print(f"Keeping previous stats of {user}, failed to reload: {e}")
+        return snapshot[3]
+
+    async def badge(self, user: str, image: str, theme: str) -> Optional[RenderedBadge]:
+        """
+        :param user: username of the stats artifact
+        :param image: name of the image, overview or languages
+        :param theme: name of the theme to render the image in
+        :return: the rendered badge, from the cache if rendered before, if any
+        """
+        artifact = self.snapshot(user)
+        if artifact is None:
+            return None
+
+        key = (user, image, theme, artifact.generated_at)
+        badge = self.__cache.get(key)
+        if badge is not None:
+            self.__cache.move_to_end(key)
+            return badge
+
+        # images of stats saved without the fields they use are not found
+        if not all(artifact.has_field(field) for field in IMAGE_FIELDS[image]):
+            return None
+
+        generator = GenerateImages(stats=artifact, username=user)
+        values = await (
+            generator.overview_values()
+            if image == "overview"
+            else generator.languages_values()
+        )
+        template = SvgTemplate.load(f"{TEMPLATE_PATH}{IMAGES[image]}")
+        badge = RenderedBadge(template.render(values, theme))
+
+        self.__cache[key] = badge
+        if len(self.__cache) > self.__cache_size:
+            self.__cache.popitem(last=False)
+        return badge
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """
+        :param request: request for a badge
+        :return: the badge, 304 Not Modified if the client has it, or 404
+        """
+        user = request.match_info.get("user")
+        if user is None and len(self.__snapshots) == 1:
+            user = next(iter(self.__snapshots))
+        image = request.match_info["image"]
+        theme = request.query.get("theme", DEFAULT_THEME)
+        if image not in IMAGES or theme not in THEMES:
+            raise web.HTTPNotFound()
+
+        badge = await self.badge(user, image, theme)
+        if badge is None:
+            raise web.HTTPNotFound()
+
+        headers = {
+            "ETag": badge.etag,
+            "Cache-Control": self.__cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if badge.etag in request.headers.get("If-None-Match", ""):
+            return web.Response(status=304, headers=headers)
+
+        headers["Content-Type"] = "image/svg+xml; charset=utf-8"
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            return web.Response(body=badge.gzipped_body, headers=headers)
+        return web.Response(body=badge.body, headers=headers)
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        """
+        :param request: webhook event delivered by GitHub
+        :return: 202 Accepted once the event is recorded, 204 No Content if
+        the event does not change stats, or 401 if not signed with the secret
+        """
+        body = await request.read()
+        if not verify_signature(
+            self.__webhook_secret, body, request.headers.get("X-Hub-Signature-256")
+        ):
+            raise web.HTTPUnauthorized()
+
+        event = request.headers.get("X-GitHub-Event", "")
+        if event not in WEBHOOK_EVENTS:
+            return web.Response(status=204)
+        try:
+            payload = loads(body)
+        except ValueError:
+            raise web.HTTPBadRequest()
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest()
+
+        # named by the time received, so events are applied in order
+        WebhookEvent(event, payload, request.headers.get("X-GitHub-Delivery")).save(
+            join(self.__webhook_dir, f"{time_ns():020d}-{event}.json")
+        )
+        return web.Response(status=202)
+
+    def app(self) -> web.Application:
+        """
+        :return: web application serving the badges, and receiving webhook
+        events if a webhook secret is set
+        """
+        app = web.Application()
+        app.router.add_get("/{image}.svg", self.handle)
+        app.router.add_get("/{user}/{image}.svg", self.handle)
+        if self.__webhook_secret:
+            app.router.add_post("/webhook", self.handle_webhook)
+        return app
+
+
+def serve() -> None:
+    """
+    Serve badges from the stats artifacts configured by environment variables
+    """
+    try:
+        port = int(getenv("SERVER_PORT") or DEFAULT_PORT)
+        cache_size = int(getenv("SERVER_CACHE_SIZE") or DEFAULT_CACHE_SIZE)
+        max_age = int(getenv("SERVER_MAX_AGE") or DEFAULT_MAX_AGE)
+    except ValueError:
+        raise RuntimeError(
+            "Environment variables SERVER_PORT, SERVER_CACHE_SIZE and "
+            "SERVER_MAX_AGE must be integers if set"
+        )
+    server = BadgeServer(
+        find_files(getenv("STATS_ARTIFACT"), DEFAULT_ARTIFACT_PATH),
+        cache_size=cache_size,
+        max_age=max_age,
+        webhook_secret=getenv("WEBHOOK_SECRET"),
+        webhook_dir=getenv("WEBHOOK_DIR") or DEFAULT_WEBHOOK_DIR,
+    )
+    web.run_app(server.app(), host=getenv("SERVER_HOST") or DEFAULT_HOST, port=port)
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+
+from asyncio import Semaphore, gather, run
+from json import load
+from os import getenv
+from os.path import join
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, List
+
+from src.env_vars import EnvironmentVariables
+from src.generate_images import (
+    GenerateImages,
+    OUTPUT_DIR,
+    parse_themes,
+    parse_window,
+    plan_window,
+)
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.request_metrics import RequestMetrics
+from src.stats_plan import StatsPlan
+from src.trace_events import Tracer
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+DEFAULT_MAX_CONNECTIONS = 20  # concurrent connections shared by all users
+DEFAULT_MAX_USERS = 10  # users whose stats are generated concurrently
+DB_FILE_NAME = "db.json"  # per user, stored in the user's output directory
+
+###############################################################################
+# BatchGenerateImages class
+###############################################################################
+
+
+class BatchGenerateImages(object):
+    """
+    Generate images for many users in one process, sharing one connection
+    pool, one bound on concurrent connections and one response cache, while
+    each user has their own stats, db and output directory.
+    """
+
+    def __init__(self):
+        users_path = getenv("BATCH_USERS")
+        if not users_path:
+            raise RuntimeError("Environment variable BATCH_USERS must be set")
+
+        # JSON list of objects with a username, an access_token and, optionally,
+        # any other EnvironmentVariables arguments, e.g. "exclude_repos"
+        with open(users_path, "r") as f:
+            self.__users: List[Dict[str, str]] = load(f)
+
+        for user in self.__users:
+            if not user.get("username") or not user.get("access_token"):
+                raise RuntimeError(
+                    f"Each user in {users_path} requires a username and access_token"
+                )
+
+        try:
+            self.__max_connections = int(
+                getenv("BATCH_MAX_CONNECTIONS") or DEFAULT_MAX_CONNECTIONS
+            )
+            self.__max_users = int(getenv("BATCH_MAX_USERS") or DEFAULT_MAX_USERS)
+        except ValueError:
+            raise RuntimeError(
+                "Environment variables BATCH_MAX_CONNECTIONS and BATCH_MAX_USERS "
+                "must be integers if set"
+            )
+        self.__themes = parse_themes(getenv("THEMES"))
+        self.__window = parse_window(getenv("STATS_WINDOW"))
+        self.__plan = plan_window(StatsPlan.parse(getenv("STATS")), self.__window)
+        self.__metrics_path = getenv("METRICS_PATH")
+        self.__prometheus_path = getenv("METRICS_PROMETHEUS_PATH")
+        self.__trace_path = getenv("TRACE_PATH")
+        self.__tracer = Tracer(enabled=bool(self.__trace_path))
+
+        run(self.start())
+
+    async def start(self) -> None:
+        """
+        Main function: generate all badges for all users
+        """
+        from aiohttp import ClientSession, TCPConnector
+
+        semaphore = Semaphore(self.__max_connections)
+        user_semaphore = Semaphore(self.__max_users)
+        cache = dict()
+        metrics = RequestMetrics()
+
+        start = perf_counter()
+        async with ClientSession(
+            connector=TCPConnector(limit=self.__max_connections)
+        ) as session:
+            results = await gather(
+                *[
+                    self.generate_user(
+                        user, session, semaphore, user_semaphore, cache, metrics
+                    )
+                    for user in self.__users
+                ],
+                return_exceptions=True,
+            )
+        elapsed = perf_counter() - start
+        metrics.save(self.__metrics_path, self.__prometheus_path)
+        self.__tracer.save(self.__trace_path)
+
+        num_generated = 0
+        for user, result in zip(self.__users, results):
+            if isinstance(result, BaseException):
+                print(f"Failed to generate images for {user['username']}: {result}")
+            else:
+                num_generated += 1
+
+        print(
+            f"Generated images for {num_generated} of {len(self.__users)} users "
+            f"in {elapsed:0.1f}s ({num_generated / elapsed * 60:0.1f} users per minute)"
+        )
+
+    async def generate_user(
+        self,
+        user: Dict[str, str],
+        session: "ClientSession",
+        semaphore: Semaphore,
+        user_semaphore: Semaphore,
+        cache: Dict,
+        metrics: RequestMetrics,
+    ) -> None:
+        """
+        Generate all badges for one user in the user's own output directory
+        """
+        async with user_semaphore:
+            username = user["username"]
+            access_token = user["access_token"]
+            options = {
+                k: v for k, v in user.items() if k not in ("username", "access_token")
+            }
+            output_dir = join(OUTPUT_DIR, username)
+
+            environment_vars = EnvironmentVariables.from_env(
+                username=username,
+                access_token=access_token,
+                db_path=join(output_dir, DB_FILE_NAME),
+                **options,
+            )
+            queries = GitHubApiQueries(
+                username=username,
+                access_token=access_token,
+                session=session,
+                semaphore=semaphore,
+                cache=cache,
+                metrics=metrics,
+                tracer=self.__tracer,
+            )
+            stats = GitHubRepoStats(
+                environment_vars=environment_vars,
+                session=session,
+                queries=queries,
+                weekly_changes="weekly_changes" in self.__plan.fields,
+            )
+            await GenerateImages(
+                stats=stats,
+                username=username,
+                output_dir=output_dir,
+                themes=self.__themes,
+                plan=self.__plan,
+                tracer=self.__tracer,
+                window=self.__window,
+            ).render()
+            environment_vars.commit()
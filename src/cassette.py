@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+
+from asyncio import sleep
+from datetime import datetime, timezone
+from hashlib import sha1
+from json import dumps, loads
+from time import monotonic
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from src.json_file import read_json_file, write_json_file
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+CASSETTE_VERSION = 1  # increment when the layout of recorded exchanges changes
+DEFAULT_CASSETTE_PATH = "cassette.json.gz"
+RECORD = "record"  # record the exchanges of a run with the API
+REPLAY = "replay"  # answer the requests of a run with recorded exchanges
+CASSETTE_MODES = (RECORD, REPLAY)
+# response headers read by GitHubApiQueries, the only ones recorded
+RECORDED_HEADERS = (
+    "Content-Type",
+    "ETag",
+    "Retry-After",
+    "X-RateLimit-Limit",
+    "X-RateLimit-Remaining",
+    "X-RateLimit-Reset",
+    "X-RateLimit-Resource",
+)
+
+###############################################################################
+# CassetteResponse class
+###############################################################################
+
+
+class CassetteResponse(object):
+    """
+    Recorded response replayed in place of an aiohttp response, with the
+    attributes and methods of one that GitHubApiQueries uses
+    """
+
+    def __init__(self, status: int, headers: Dict[str, str], body: str):
+        self.status = status
+        from multidict import CIMultiDict
+
+        self.headers = CIMultiDict(headers)
+        self.__body = body
+
+    async def read(self) -> bytes:
+        return self.__body.encode("utf-8")
+
+    async def json(self) -> Any:
+        return loads(self.__body) if self.__body else None
+
+
+###############################################################################
+# Cassette class
+###############################################################################
+
+
+class Cassette(object):
+    """
+    Exchanges of a run with the GitHub APIs, recorded into a compact gzip
+    compressed file so runs can be replayed without the network, e.g. to
+    profile and optimize GitHubRepoStats offline against production-shaped
+    data, or to reproduce rendering bugs without spending API budget.
+    Requests are matched by method, path, parameters and GraphQL query, and
+    repeated requests, e.g. after 202 Accepted, are answered in the order
+    recorded. Tokens and request headers are never recorded.
+    """
+
+    def __init__(self, api_url: str, exchanges: Optional[List[Dict]] = None):
+        """
+        :param api_url: base URL of the API, stripped from recorded paths
+        :param exchanges: exchanges recorded so far
+        """
+        self.api_url = api_url
+        self.exchanges: List[Dict[str, Any]] = exchanges or []
+        self.__replays: Dict[str, List[Dict[str, Any]]] = dict()
+        for exchange in self.exchanges:
+            self.__replays.setdefault(exchange["key"], []).append(exchange)
+        # index of the next replayed exchange of each key
+        self.__positions: Dict[str, int] = dict()
+
+    def key(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Iterable[Tuple[str, Any]]],
+        json: Optional[Dict],
+    ) -> str:
+        """
+        :return: key of a request, e.g. GET repos/owner/name/collaborators, with
+        the hash of the GraphQL query
+        """
+        path = url[len(self.api_url) :] if url.startswith(self.api_url) else url
+        key = f"{method} {path}"
+        if params:
+            key += "?" + urlencode(sorted((k, str(v)) for k, v in params))
+        if json is not None:
+            key += " " + sha1(dumps(json, sort_keys=True).encode()).hexdigest()[:16]
+        return key
+
+    def record(
+        self, key: str, status: int, headers, body: bytes, elapsed: float
+    ) -> None:
+        """
+        :param key: key of the request
+        :param status: status of the response
+        :param headers: headers of the response
+        :param body: body of the response
+        :param elapsed: seconds taken to receive the response
+        """
+        self.exchanges.append(
+            {
+                "key": key,
+                "status": status,
+                "headers": {
+                    name: headers[name] for name in RECORDED_HEADERS if name in headers
+                },
+                "body": body.decode("utf-8", errors="replace"),
+                "elapsed": round(elapsed, 4),
+            }
+        )
+
+    async def replay(self, key: str, speed: float) -> CassetteResponse:
+        """
+        :param key: key of the request
+        :param speed: factor of the recorded time to wait before answering,
+        1 for the recorded timing, 0 to answer at once
+        :return: the next recorded response of the request, the last if all
+        have been replayed
+        """
+        exchanges = self.__replays.get(key)
+        if not exchanges:
+            raise KeyError(f"No exchange recorded for request {key}")
+        position = self.__positions.get(key, 0)
+        self.__positions[key] = position + 1
+        exchange = exchanges[min(position, len(exchanges) - 1)]
+        if speed > 0:
+            await sleep(exchange["elapsed"] * speed)
+        return CassetteResponse(
+            exchange["status"], exchange["headers"], exchange["body"]
+        )
+
+    @classmethod
+    def load(cls, path: str, api_url: str) -> "Cassette":
+        """
+        :param path: path of the cassette, gzip compressed if it ends in .gz
+        :param api_url: base URL of the API requests are replayed for, which
+        may differ from that recorded with
+        :return: the recorded exchanges
+        """
+        data = read_json_file(path)
+        version = data.get("version")
+        if version != CASSETTE_VERSION:
+            raise ValueError(
+                f"Unsupported cassette version {version} "
+                f"(expected {CASSETTE_VERSION})"
+            )
+        return cls(api_url, data["exchanges"])
+
+    def save(self, path: str) -> None:
+        """
+        Atomically writes the recorded exchanges
+        :param path: path of the cassette, gzip compressed if it ends in .gz
+        """
+        write_json_file(
+            path,
+            dumps(
+                {
+                    "version": CASSETTE_VERSION,
+                    "api_url": self.api_url,
+                    "recorded_at": datetime.now(timezone.utc).isoformat(),
+                    "exchanges": self.exchanges,
+                },
+                separators=(",", ":"),
+            ),
+        )
+
+
+###############################################################################
+# RecordingSession class
+###############################################################################
+
+
+class RecordingSession(object):
+    """
+    Session making the requests of GitHubApiQueries with an aiohttp session,
+    recording each exchange into a cassette
+    """
+
+    def __init__(self, session: "ClientSession", cassette: Cassette):
+        self.__session = session
+        self.__cassette = cassette
+
+    async def __request(self, method: str, url: str, params, json, request) -> Any:
+        start = monotonic()
+        response = await request
+        # the body is kept by the response, to be read again by the queries
+        body = await response.read()
+        self.__cassette.record(
+            self.__cassette.key(method, url, params, json),
+            response.status,
+            response.headers,
+            body,
+            monotonic() - start,
+        )
+        return response
+
+    async def get(self, url: str, headers=None, params=None) -> Any:
+        request = self.__session.get(url, headers=headers, params=params)
+        return await self.__request("GET", url, params, None, request)
+
+    async def post(self, url: str, headers=None, json=None) -> Any:
+        request = self.__session.post(url, headers=headers, json=json)
+        return await self.__request("POST", url, None, json, request)
+
+
+###############################################################################
+# ReplayingSession class
+###############################################################################
+
+
+class ReplayingSession(object):
+    """
+    Session answering the requests of GitHubApiQueries with the exchanges
+    recorded in a cassette, without the network
+    """
+
+    def __init__(self, cassette: Cassette, speed: float = 1.0):
+        """
+        :param cassette: the recorded exchanges
+        :param speed: factor of the recorded time taken by each response,
+        e.g. 1 for the recorded timing, 0.5 for twice as fast, 0 for no wait
+        """
+        self.__cassette = cassette
+        self.__speed = speed
+
+    async def get(self, url: str, headers=None, params=None) -> CassetteResponse:
+        key = self.__cassette.key("GET", url, params, None)
+        return await self.__cassette.replay(key, self.__speed)
+
+    async def post(self, url: str, headers=None, json=None) -> CassetteResponse:
+        key = self.__cassette.key("POST", url, None, json)
+        return await self.__cassette.replay(key, self.__speed)
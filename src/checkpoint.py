@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+from json import dumps
+from os import remove
+from os.path import isfile
+from time import monotonic
+from typing import Any, Dict, Optional
+
+from src.json_file import read_json_file, write_json_file
+
+CHECKPOINT_VERSION = 1  # increment when the layout of checkpoints changes
+DEFAULT_CHECKPOINT_INTERVAL = 30  # seconds between checkpoints during a run
+
+###############################################################################
+# Checkpoint class
+###############################################################################
+
+
+class Checkpoint(object):
+    """
+    File periodically saved during a run with the state of the stats fetched
+    so far, including the per-repo results of each completed repo, so a run
+    that is interrupted, e.g. by rate limits or cancellation, can be resumed
+    by a later run fetching the results of only the remaining repos.
+    """
+
+    def __init__(
+        self, path: str, username: str, interval: float = DEFAULT_CHECKPOINT_INTERVAL
+    ):
+        """
+        :param path: path of the checkpoint file, gzip compressed if it ends
+        in .gz
+        :param username: the user whose stats are checkpointed
+        :param interval: minimum seconds between checkpoints saved by update
+        """
+        self.path = path
+        self.username = username
+        self.interval = interval
+        self.__last_saved = monotonic()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        :return: the state saved by an interrupted run of the same user, if any
+        """
+        if not isfile(self.path):
+            return None
+        data = read_json_file(self.path)
+        if (
+            data.get("version") != CHECKPOINT_VERSION
+            or data.get("username") != self.username
+        ):
+            print(f"Ignoring checkpoint {self.path} of another version or user")
+            return None
+        return data.get("state")
+
+    def save(self, state: Dict[str, Any]) -> None:
+        """
+        Atomically replaces the checkpoint file with the state
+        :param state: state exported by the stats
+        """
+        write_json_file(
+            self.path,
+            dumps(
+                {
+                    "version": CHECKPOINT_VERSION,
+                    "username": self.username,
+                    "state": state,
+                },
+                separators=(",", ":"),
+            ),
+        )
+        self.__last_saved = monotonic()
+
+    def is_due(self) -> bool:
+        """
+        :return: True if the interval has passed since the last checkpoint
+        """
+        return monotonic() - self.__last_saved >= self.interval
+
+    def clear(self) -> None:
+        """
+        Removes the checkpoint file once a run has completed
+        """
+        if isfile(self.path):
+            remove(self.path)
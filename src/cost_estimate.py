@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+
+from math import ceil
+from time import monotonic, time
+from typing import Dict, List, Optional
+
+from src.github_org_stats import GitHubOrgStats
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_plan import StatsPlan
+
+# REST endpoints fetched for each repo by each phase of fetching stats
+GROUP_ENDPOINTS = {
+    "repos": (),
+    "total_contributions": (),
+    "lines_changed": ("contributors", "collaborators"),
+    "collaborators": ("collaborators", "contributors"),
+    "views": ("traffic",),
+}
+# REST endpoints reported, of which pulls and issues are used by no image
+REST_CATEGORIES = ("contributors", "traffic", "collaborators", "pulls", "issues")
+CONTRIBUTIONS_QUERIES = 2  # GraphQL queries of contribution years and counts
+MAX_LISTED_REPOS = 10  # cache-fresh repos listed by name in reports
+REFUSE = "refuse"  # refuse runs estimated to exceed the remaining budget
+DOWNSCOPE = "downscope"  # render only the images within the remaining budget
+OVER_BUDGET_MODES = (REFUSE, DOWNSCOPE)
+
+###############################################################################
+# CostEstimate class
+###############################################################################
+
+
+class CostEstimate(object):
+    """
+    Estimated number of GraphQL points and REST requests of computing the stats
+    of a plan, counting one point per GraphQL query, and the repos whose
+    results are already held and so are not fetched again
+    """
+
+    def __init__(
+        self,
+        plan: StatsPlan,
+        graphql: int,
+        rest: Dict[str, int],
+        fresh_repos: List[str],
+        num_repos: int,
+    ):
+        self.plan = plan
+        self.graphql = graphql
+        self.rest = rest
+        self.fresh_repos = fresh_repos
+        self.num_repos = num_repos
+
+    @property
+    def rest_total(self) -> int:
+        """
+        :return: total number of REST requests
+        """
+        return sum(self.rest.values())
+
+
+###############################################################################
+# CostEstimator class
+###############################################################################
+
+
+class CostEstimator(object):
+    """
+    Estimates the API cost of a run before it is made, from the held repo
+    listing and per-repo results, e.g. of saved stats or a checkpoint, and the
+    endpoints each phase of the plan fetches, so runs exceeding the remaining
+    rate limit can be refused or downscoped instead of running into it.
+    """
+
+    def __init__(self, stats: GitHubRepoStats, request_budget: Optional[int] = None):
+        """
+        :param stats: the statistics to be computed
+        :param request_budget: maximum REST requests to make, if any, in
+        addition to the remaining rate limit
+        """
+        self.__stats = stats
+        self.__request_budget = request_budget
+        self.__listing_queries = 0
+        self.__rate_limits: Dict[str, Dict[str, int]] = dict()
+        self.__latency = 0.0
+
+    async def prepare(self) -> None:
+        """
+        Fetches the repo listing, if not held, and the remaining rate limits,
+        timing the request to estimate the time taken by each request
+        """
+        queries = self.__stats.queries
+        request_count = queries.request_count
+        await self.__stats.repos
+        self.__listing_queries = queries.request_count - request_count
+
+        start = monotonic()
+        self.__rate_limits = await queries.rate_limits()
+        self.__latency = monotonic() - start
+
+    def estimate(self, plan: StatsPlan) -> CostEstimate:
+        """
+        :param plan: plan of the stats to compute
+        :return: estimated cost of computing the stats of the plan
+        """
+        stats = self.__stats
+        pending = stats.pending_repos()
+        is_org = isinstance(stats, GitHubOrgStats)
+
+        endpoints = set()
+        graphql = 0
+        for group in plan.groups:
+            endpoints.update(GROUP_ENDPOINTS[group])
+            if group == "total_contributions" and not stats.has_total_contributions():
+                # organizations sum the contributions in contributor stats
+                if is_org:
+                    endpoints.add("contributors")
+                else:
+                    graphql += CONTRIBUTIONS_QUERIES
+
+        rest = {
+            category: len(pending.get(category, ())) if category in endpoints else 0
+            for category in REST_CATEGORIES
+        }
+        repos = stats.listed_shard_repos()
+        fresh_repos = sorted(
+            repo
+            for repo in repos
+            if not any(repo in pending[endpoint] for endpoint in endpoints)
+        )
+        return CostEstimate(plan, graphql, rest, fresh_repos, len(repos))
+
+    def remaining(self, api: str) -> Optional[int]:
+        """
+        :param api: core for REST or graphql for GraphQL
+        :return: requests remaining within the rate limit and request budget,
+        if known
+        """
+        remaining = self.__rate_limits.get(api, {}).get("remaining")
+        if api == "core" and self.__request_budget is not None:
+            remaining = (
+                self.__request_budget
+                if remaining is None
+                else min(remaining, self.__request_budget)
+            )
+        return remaining
+
+    def fits(self, estimate: CostEstimate) -> bool:
+        """
+        :param estimate: estimated cost of a plan
+        :return: True if the cost is within the remaining budget, or unknown
+        """
+        rest = self.remaining("core")
+        graphql = self.remaining("graphql")
+        return (rest is None or estimate.rest_total <= rest) and (
+            graphql is None or estimate.graphql <= graphql
+        )
+
+    def downscope(self, plan: StatsPlan) -> Optional[StatsPlan]:
+        """
+        :param plan: plan of the stats to compute
+        :return: plan of the cheapest images of the plan within the remaining
+        budget, if any image is
+        """
+        images = []
+        for image in sorted(
+            plan.images,
+            key=lambda image: self.estimate(StatsPlan([image], ())).rest_total,
+        ):
+            if self.fits(self.estimate(StatsPlan(images + [image], ()))):
+                images.append(image)
+        return StatsPlan(images, ()) if images else None
+
+    def wall_time(self, estimate: CostEstimate) -> float:
+        """
+        :param estimate: estimated cost of a plan
+        :return: expected seconds taken by the requests, with as many REST
+        requests at once as the queries allow, including waiting for the rate
+        limit to reset if exceeded
+        """
+        rounds = ceil(
+            estimate.rest_total / max(1, self.__stats.queries.max_connections)
+        )
+        seconds = (estimate.graphql + rounds) * self.__latency
+        for api, cost in (("core", estimate.rest_total), ("graphql", estimate.graphql)):
+            remaining = self.__rate_limits.get(api, {}).get("remaining")
+            if remaining is not None and cost > remaining:
+                seconds += max(0.0, self.__rate_limits[api].get("reset", 0) - time())
+        return seconds
+
+    def report(self, estimate: CostEstimate) -> str:
+        """
+        :param estimate: estimated cost of a plan
+        :return: summary of the cost, the cache-fresh repos, the remaining rate
+        limits and the expected wall time
+        """
+        graphql = f"{estimate.graphql:,} points"
+        if self.__listing_queries:
+            graphql += f" (and {self.__listing_queries:,} spent to list repos)"
+        else:
+            graphql += " (repos listed from saved stats)"
+        lines = [f"Estimated API cost of {estimate.plan}:", f"  GraphQL: {graphql}"]
+        for category, count in estimate.rest.items():
+            lines.append(f"  REST {category}: {count:,}")
+        lines.append(
+            f"  REST total: {estimate.rest_total:,}"
+            + (
+                " or more, as contributor stats are requested again while "
+                "GitHub computes them"
+                if estimate.rest["contributors"]
+                else ""
+            )
+        )
+
+        fresh = estimate.fresh_repos
+        lines.append(
+            f"  Cache-fresh repos: {len(fresh):,} of {estimate.num_repos:,}"
+            + (f": {', '.join(fresh[:MAX_LISTED_REPOS])}" if fresh else "")
+            + (", ..." if len(fresh) > MAX_LISTED_REPOS else "")
+        )
+
+        limits = []
+        for api, name in (("core", "REST"), ("graphql", "GraphQL")):
+            remaining = self.remaining(api)
+            limits.append(
+                f"{name} {'unknown' if remaining is None else f'{remaining:,}'}"
+            )
+        lines.append(f"  Remaining budget: {', '.join(limits)}")
+        lines.append(
+            f"  Expected wall time: {self.wall_time(estimate):0.1f}s"
+            + ("" if self.fits(estimate) else " (exceeds the remaining budget)")
+        )
+        return "\n".join(lines)
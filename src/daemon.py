@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+
+from asyncio import run, sleep
+from os import getenv
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
+
+from src.env_vars import EnvironmentVariables
+from src.generate_images import (
+    GenerateImages,
+    OUTPUT_DIR,
+    parse_themes,
+    parse_window,
+    plan_window,
+)
+from src.github_api_queries import GitHubApiQueries
+from src.github_org_stats import GitHubOrgStats
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_artifact import StatsArtifact
+from src.stats_history import StatsHistory
+from src.stats_plan import StatsPlan
+from src.token_pool import TokenPool, split_tokens
+from src.trace_events import Tracer
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+###############################################################################
+# DaemonGenerateImages class
+###############################################################################
+
+
+class DaemonGenerateImages(object):
+    """
+    Generate images in a long-running process that refreshes them on a
+    schedule, keeping one connection pool, the queries with their conditional
+    request cache, the language colors and the parsed templates warm between
+    refreshes, so unchanged data is answered with 304 Not Modified responses
+    that do not count against the rate limit.
+    """
+
+    def __init__(self):
+        tokens = split_tokens(getenv("ACCESS_TOKEN"), getenv("ACCESS_TOKENS"))
+        access_token = tokens[0] if tokens else None
+        user = getenv("GITHUB_ACTOR")
+
+        if not access_token:
+            raise Exception("A personal access token is required to proceed!")
+
+        if not user:
+            raise RuntimeError("Environment variable GITHUB_ACTOR must be set")
+
+        try:
+            self.__interval = float(getenv("DAEMON_INTERVAL"))
+            cycles = getenv("DAEMON_CYCLES")
+            self.__max_cycles: Optional[int] = int(cycles) if cycles else None
+        except (TypeError, ValueError):
+            raise RuntimeError(
+                "Environment variable DAEMON_INTERVAL must be a number of seconds, "
+                "and DAEMON_CYCLES an integer if set"
+            )
+
+        self.__organization = getenv("ORGANIZATION")
+        self.__username = self.__organization or user
+        self.__access_token = access_token
+        self.__tokens = TokenPool(tokens)
+        self.__metrics_path = getenv("METRICS_PATH")
+        self.__prometheus_path = getenv("METRICS_PROMETHEUS_PATH")
+        self.__trace_path = getenv("TRACE_PATH")
+        self.__tracer = Tracer(enabled=bool(self.__trace_path))
+        self.__artifact_path = getenv("STATS_ARTIFACT")
+        self.__themes = parse_themes(getenv("THEMES"))
+        self.__window = parse_window(getenv("STATS_WINDOW"))
+        self.__plan = plan_window(StatsPlan.parse(getenv("STATS")), self.__window)
+        history_path = getenv("STATS_HISTORY")
+        self.__history = StatsHistory(history_path) if history_path else None
+
+        # stored views are carried over between refreshes in memory
+        self.__environment = EnvironmentVariables.from_env(
+            username=self.__username, access_token=access_token
+        )
+
+        run(self.start())
+
+    async def start(self) -> None:
+        """
+        Main function: refresh all badges every interval, reporting the time
+        taken and the API requests made by each refresh
+        """
+        from aiohttp import ClientSession
+
+        async with ClientSession() as session:
+            queries = GitHubApiQueries(
+                username=self.__username,
+                access_token=self.__access_token,
+                session=session,
+                tokens=self.__tokens,
+                tracer=self.__tracer,
+            )
+
+            cycle = 0
+            while self.__max_cycles is None or cycle < self.__max_cycles:
+                cycle += 1
+                start = monotonic()
+                request_count = queries.request_count
+                not_modified_count = queries.not_modified_count
+
+                try:
+                    await self.refresh(session, queries)
+                    status = "Refreshed images"
+                except Exception as e:
+                    status = f"Failed to refresh images: {e}"
+                elapsed = monotonic() - start
+
+                print(
+                    f"Cycle {cycle}: {status} in {elapsed:0.2f}s with "
+                    f"{queries.request_count - request_count} API requests "
+                    f"({queries.not_modified_count - not_modified_count} not "
+                    f"modified), rate limit remaining: "
+                    f"{queries.rate_limit_remaining}"
+                )
+                if len(self.__tokens) > 1:
+                    print(self.__tokens.report())
+                # cumulative over all cycles, e.g. for Prometheus to scrape
+                queries.metrics.save(self.__metrics_path, self.__prometheus_path)
+                # the trace of only the last refresh is kept
+                self.__tracer.save(self.__trace_path)
+                self.__tracer.clear()
+
+                if self.__max_cycles is None or cycle < self.__max_cycles:
+                    await sleep(max(0.0, self.__interval - elapsed))
+
+    async def refresh(
+        self, session: "ClientSession", queries: GitHubApiQueries
+    ) -> None:
+        """
+        Fetch all stats again and replace all badges with the refreshed stats
+        """
+        if self.__organization:
+            stats = GitHubOrgStats(
+                environment_vars=self.__environment,
+                session=session,
+                organization=self.__organization,
+                queries=queries,
+                weekly_changes="weekly_changes" in self.__plan.fields,
+            )
+        else:
+            stats = GitHubRepoStats(
+                environment_vars=self.__environment,
+                session=session,
+                queries=queries,
+                weekly_changes="weekly_changes" in self.__plan.fields,
+            )
+
+        images = GenerateImages(
+            stats=stats,
+            username=self.__username,
+            output_dir=OUTPUT_DIR,
+            themes=self.__themes,
+            plan=self.__plan,
+            tracer=self.__tracer,
+            window=self.__window,
+            history=self.__history,
+        )
+        # each refresh is recorded, as each run is without the daemon
+        if self.__history is not None:
+            await images.record_history()
+        await images.render()
+        self.__environment.commit()
+
+        if self.__artifact_path:
+            artifact = await StatsArtifact.from_stats(stats, fields=self.__plan.fields)
+            artifact.save(self.__artifact_path)
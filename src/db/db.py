@@ -1,6 +1,32 @@
 #!/usr/bin/python3
 
-from json import load, dumps
+from functools import lru_cache
+from json import load, loads, dumps
+from os import makedirs, replace
+from os.path import abspath, dirname, isfile, join
+from typing import Optional
+
+DEFAULT_DB = {
+    "views": {"count": "0", "to": "0000-00-00", "from": "0000-00-00"},
+    "pull_requests": "0",
+    "issues": "0",
+}
+# the db of the repo run in, or of its parent when run from e.g. test/
+DB_PATHS = ("src/db/db.json", "../src/db/db.json")
+
+
+@lru_cache(maxsize=None)
+def default_db_path() -> str:
+    """
+    :return: path of the default db file, resolved once per process so each
+    db opened does not search for it again
+    """
+    for path in DB_PATHS:
+        if isfile(path):
+            return path
+    # the db shipped with the package, wherever the working directory is
+    return join(dirname(abspath(__file__)), "db.json")
+
 
 ###############################################################################
 # GitRepoStatsDB class
@@ -8,18 +34,35 @@ from json import load, dumps
 
 
 class GitRepoStatsDB:
-    def __init__(self):
+    def __init__(self, path: Optional[str] = None, in_memory: bool = False):
+        """
+        Updates are held until commit is called, so a run that is interrupted
+        leaves the db file as it was before the run
+        :param path: path of a db file to use instead of the default db, e.g.
+        per user in batch mode, which is created if it does not exist
+        :param in_memory: start from the default db and never read or write a
+        file, e.g. for stats fetched by an embedding service
+        """
         self.__db = None
+        self.__path = path
+        self.__in_memory = in_memory
+        self.__is_updated = False
 
         self.views = None
         self.views_start = None
         self.views_end = None
 
-        try:
-            with open("src/db/db.json", "r") as db:
-                self.__db = load(db)
-        except FileNotFoundError:
-            with open("../src/db/db.json", "r") as db:
+        if self.__in_memory:
+            self.__db = loads(dumps(DEFAULT_DB))
+        elif self.__path is not None:
+            if isfile(self.__path):
+                with open(self.__path, "r") as db:
+                    self.__db = load(db)
+            else:
+                self.__db = loads(dumps(DEFAULT_DB))
+        else:
+            self.__path = default_db_path()
+            with open(self.__path, "r") as db:
                 self.__db = load(db)
 
         self.views = int(self.__db["views"]["count"])
@@ -29,12 +72,20 @@ class GitRepoStatsDB:
         self.issues = int(self.__db["issues"])
 
     def __update_db(self) -> None:
-        try:
-            with open("src/db/db.json", "w") as db:
-                db.write(dumps(self.__db, indent=2))
-        except FileNotFoundError:
-            with open("../src/db/db.json", "w") as db:
-                db.write(dumps(self.__db, indent=2))
+        self.__is_updated = True
+
+    def commit(self) -> None:
+        """
+        Atomically writes all updates since the last commit to the db file
+        """
+        if not self.__is_updated or self.__in_memory:
+            return
+        if dirname(self.__path):
+            makedirs(dirname(self.__path), exist_ok=True)
+        with open(self.__path + ".tmp", "w") as db:
+            db.write(dumps(self.__db, indent=2))
+        replace(self.__path + ".tmp", self.__path)
+        self.__is_updated = False
 
     def set_views_count(self, views_count: any) -> None:
         self.views = int(views_count)
@@ -52,9 +103,11 @@ class GitRepoStatsDB:
         self.__update_db()
 
     def set_pull_requests(self, pull_requests_count: int) -> None:
-        self.__db["pull_requests"] = str(pull_requests_count)
+        self.pull_requests = int(pull_requests_count)
+        self.__db["pull_requests"] = str(self.pull_requests)
         self.__update_db()
 
     def set_issues(self, issues_count: int) -> None:
-        self.__db["issues"] = str(issues_count)
+        self.issues = int(issues_count)
+        self.__db["issues"] = str(self.issues)
         self.__update_db()
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+
+from asyncio import ensure_future, gather, wait
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_artifact import StatsArtifact
+from src.stats_plan import FIELD_GROUPS
+from src.weekly_changes import WeeklyChanges
+
+
+def format_age(since: str) -> str:
+    """
+    :param since: ISO 8601 time, e.g. the time stats were fetched
+    :return: compact age of the time, e.g. 3d or 5h
+    """
+    seconds = (
+        datetime.now(timezone.utc) - datetime.fromisoformat(since)
+    ).total_seconds()
+    if seconds >= 86400:
+        return f"{int(seconds // 86400)}d"
+    if seconds >= 3600:
+        return f"{int(seconds // 3600)}h"
+    return f"{max(1, int(seconds // 60))}m"
+
+
+###############################################################################
+# DeadlineStats class
+###############################################################################
+
+
+class DeadlineStats(object):
+    """
+    Statistics computed until a deadline, after which the stats of any fields
+    not yet computed, e.g. lines changed still waiting on contributor stats,
+    are taken from the last saved stats artifact instead. Exposes the same
+    awaitable properties as GitHubRepoStats, so images render on time.
+    """
+
+    def __init__(
+        self,
+        stats: GitHubRepoStats,
+        fallback: Optional[StatsArtifact],
+        deadline: float,
+        groups: Optional[Iterable[str]] = None,
+    ):
+        """
+        :param stats: the statistics to compute
+        :param fallback: the last saved stats, if any
+        :param deadline: time.monotonic() time to stop computing stats at
+        :param groups: groups of fields to compute, all if None
+        """
+        self.environment_vars = stats.environment_vars
+        self.__stats = stats
+        self.__fallback = fallback
+        self.__deadline = deadline
+        self.__groups = list(FIELD_GROUPS if groups is None else groups)
+        self.__computed: Set[str] = set()
+        self.__stale_fields: Dict[str, str] = dict()
+
+    async def compute(self) -> bool:
+        """
+        Concurrently computes the stats of all fields until the deadline,
+        cancelling any computations still pending at the deadline
+        :return: True if the stats of all fields were computed in time
+        """
+
+        async def compute_group(group: str) -> None:
+            await getattr(self.__stats, group)
+            self.__computed.update(FIELD_GROUPS[group])
+
+        tasks = [ensure_future(compute_group(group)) for group in self.__groups]
+        done, pending = await wait(
+            tasks, timeout=max(0.0, self.__deadline - monotonic())
+        )
+        for task in pending:
+            task.cancel()
+        await gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()  # raise any errors of the computations
+
+        if pending and self.__fallback is not None:
+            print(
+                f"Time budget exceeded, using last saved stats for: "
+                f"{', '.join(g for g in self.__groups if g not in self.__computed)}"
+            )
+            for group in self.__groups:
+                for field in FIELD_GROUPS[group]:
+                    # fields not in the saved stats are waited for instead
+                    if field not in self.__computed and self.__fallback.has_field(
+                        field
+                    ):
+                        self.__stale_fields[field] = self.__fallback.field_time(field)
+        return not pending
+
+    @property
+    def stale_fields(self) -> Dict[str, str]:
+        """
+        :return: times the stats of fields not computed in time, and taken
+        from the last saved stats instead, were fetched, by field name
+        """
+        return self.__stale_fields
+
+    async def __get(self, field: str) -> Any:
+        if field in self.__stale_fields:
+            return await getattr(self.__fallback, field)
+        # without saved stats, stats not computed in time are waited for
+        return await getattr(self.__stats, field)
+
+    async def raw_collaborators(self) -> Tuple[Set[str], Set[str]]:
+        """
+        :return: collaborators of user's repositories and repos with more than
+        one collaborator
+        """
+        if "raw_collaborators" in self.__stale_fields:
+            return await self.__fallback.raw_collaborators()
+        return await self.__stats.raw_collaborators()
+
+    @property
+    async def name(self) -> str:
+        """
+        :return: GitHub user's name
+        """
+        return await self.__get("name")
+
+    @property
+    async def stargazers(self) -> int:
+        """
+        :return: total number of stargazers on user's repos
+        """
+        return await self.__get("stargazers")
+
+    @property
+    async def forks(self) -> int:
+        """
+        :return: total number of forks on user's repos
+        """
+        return await self.__get("forks")
+
+    @property
+    async def total_contributions(self) -> int:
+        """
+        :return: count of user's total contributions as defined by GitHub
+        """
+        return await self.__get("total_contributions")
+
+    @property
+    async def languages(self) -> Dict:
+        """
+        :return: summary of languages used by the user
+        """
+        return await self.__get("languages")
+
+    @property
+    async def excluded_languages(self) -> Set:
+        """
+        :return: languages excluded from the summary of languages
+        """
+        return await self.__get("excluded_languages")
+
+    @property
+    async def languages_proportional(self) -> Dict:
+        """
+        :return: summary of languages used by the user, with proportional usage
+        """
+        return await self.__get("languages_proportional")
+
+    @property
+    async def repos(self) -> Set[str]:
+        """
+        :return: list of names of repos user is involved with
+        """
+        return await self.__get("repos")
+
+    @property
+    async def contributed_collab_repos(self) -> Set[str]:
+        """
+        :return: list of names of repos contributed to user in collaborations with at least one other
+        """
+        return await self.__get("contributed_collab_repos")
+
+    @property
+    async def lines_changed(self) -> Tuple[int, int]:
+        """
+        :return: count of total lines added and removed by the user
+        """
+        return await self.__get("lines_changed")
+
+    @property
+    async def weekly_changes(self) -> WeeklyChanges:
+        """
+        :return: store of the weekly changes in each repo
+        """
+        return await self.__get("weekly_changes")
+
+    @property
+    async def avg_contribution_percent(self) -> str:
+        """
+        :return: str representing the avg percent of user's repo contributions
+        """
+        return await self.__get("avg_contribution_percent")
+
+    @property
+    async def avg_contribution_percent_weighted(self) -> str:
+        """
+        :return: str representing the avg percent of user's repo contributions weighted by number of contributors
+        """
+        return await self.__get("avg_contribution_percent_weighted")
+
+    @property
+    async def views(self) -> int:
+        """
+        :return: view count of user's repositories as of a given (first) date
+        """
+        return await self.__get("views")
+
+    @property
+    async def views_from_date(self) -> str:
+        """
+        :return: the first date included in the repo view count
+        """
+        return await self.__get("views_from_date")
+
+    @property
+    async def collaborators(self) -> int:
+        """
+        :return: count of total collaborators to user's repositories
+        """
+        return await self.__get("collaborators")
+
+    @property
+    async def contributors(self) -> Set:
+        """
+        :return: set of total contributors to user's repositories
+        """
+        return await self.__get("contributors")
@@ -1,10 +1,34 @@
 #!/usr/bin/python3
 
-from os import getenv, environ
-from typing import Optional
+from os import getenv
+from typing import Any, Optional
 from datetime import datetime
 
 from src.db.db import GitRepoStatsDB
+from src.hyperloglog import COUNT_MODES, EXACT
+from src.repo_filter import RepoFilter
+
+# environment variable of each option, read by EnvironmentVariables.from_env
+ENVIRONMENT_VARIABLES = {
+    "exclude_repos": "EXCLUDED",
+    "exclude_langs": "EXCLUDED_LANGS",
+    "include_forked_repos": "INCLUDE_FORKED_REPOS",
+    "exclude_contrib_repos": "EXCLUDE_CONTRIB_REPOS",
+    "exclude_archive_repos": "EXCLUDE_ARCHIVE_REPOS",
+    "exclude_private_repos": "EXCLUDE_PRIVATE_REPOS",
+    "exclude_public_repos": "EXCLUDE_PUBLIC_REPOS",
+    "repo_views": "REPO_VIEWS",
+    "repo_last_viewed": "LAST_VIEWED",
+    "repo_first_viewed": "FIRST_VIEWED",
+    "store_repo_view_count": "STORE_REPO_VIEWS",
+    "more_collaborators": "MORE_COLLABS",
+    "manually_added_repos": "MORE_REPOS",
+    "only_included_repos": "ONLY_INCLUDED",
+    "only_included_collab_repos": "ONLY_INCLUDED_COLLAB_REPOS",
+    "exclude_collab_repos": "EXCLUDED_COLLAB_REPOS",
+    "more_collab_repos": "MORE_COLLAB_REPOS",
+    "count_mode": "COUNT_MODE",
+}
 
 ###############################################################################
 # EnvironmentVariables class - uses GitRepoStatsDB class as second resort
@@ -18,27 +42,38 @@ class EnvironmentVariables:
         self,
         username: str,
         access_token: str,
-        exclude_repos: Optional[str] = getenv("EXCLUDED"),
-        exclude_langs: Optional[str] = getenv("EXCLUDED_LANGS"),
-        include_forked_repos: str = getenv("INCLUDE_FORKED_REPOS"),
-        exclude_contrib_repos: str = getenv("EXCLUDE_CONTRIB_REPOS"),
-        exclude_archive_repos: str = getenv("EXCLUDE_ARCHIVE_REPOS"),
-        exclude_private_repos: str = getenv("EXCLUDE_PRIVATE_REPOS"),
-        exclude_public_repos: str = getenv("EXCLUDE_PUBLIC_REPOS"),
-        repo_views: Optional[str] = getenv("REPO_VIEWS"),
-        repo_last_viewed: Optional[str] = getenv("LAST_VIEWED"),
-        repo_first_viewed: Optional[str] = getenv("FIRST_VIEWED"),
-        store_repo_view_count: str = getenv("STORE_REPO_VIEWS"),
-        more_collaborators: Optional[str] = getenv("MORE_COLLABS"),
-        manually_added_repos: Optional[str] = getenv("MORE_REPOS"),
-        only_included_repos: Optional[str] = getenv("ONLY_INCLUDED"),
-        only_included_collab_repos: Optional[str] = getenv(
-            "ONLY_INCLUDED_COLLAB_REPOS"
-        ),
-        exclude_collab_repos: Optional[str] = getenv("EXCLUDED_COLLAB_REPOS"),
-        more_collab_repos: Optional[str] = getenv("MORE_COLLAB_REPOS"),
+        exclude_repos: Optional[str] = None,
+        exclude_langs: Optional[str] = None,
+        include_forked_repos: Optional[str] = None,
+        exclude_contrib_repos: Optional[str] = None,
+        exclude_archive_repos: Optional[str] = None,
+        exclude_private_repos: Optional[str] = None,
+        exclude_public_repos: Optional[str] = None,
+        repo_views: Optional[str] = None,
+        repo_last_viewed: Optional[str] = None,
+        repo_first_viewed: Optional[str] = None,
+        store_repo_view_count: Optional[str] = None,
+        more_collaborators: Optional[str] = None,
+        manually_added_repos: Optional[str] = None,
+        only_included_repos: Optional[str] = None,
+        only_included_collab_repos: Optional[str] = None,
+        exclude_collab_repos: Optional[str] = None,
+        more_collab_repos: Optional[str] = None,
+        count_mode: Optional[str] = None,
+        db_path: Optional[str] = None,
+        db: Optional[GitRepoStatsDB] = None,
     ):
-        self.__db = GitRepoStatsDB()
+        """
+        Options are given as the values of their environment variables, e.g.
+        comma separated repo names, and are unset if None, whatever the
+        environment, unless read with from_env
+        :param count_mode: how distinct contributors and collaborators are
+        counted, exactly or estimated with sketches, exact if None
+        :param db_path: path of the db file storing view counts and dates,
+        the default db of default_db_path if None
+        :param db: db to use instead of that at db_path, e.g. held in memory
+        """
+        self.__db = db if db is not None else GitRepoStatsDB(db_path)
 
         self.username = username
         self.access_token = access_token
@@ -163,26 +198,65 @@ class EnvironmentVariables:
         else:
             self.more_collab_repos = {x.strip() for x in more_collab_repos.split(",")}
 
+        self.count_mode = (count_mode or EXACT).strip().lower()
+        if self.count_mode not in COUNT_MODES:
+            raise RuntimeError(
+                f"Environment variable COUNT_MODE must be one of "
+                f"{' or '.join(repr(mode) for mode in COUNT_MODES)} if set"
+            )
+
         self.pull_requests_count = self.__db.pull_requests
         self.issues_count = self.__db.issues
 
+        # compile repo name patterns and type rules once for all repo pages
+        self.repo_filter = RepoFilter(
+            exclude_patterns=self.exclude_repos,
+            include_patterns=self.only_included_repos,
+            include_forked_repos=self.include_forked_repos,
+            exclude_archive_repos=self.exclude_archive_repos,
+            exclude_private_repos=self.exclude_private_repos,
+            exclude_public_repos=self.exclude_public_repos,
+        )
+        self.collab_repo_filter = RepoFilter(
+            exclude_patterns=self.exclude_collab_repos,
+            include_patterns=self.only_included_collab_repos,
+        )
+
+    @classmethod
+    def from_env(
+        cls, username: str, access_token: str, **options: Any
+    ) -> "EnvironmentVariables":
+        """
+        :param options: options to set instead of their environment variables
+        :return: options read from the environment variables when called
+        """
+        for option, name in ENVIRONMENT_VARIABLES.items():
+            options.setdefault(option, getenv(name))
+        return cls(username=username, access_token=access_token, **options)
+
     def set_views(self, views: any) -> None:
         self.repo_views += int(views)
-        environ["REPO_VIEWS"] = str(self.repo_views)
         self.__db.set_views_count(self.repo_views)
 
     def set_last_viewed(self, new_last_viewed_date: str) -> None:
         self.repo_last_viewed = new_last_viewed_date
-        environ["LAST_VIEWED"] = self.repo_last_viewed
         self.__db.set_views_to_date(self.repo_last_viewed)
 
     def set_first_viewed(self, new_first_viewed_date: str) -> None:
         self.repo_first_viewed = new_first_viewed_date
-        environ["FIRST_VIEWED"] = self.repo_first_viewed
         self.__db.set_views_from_date(self.repo_first_viewed)
 
     def set_pull_requests(self, pull_requests_count: int) -> None:
-        self.__db.pull_requests = pull_requests_count
+        self.pull_requests_count = pull_requests_count
+        self.__db.set_pull_requests(self.pull_requests_count)
 
     def set_issues(self, issues_count: int) -> None:
-        self.__db.issues = issues_count
+        self.issues_count = issues_count
+        self.__db.set_issues(self.issues_count)
+
+    def commit(self) -> None:
+        """
+        Writes all updated counts and dates to the db at once, at the end of a
+        completed run
+        """
+        self.__db.commit()
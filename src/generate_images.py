@@ -1,20 +1,92 @@
 #!/usr/bin/python3
 
 from asyncio import run, gather
-from aiohttp import ClientSession
-from os import mkdir, getenv
-from os.path import isdir
-from re import sub
+from datetime import datetime, timezone
+from glob import glob
+from math import ceil, isnan
+from os import makedirs, getenv, replace
+from os.path import abspath, dirname, isfile, join
+from time import monotonic, time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+from src.cassette import (
+    CASSETTE_MODES,
+    DEFAULT_CASSETTE_PATH,
+    RECORD,
+    REPLAY,
+    Cassette,
+    RecordingSession,
+    ReplayingSession,
+)
+from src.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_INTERVAL
+from src.cost_estimate import CostEstimator, DOWNSCOPE, OVER_BUDGET_MODES
+from src.deadline_stats import DeadlineStats, format_age
 from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_org_stats import GitHubOrgStats
 from src.github_repo_stats import GitHubRepoStats
+from src.shard import Shard
+from src.stats_artifact import StatsArtifact
+from src.stats_history import HistorySeries, StatsHistory, stats_sample
+from src.stats_partial import PartialStats
+from src.stats_plan import StatsPlan
+from src.svg_template import SvgTemplate, THEMES, DEFAULT_THEME
+from src.token_pool import TokenPool, split_tokens
+from src.trace_events import Tracer
+from src.weekly_changes import StatsWindow
+from src.webhooks import (
+    DEFAULT_WEBHOOK_DIR,
+    apply_webhook_events,
+    find_webhook_events,
+    remove_webhook_events,
+)
 
 OUTPUT_DIR = "generated_images"  # directory for storing generated images
-TEMPLATE_PATH = "src/templates/"
+# resolved once, from the package rather than the working directory
+TEMPLATE_PATH = join(dirname(abspath(__file__)), "templates", "")
 OVERVIEW_FILE_NAME = "overview.svg"
 LANGUAGES_FILE_NAME = "languages.svg"
+TRENDS_FILE_NAME = "trends.svg"
 TXT_SPACER_MAX_LEN = 7
 MAX_NAME_LEN = 18
+FETCH_STAGE = "fetch"  # only fetch stats and save them to the stats artifact
+RENDER_STAGE = "render"  # only render images from a saved stats artifact
+MERGE_STAGE = "merge"  # generate all badges from the partial stats of shards
+DEFAULT_ARTIFACT_PATH = "stats_artifact.json.gz"
+DEFAULT_PARTIAL_PATH = "stats_partial_{index}.json.gz"
+DEFAULT_PARTIALS_PATTERN = "stats_partial_*.json.gz"
+DEFAULT_CHECKPOINT_PATH = "stats_checkpoint.json.gz"
+# fields needed to render the overview of a window of weeks
+WINDOW_FIELDS = ("weekly_changes",)
+# template slots showing the stats of each field, to mark if the stats are stale
+FIELD_SLOTS = {
+    "views": "views",
+    "forks": "forks_and_stars",
+    "stargazers": "forks_and_stars",
+    "total_contributions": "contributions",
+    "lines_changed": "lines_changed",
+    "avg_contribution_percent": "avg_contribution_percent",
+    "repos": "repos",
+    "contributed_collab_repos": "repos",
+    "collaborators": "collaborators_and_contributors",
+    "languages": "lang_count",
+}
+# label and metrics summed of each trend rendered from the stats history
+TREND_METRICS = (
+    ("Stars", ("stargazers",)),
+    ("Forks", ("forks",)),
+    ("Contributions", ("total_contributions",)),
+    ("Lines changed", ("lines_added", "lines_deleted")),
+    ("Repo views", ("views",)),
+    ("Collaborators", ("collaborators",)),
+    ("Contributors", ("contributors",)),
+    ("Repos", ("repos",)),
+)
+NUM_TREND_LANGUAGES = 3  # trends of the largest languages of the last sample
+TREND_DAYS = 30  # days the change of each trend is shown over
+SPARKLINE_WIDTH = 120
+SPARKLINE_HEIGHT = 16
+SPARKLINE_POINTS = 60  # samples are downsampled to at most this many points
 
 
 ###############################################################################
@@ -22,12 +94,87 @@ MAX_NAME_LEN = 18
 ###############################################################################
 
 
-def generate_output_folder() -> None:
+def generate_output_folder(output_dir: str = OUTPUT_DIR) -> None:
     """
     Create the output folder if it does not already exist
     """
-    if not isdir(OUTPUT_DIR):
-        mkdir(OUTPUT_DIR)
+    makedirs(output_dir, exist_ok=True)
+
+
+def write_output_file(path: str, text: str) -> None:
+    """
+    Atomically replaces a generated file, so it is never read partly written,
+    e.g. while served or committed as images are refreshed
+    """
+    with open(path + ".tmp", "w") as f:
+        f.write(text)
+    replace(path + ".tmp", path)
+
+
+def themed_file_name(file_name: str, theme: str) -> str:
+    """
+    Name image files of the default theme as before, and others by theme
+    Example: overview.svg to overview_monochrome.svg
+    """
+    if theme == DEFAULT_THEME:
+        return file_name
+    name, extension = file_name.rsplit(".", 1)
+    return f"{name}_{theme}.{extension}"
+
+
+def parse_themes(themes: Optional[str]) -> List[str]:
+    """
+    :param themes: comma separated theme names, e.g. from the THEMES variable
+    :return: list of theme names to render images in, the default if none
+    """
+    themes = [
+        theme.strip() for theme in (themes or DEFAULT_THEME).split(",") if theme.strip()
+    ]
+    for theme in themes:
+        if theme not in THEMES:
+            raise RuntimeError(
+                f"Unknown theme '{theme}' in environment variable THEMES. "
+                f"Available themes: {', '.join(THEMES)}"
+            )
+    return themes
+
+
+def parse_window(window: Optional[str]) -> Optional[StatsWindow]:
+    """
+    :param window: window of weeks, e.g. from the STATS_WINDOW variable
+    :return: the window to render the overview's lines changed and
+    contributions over, None for all weeks
+    """
+    if not window or not window.strip():
+        return None
+    try:
+        return StatsWindow.parse(window)
+    except ValueError as e:
+        raise RuntimeError(f"Environment variable STATS_WINDOW: {e}")
+
+
+def plan_window(plan: StatsPlan, window: Optional[StatsWindow]) -> StatsPlan:
+    """
+    :return: the plan, with the fields the overview of the window is rendered
+    from, if rendered
+    """
+    if window is None or "overview" not in plan.images:
+        return plan
+    return StatsPlan(plan.images, plan.fields.union(WINDOW_FIELDS))
+
+
+def find_files(patterns: Optional[str], default_pattern: str) -> List[str]:
+    """
+    :param patterns: comma separated paths or glob patterns, e.g. of partial
+    stats from the STATS_PARTIALS variable
+    :param default_pattern: pattern to use if no patterns are given
+    :return: sorted paths of the files found
+    """
+    paths = set()
+    for pattern in (patterns or default_pattern).split(","):
+        if pattern.strip():
+            paths.update(glob(pattern.strip()))
+    return sorted(paths)
 
 
 def add_unit(num):
@@ -48,108 +195,701 @@ def add_unit(num):
     return str(num)
 
 
+def fit_name(name: str, username: str) -> str:
+    """
+    :param name: the user's name
+    :param username: the user's login
+    :return: the possessive of the name, or of its best fit variation, short
+    enough for the overview image
+    """
+    # svg name display: user's given name first, otherwise username in any best fit variation as depicted below
+    # if name too long for svg dimensions
+    if len(name + ("'" if name[-1].lower() == "s" else "'s")) > MAX_NAME_LEN:
+        names = name.split(" ")
+        # if too long name contains just one word or forename initials with full surname still too long
+        if (
+            len(names) == 1
+            or len(
+                names[0][0]
+                + ". "
+                + names[-1]
+                + ("'" if names[-1][-1].lower() == "s" else "'s")
+            )
+            > MAX_NAME_LEN
+        ):
+            # if username also too long for svg dimensions
+            if (
+                len(username + ("'" if username[-1].lower() == "s" else "'s"))
+                > MAX_NAME_LEN
+            ):
+                # display forename to max possible len if name a single word, or forename initials with full surname
+                name = (
+                    names[0][: MAX_NAME_LEN - 4] + "..'s"
+                    if len(names) == 1
+                    else "".join(
+                        [
+                            name[0] + ". "
+                            for i, name in enumerate(names[:-1])
+                            if i <= (MAX_NAME_LEN - 4) / 3
+                        ]
+                    )
+                    + names[-1][0]
+                    + ".'s"
+                )
+            else:
+                # display the username instead of user's name if forename initials with full surname still too long
+                name = username + ("'" if username[-1].lower() == "s" else "'s")
+        else:
+            # display the forename initials with full surname if full name too long but not surname with initials
+            name = (
+                names[0][0]
+                + ". "
+                + names[-1]
+                + ("'" if names[-1][-1].lower() == "s" else "'s")
+            )
+    else:
+        # display the user's full forename and surname if when combined are not too long for the svg dimensions
+        name += "'" if name[-1].lower() == "s" else "'s"
+    return name
+
+
+def languages_markup(sorted_languages: List[Tuple[str, Dict]]) -> Tuple[str, str]:
+    """
+    :param sorted_languages: languages with their color and proportion, by size
+    :return: the progress bar and list items of the languages image
+    """
+    progress = ""
+    lang_list = ""
+    delay_between = 150
+
+    for i, (lang, data) in enumerate(sorted_languages):
+        color = data.get("color")
+        color = color if color is not None else "#000000"
+        progress += (
+            f'<span style="background-color: {color};'
+            f'width: {data.get("prop", 0):0.5f}%;" '
+            f'class="progress-item"></span>'
+        )
+        lang_list += f"""
+            <li style="animation-delay: {i * delay_between}ms;">
+                    <svg xmlns="http://www.w3.org/2000/svg" 
+                         class="octicon" 
+                         style="fill:{color};"
+                         viewBox="0 0 16 16" 
+                         version="1.1" 
+                         width="16" 
+                         height="16">
+                            <path fill-rule="evenodd" 
+                                  d="M8 4a4 4 0 100 8 4 4 0 000-8z">
+                            </path>
+                    </svg>
+                    <span class="lang">
+                        {lang}
+                    </span>
+                    <span class="percent">
+                        {data.get("prop", 0):0.2f}%
+                    </span>
+            </li>"""
+    return progress, lang_list
+
+
+def sparkline(
+    values: Sequence[float],
+    width: int = SPARKLINE_WIDTH,
+    height: int = SPARKLINE_HEIGHT,
+    num_points: int = SPARKLINE_POINTS,
+) -> str:
+    """
+    :param values: values of a trend in sample order, NaN where not computed
+    :return: points of a polyline of the values scaled to the width and
+    height, with the last value of each of at most the number of points equal
+    spans of samples
+    """
+    step = max(1, ceil(len(values) / num_points))
+    sampled = [
+        values[min(i + step, len(values)) - 1] for i in range(0, len(values), step)
+    ]
+    points = [(i, value) for i, value in enumerate(sampled) if not isnan(value)]
+    if not points:
+        return ""
+    low = min(value for _, value in points)
+    span = max(value for _, value in points) - low
+    last = max(len(sampled) - 1, 1)
+    # unchanged values are drawn through the middle
+    return " ".join(
+        f"{i / last * width:0.1f},"
+        f"{height - (value - low) / span * height if span else height / 2:0.1f}"
+        for i, value in points
+    )
+
+
+def trend_delta(values: Sequence[float], start: int) -> Optional[float]:
+    """
+    :param values: values of a trend in sample order, NaN where not computed
+    :param start: index of the first sample of the span of the change
+    :return: change from the first to the last value computed in the span, or
+    None if fewer than two were
+    """
+    computed = [value for value in values[start:] if not isnan(value)]
+    if len(computed) < 2:
+        return None
+    return computed[-1] - computed[0]
+
+
+def trend_row(
+    label: str, values: Sequence[float], start: int, is_percent: bool = False
+) -> str:
+    """
+    :param label: name of the trend
+    :param values: values of the trend in sample order, NaN where not computed
+    :param start: index of the first sample the change is shown over
+    :param is_percent: whether the values are percents, e.g. of a language
+    :return: table row of the last value, sparkline and change of the trend,
+    empty if no value was computed
+    """
+    computed = [value for value in values if not isnan(value)]
+    if not computed:
+        return ""
+    if is_percent:
+        value = f"{computed[-1]:0.2f}%"
+    else:
+        value = f"{int(computed[-1]):,}"
+        value = value if len(value) < TXT_SPACER_MAX_LEN else add_unit(value)
+
+    delta = trend_delta(values, start)
+    if not delta:
+        delta_class, delta_text = "flat", "&#177;0"
+    else:
+        delta_class = "up" if delta > 0 else "down"
+        delta_text = f"{delta:+0.2f}%" if is_percent else f"{int(delta):+,}"
+    return f"""
+            <tr>
+                <td class="label">{label}</td>
+                <td class="value">{value}</td>
+                <td>
+                    <svg class="sparkline"
+                         width="{SPARKLINE_WIDTH}"
+                         height="{SPARKLINE_HEIGHT}"
+                         viewBox="-1 -1 {SPARKLINE_WIDTH + 2} {SPARKLINE_HEIGHT + 2}">
+                            <polyline points="{sparkline(values)}" />
+                    </svg>
+                </td>
+                <td class="delta {delta_class}">{delta_text}</td>
+            </tr>"""
+
+
+def trends_values(series: HistorySeries, now: Optional[float] = None) -> Dict[str, str]:
+    """
+    :param series: samples of the stats history
+    :param now: seconds since the epoch the changes are shown up to, now if
+    None
+    :return: text of the trends for each trends template slot
+    """
+    now = time() if now is None else now
+    start = series.index_at(now - TREND_DAYS * 24 * 60 * 60)
+
+    rows = ""
+    for label, metrics in TREND_METRICS:
+        # NaN where any of the metrics summed was not computed
+        values = [sum(column) for column in zip(*(series.metrics[m] for m in metrics))]
+        rows += trend_row(label, values, start)
+    latest = sorted(series.latest_languages().items(), key=lambda t: t[1], reverse=True)
+    for name, _ in latest[:NUM_TREND_LANGUAGES]:
+        rows += trend_row(name, series.language(name), start, is_percent=True)
+
+    since = datetime.fromtimestamp(series.timestamps[0], timezone.utc)
+    return {
+        "history_range": f"{len(series):,} runs since {since:%Y-%m-%d}",
+        "trend_days": str(TREND_DAYS),
+        "trend_rows": rows,
+    }
+
+
 ###############################################################################
 # GenerateImages class
 ###############################################################################
 
 
 class GenerateImages:
-    def __init__(self):
-        access_token = getenv("ACCESS_TOKEN")
+    def __init__(
+        self,
+        stats: Optional[Union[GitHubRepoStats, StatsArtifact]] = None,
+        username: Optional[str] = None,
+        output_dir: str = OUTPUT_DIR,
+        themes: Optional[List[str]] = None,
+        plan: Optional[StatsPlan] = None,
+        tracer: Optional[Tracer] = None,
+        window: Optional[StatsWindow] = None,
+        history: Optional[StatsHistory] = None,
+    ):
+        """
+        Generate images for the user configured by environment variables, or,
+        if stats are given, prepare to render them with render()
+        :param stats: stats of a user to render, e.g. one of many in batch mode
+        :param username: the GitHub username of the user of the given stats
+        :param output_dir: directory to write generated images to
+        :param themes: themes to render the given stats in
+        :param plan: plan of the images to render the given stats in, all if
+        None
+        :param tracer: tracer to record a span of rendering each image in
+        :param window: window of weeks to render the overview's lines changed
+        and contributions over, all weeks if None
+        :param history: stats history to render the trends image from, and to
+        record the given stats in with record_history(), if any
+        """
+        self.__output_dir = output_dir
+        self.__tracer = tracer if tracer is not None else Tracer()
+        self.__window = window
+        self.__history = history
+
+        if stats is not None:
+            self.__stats = stats
+            self.__username = username
+            self.__themes = themes if themes else [DEFAULT_THEME]
+            self.__plan = plan if plan is not None else StatsPlan.parse(None)
+            return
+
+        # the time budget includes the time taken to fetch the repo listing
+        start_time = monotonic()
+
+        self.__stage = (getenv("STATS_STAGE") or "").strip().lower()
+        self.__artifact_path = getenv("STATS_ARTIFACT")
+
+        if self.__stage not in ("", FETCH_STAGE, RENDER_STAGE, MERGE_STAGE):
+            raise RuntimeError(
+                f"Environment variable STATS_STAGE must be one of "
+                f"'{FETCH_STAGE}', '{RENDER_STAGE}' or '{MERGE_STAGE}' if set"
+            )
+
+        # fetch the partial stats of only one shard of the repos, if set
+        self.__shard = (
+            Shard.parse(getenv("SHARD"), getenv("SHARD_MODE"))
+            if getenv("SHARD")
+            else None
+        )
+        if self.__shard is not None and self.__stage != FETCH_STAGE:
+            raise RuntimeError(
+                f"Environment variable SHARD requires STATS_STAGE '{FETCH_STAGE}'"
+            )
+
+        self.__themes = parse_themes(getenv("THEMES"))
+
+        # record a timeline of the requests and phases of the run, if set
+        self.__trace_path = getenv("TRACE_PATH")
+        self.__tracer = Tracer(enabled=bool(self.__trace_path))
+
+        # only the stats used by the images and fields selected are fetched
+        self.__plan = StatsPlan.parse(getenv("STATS"))
+        if getenv("STATS"):
+            print(f"Planned {self.__plan}")
+
+        # the overview's lines changed and contributions of a window of weeks,
+        # summarized from the weekly changes fetched with the lines changed
+        self.__window = parse_window(getenv("STATS_WINDOW"))
+        self.__plan = plan_window(self.__plan, self.__window)
+
+        # record the stats of each run and render their trends, if set
+        history_path = getenv("STATS_HISTORY")
+        self.__history = StatsHistory(history_path) if history_path else None
+
+        if self.__stage == RENDER_STAGE:
+            self.__stats = StatsArtifact.load(
+                self.__artifact_path or DEFAULT_ARTIFACT_PATH
+            )
+            fields = self.__plan.image_fields
+            if self.__window is not None and "overview" in self.__plan.images:
+                fields = fields.union(WINDOW_FIELDS)
+            missing = sorted(
+                field for field in fields if not self.__stats.has_field(field)
+            )
+            if missing:
+                raise RuntimeError(
+                    f"Stats artifact is missing the fields {', '.join(missing)} "
+                    f"used by the images, select the images to render with STATS"
+                )
+            self.__username = self.__stats.username
+            run(self.render())
+            self.__tracer.save(self.__trace_path)
+            return
+
+        # the user's own token first, then any other tokens to spread the
+        # requests over, e.g. of machine users or GitHub Apps
+        tokens = split_tokens(getenv("ACCESS_TOKEN"), getenv("ACCESS_TOKENS"))
+        access_token = tokens[0] if tokens else None
         user = getenv("GITHUB_ACTOR")
 
-        if not access_token:
+        # record the exchanges of the run with the API, or replay recorded
+        # exchanges without the network, if set
+        self.__cassette_mode = (getenv("CASSETTE_MODE") or "").strip().lower()
+        if self.__cassette_mode and self.__cassette_mode not in CASSETTE_MODES:
+            raise RuntimeError(
+                f"Environment variable CASSETTE_MODE must be one of "
+                f"{' or '.join(repr(mode) for mode in CASSETTE_MODES)} if set"
+            )
+        self.__cassette_path = getenv("CASSETTE_PATH") or DEFAULT_CASSETTE_PATH
+        try:
+            self.__cassette_speed = float(getenv("CASSETTE_SPEED") or 1)
+        except ValueError:
+            raise RuntimeError(
+                "Environment variable CASSETTE_SPEED must be a number if set"
+            )
+
+        # merged partial stats are complete, and replayed requests need no
+        # token, so no queries need to be made
+        if (
+            not access_token
+            and self.__stage != MERGE_STAGE
+            and self.__cassette_mode != REPLAY
+        ):
             raise Exception("A personal access token is required to proceed!")
+        self.__tokens = TokenPool(tokens) if tokens else None
+
+        # export the metrics of the requests made, if set
+        self.__metrics_path = getenv("METRICS_PATH")
+        self.__prometheus_path = getenv("METRICS_PROMETHEUS_PATH")
 
         if not user:
             raise RuntimeError("Environment variable GITHUB_ACTOR must be set")
 
-        self.__environment = EnvironmentVariables(
-            username=user, access_token=access_token
+        # stats of all members and repos of an organization instead, if set
+        self.__organization = getenv("ORGANIZATION")
+
+        self.__environment = EnvironmentVariables.from_env(
+            username=self.__organization or user, access_token=access_token
         )
+        self.__username = self.__organization or user
         self.__stats = None
 
+        # render with the last saved stats of fields not computed in time, if set
+        try:
+            time_budget = getenv("TIME_BUDGET")
+            self.__deadline = start_time + float(time_budget) if time_budget else None
+        except ValueError:
+            raise RuntimeError(
+                "Environment variable TIME_BUDGET must be a number of seconds"
+            )
+
+        # save progress to resume from if the run is interrupted, if set, or to
+        # finish the work left when the time budget is exceeded in the next run
+        checkpoint_path = getenv("CHECKPOINT_PATH")
+        if not checkpoint_path and self.__deadline is not None:
+            checkpoint_path = DEFAULT_CHECKPOINT_PATH
+        try:
+            checkpoint_interval = float(
+                getenv("CHECKPOINT_INTERVAL") or DEFAULT_CHECKPOINT_INTERVAL
+            )
+        except ValueError:
+            raise RuntimeError(
+                "Environment variable CHECKPOINT_INTERVAL must be a number of seconds"
+            )
+        self.__checkpoint = (
+            Checkpoint(checkpoint_path, self.__username, checkpoint_interval)
+            if checkpoint_path
+            else None
+        )
+
+        # update the saved stats of the last run with webhook events, if set
+        state_path = getenv("STATS_STATE")
+        if state_path and self.__shard is not None:
+            raise RuntimeError(
+                "Environment variable STATS_STATE cannot be used with SHARD"
+            )
+        self.__state = Checkpoint(state_path, self.__username) if state_path else None
+        self.__webhook_dir = getenv("WEBHOOK_DIR") or DEFAULT_WEBHOOK_DIR
+
+        # estimate the API cost of the run before it is made, if set
+        self.__dry_run = (getenv("DRY_RUN") or "").strip().lower() == "true"
+        self.__over_budget = (getenv("OVER_BUDGET") or "").strip().lower()
+        if self.__over_budget and self.__over_budget not in OVER_BUDGET_MODES:
+            raise RuntimeError(
+                f"Environment variable OVER_BUDGET must be one of "
+                f"{' or '.join(repr(mode) for mode in OVER_BUDGET_MODES)} if set"
+            )
+        try:
+            request_budget = getenv("REQUEST_BUDGET")
+            self.__request_budget = int(request_budget) if request_budget else None
+        except ValueError:
+            raise RuntimeError(
+                "Environment variable REQUEST_BUDGET must be an integer if set"
+            )
+
         run(self.start())
 
     async def start(self) -> None:
         """
-        Main function: generate all badges
+        Main function: generate all badges, or only fetch all stats if the
+        fetch stage is set, and save the stats artifact if a path is set.
+        With a shard, only fetch and save the partial stats of the shard.
+        Stored counts are only updated once the run has completed, and with a
+        checkpoint, the run resumes from the progress of an interrupted run.
+        With saved stats, only the results of repos changed since the last run
+        by recorded webhook events are fetched again
         """
+        from aiohttp import ClientSession
+
         async with ClientSession() as session:
-            self.__stats = GitHubRepoStats(
-                environment_vars=self.__environment, session=session
+            queries = GitHubApiQueries(
+                username=self.__username,
+                access_token=self.__environment.access_token,
+                session=session,
+                tokens=self.__tokens,
+                tracer=self.__tracer,
+            )
+            cassette = self.use_cassette(queries)
+            if self.__organization:
+                self.__stats = GitHubOrgStats(
+                    environment_vars=self.__environment,
+                    session=session,
+                    organization=self.__organization,
+                    queries=queries,
+                    shard=self.__shard,
+                    checkpoint=self.__checkpoint,
+                    weekly_changes="weekly_changes" in self.__plan.fields,
+                )
+            else:
+                self.__stats = GitHubRepoStats(
+                    environment_vars=self.__environment,
+                    session=session,
+                    queries=queries,
+                    shard=self.__shard,
+                    checkpoint=self.__checkpoint,
+                    weekly_changes="weekly_changes" in self.__plan.fields,
+                )
+
+            stats = self.__stats
+            state = None
+            if self.__checkpoint is not None:
+                state = self.__checkpoint.load()
+                if state is not None:
+                    print(f"Resuming from checkpoint {self.__checkpoint.path}")
+            if state is None and self.__state is not None:
+                state = self.__state.load()
+                if state is not None:
+                    print(f"Updating saved stats {self.__state.path}")
+            if state is not None:
+                stats.import_state(state)
+
+            events = []
+            if self.__state is not None:
+                events = find_webhook_events(self.__webhook_dir)
+                applied = apply_webhook_events(stats, events)
+                print(f"Applied {applied} of {len(events)} webhook events")
+
+            # merged partial stats are complete, so no requests are estimated
+            if (self.__dry_run or self.__over_budget) and self.__stage != MERGE_STAGE:
+                await self.plan_budget(stats)
+                if self.__dry_run:
+                    return
+
+            try:
+                is_complete = await self.run_stage()
+            except BaseException:
+                if self.__checkpoint is not None:
+                    self.__checkpoint.save(stats.export_state())
+                    print(f"Saved progress to checkpoint {self.__checkpoint.path}")
+                raise
+            finally:
+                if len(queries.tokens) > 1:
+                    print(queries.tokens.report())
+                queries.metrics.save(self.__metrics_path, self.__prometheus_path)
+                self.__tracer.save(self.__trace_path)
+                if cassette is not None:
+                    cassette.save(self.__cassette_path)
+                    print(
+                        f"Recorded {len(cassette.exchanges)} exchanges to "
+                        f"{self.__cassette_path}"
+                    )
+
+            self.__environment.commit()
+            if self.__state is not None:
+                if is_complete:
+                    state = stats.export_state()
+                    # the views of the last 14 days are fetched by every run
+                    state.pop("repo_views")
+                    self.__state.save(state)
+                # the changes of the events are committed or checkpointed
+                remove_webhook_events(events)
+            if self.__checkpoint is not None:
+                if is_complete:
+                    self.__checkpoint.clear()
+                else:
+                    # the remaining work is continued by the next run
+                    self.__checkpoint.save(stats.export_state())
+                    print(f"Saved progress to checkpoint {self.__checkpoint.path}")
+
+    def use_cassette(self, queries: GitHubApiQueries) -> Optional[Cassette]:
+        """
+        Records the exchanges of the queries with the API into a cassette, or
+        answers them from a recorded cassette, if set
+        :param queries: the queries of the run
+        :return: the cassette recorded into, if recording
+        """
+        if self.__cassette_mode == RECORD:
+            cassette = Cassette(queries.api_url)
+            queries.session = RecordingSession(queries.session, cassette)
+            return cassette
+        if self.__cassette_mode == REPLAY:
+            cassette = Cassette.load(self.__cassette_path, queries.api_url)
+            queries.session = ReplayingSession(cassette, self.__cassette_speed)
+            print(
+                f"Replaying {len(cassette.exchanges)} exchanges from "
+                f"{self.__cassette_path}"
+            )
+        return None
+
+    async def plan_budget(self, stats: GitHubRepoStats) -> None:
+        """
+        Estimates the API cost of the plan from the repo listing and per-repo
+        results held, and refuses the run, or downscopes the plan to the images
+        within budget, if the cost exceeds the remaining rate limit or request
+        budget
+        :param stats: the statistics to be computed
+        """
+        estimator = CostEstimator(stats, self.__request_budget)
+        await estimator.prepare()
+        estimate = estimator.estimate(self.__plan)
+        print(estimator.report(estimate))
+        if self.__dry_run or estimator.fits(estimate):
+            return
+
+        if self.__over_budget == DOWNSCOPE:
+            plan = estimator.downscope(self.__plan)
+            if plan is not None:
+                print(f"Downscoped to {plan}")
+                self.__plan = plan
+                return
+        raise RuntimeError(
+            "Estimated API cost of the run exceeds the remaining rate limit or "
+            "request budget"
+        )
+
+    async def run_stage(self) -> bool:
+        """
+        Fetch and render the stats as set by the stage and shard
+        :return: False if stats were not all computed within the time budget
+        """
+        if self.__shard is not None:
+            partial = await PartialStats.from_stats(self.__stats)
+            partial.save(
+                getenv("STATS_PARTIAL")
+                or DEFAULT_PARTIAL_PATH.format(index=self.__shard.index)
+            )
+            return True
+
+        if self.__stage == MERGE_STAGE:
+            paths = find_files(getenv("STATS_PARTIALS"), DEFAULT_PARTIALS_PATTERN)
+            PartialStats.merge(
+                [PartialStats.load(path) for path in paths], self.__stats
+            )
+
+        is_complete = True
+        field_times = None
+        if self.__deadline is not None:
+            # the artifact is always saved with a time budget, for later runs
+            artifact_path = self.__artifact_path or DEFAULT_ARTIFACT_PATH
+            self.__stats = DeadlineStats(
+                self.__stats,
+                StatsArtifact.load(artifact_path) if isfile(artifact_path) else None,
+                self.__deadline,
+                self.__plan.groups,
             )
-            await gather(self.generate_languages(), self.generate_overview())
+            is_complete = await self.__stats.compute()
+            field_times = self.__stats.stale_fields
+
+        if self.__history is not None:
+            await self.record_history()
+
+        if self.__stage != FETCH_STAGE:
+            await self.render()
+
+        if (
+            self.__stage == FETCH_STAGE
+            or self.__artifact_path
+            or self.__deadline is not None
+        ):
+            artifact = await StatsArtifact.from_stats(
+                self.__stats, field_times, self.__plan.fields
+            )
+            artifact.save(self.__artifact_path or DEFAULT_ARTIFACT_PATH)
+        return is_complete
+
+    async def render(self) -> None:
+        """
+        Generate the badges of the plan from the stats, whether fetched or from
+        an artifact
+        """
+        generators = {
+            "languages": self.generate_languages,
+            "overview": self.generate_overview,
+        }
+        # trends are rendered from the history rather than the stats
+        if self.__history is not None:
+            generators["trends"] = self.generate_trends
+        images = [image for image in generators if image in self.__plan.images]
+
+        async def traced(image: str) -> None:
+            with self.__tracer.span(f"render {image}", "render"):
+                await generators[image]()
+
+        await gather(*[traced(image) for image in images])
+
+    async def record_history(self) -> None:
+        """
+        Appends the stats of the plan's fields to the stats history, without
+        any taken from the last saved stats when not computed in time, unless
+        none of the fields are recorded, e.g. with only the trends planned
+        """
+        fields = self.__plan.fields
+        if isinstance(self.__stats, DeadlineStats):
+            fields = fields.difference(self.__stats.stale_fields)
+        metrics, languages = await stats_sample(self.__stats, fields)
+        if metrics or languages:
+            self.__history.append(metrics, languages)
+
+    def mark_stale(self, values: Dict[str, str]) -> Dict[str, str]:
+        """
+        Appends the age of the stats to the text of each slot showing stats
+        taken from the last saved stats, when not computed within the time
+        budget, e.g. 1,234 (3d old)
+        :param values: text for each template slot
+        :return: the text for each template slot, with stale stats marked
+        """
+        if not isinstance(self.__stats, DeadlineStats):
+            return values
+        slot_times = dict()
+        for field, fetched_at in self.__stats.stale_fields.items():
+            slot = FIELD_SLOTS.get(field)
+            if slot in values:
+                slot_times[slot] = min(fetched_at, slot_times.get(slot, fetched_at))
+        for slot, fetched_at in slot_times.items():
+            values[slot] += f" ({format_age(fetched_at)} old)"
+        return values
 
     async def generate_overview(self) -> None:
         """
-        Generate an SVG badge with summary statistics
+        Generate an SVG badge with summary statistics for each theme
         """
-        with open("{}{}".format(TEMPLATE_PATH, OVERVIEW_FILE_NAME), "r") as f:
-            output = f.read()
-
-        # svg name display: user's given name first, otherwise username in any best fit variation as depicted below
-        name = await self.__stats.name
-        # if name too long for svg dimensions
-        if len(name + ("'" if name[-1].lower() == "s" else "'s")) > MAX_NAME_LEN:
-            names = name.split(" ")
-            # if too long name contains just one word or forename initials with full surname still too long
-            if (
-                len(names) == 1
-                or len(
-                    names[0][0]
-                    + ". "
-                    + names[-1]
-                    + ("'" if names[-1][-1].lower() == "s" else "'s")
-                )
-                > MAX_NAME_LEN
-            ):
-                # if username also too long for svg dimensions
-                if (
-                    self.__stats.environment_vars.username
-                    + (
-                        "'"
-                        if self.__stats.environment_vars.username[-1].lower() == "s"
-                        else "'s"
-                    )
-                    > MAX_NAME_LEN
-                ):
-                    # display forename to max possible len if name a single word, or forename initials with full surname
-                    name = (
-                        names[0][: MAX_NAME_LEN - 4] + "..'s"
-                        if len(names) == 1
-                        else "".join(
-                            [
-                                name[0] + ". "
-                                for i, name in enumerate(names[:-1])
-                                if i <= (MAX_NAME_LEN - 4) / 3
-                            ]
-                        )
-                        + names[-1][0]
-                        + ".'s"
-                    )
-                else:
-                    # display the username instead of user's name if forename initials with full surname still too long
-                    name = self.__stats.environment_vars.username + (
-                        "'"
-                        if self.__stats.environment_vars.username[-1].lower() == "s"
-                        else "'s"
-                    )
-            else:
-                # display the forename initials with full surname if full name too long but not surname with initials
-                name = (
-                    names[0][0]
-                    + ". "
-                    + names[-1]
-                    + ("'" if names[-1][-1].lower() == "s" else "'s")
-                )
-        else:
-            # display the user's full forename and surname if when combined are not too long for the svg dimensions
-            name += "'" if name[-1].lower() == "s" else "'s"
-        output = sub("{{ name }}", name, output)
+        template = SvgTemplate.load(f"{TEMPLATE_PATH}{OVERVIEW_FILE_NAME}")
+        values = self.mark_stale(await self.overview_values())
+
+        generate_output_folder(self.__output_dir)
+        for theme in self.__themes:
+            file_name = themed_file_name(OVERVIEW_FILE_NAME, theme)
+            write_output_file(
+                "{}/{}".format(self.__output_dir, file_name),
+                template.render(values, theme),
+            )
+
+    async def overview_values(self) -> Dict[str, str]:
+        """
+        :return: text of the summary statistics for each overview template slot
+        """
+        values = dict()
+
+        values["name"] = fit_name(await self.__stats.name, self.__username)
 
         views = f"{await self.__stats.views:,}"
-        output = sub("{{ views }}", views, output)
+        values["views"] = views
 
         forks = f"{await self.__stats.forks:,}"
         forks = forks if len(str(forks)) < TXT_SPACER_MAX_LEN else add_unit(forks)
@@ -161,21 +901,37 @@ class GenerateImages:
             + "|   "
             + stars
         )
-        output = sub("{{ forks_and_stars }}", forks_and_stars, output)
+        values["forks_and_stars"] = forks_and_stars
 
         contributions = f"{await self.__stats.total_contributions:,}"
-        output = sub("{{ contributions }}", contributions, output)
-
-        changed = (await self.__stats.lines_changed)[0] + (
-            await self.__stats.lines_changed
-        )[1]
-        output = sub("{{ lines_changed }}", f"{changed:,}", output)
+        values["contributions"] = contributions
 
-        avg_contribution_percent = (
-            f"{await self.__stats.avg_contribution_percent} "
-            f"[{await self.__stats.avg_contribution_percent_weighted}]"
-        )
-        output = sub("{{ avg_contribution_percent }}", avg_contribution_percent, output)
+        if self.__window is None:
+            changed = (await self.__stats.lines_changed)[0] + (
+                await self.__stats.lines_changed
+            )[1]
+            avg_contribution_percent = (
+                f"{await self.__stats.avg_contribution_percent} "
+                f"[{await self.__stats.avg_contribution_percent_weighted}]"
+            )
+            values["lines_changed_label"] = "Lines of code changes"
+            values["avg_contribution_percent_label"] = "Avg contributions [weighted]"
+        else:
+            weekly_changes = await self.__stats.weekly_changes
+            window_stats = weekly_changes.summarize(
+                self.__window, await self.__stats.repos
+            )
+            changed = window_stats.additions + window_stats.deletions
+            avg_contribution_percent = (
+                f"{window_stats.avg_contribution_percent} "
+                f"[{window_stats.avg_contribution_percent_weighted}]"
+            )
+            values["lines_changed_label"] = f"Lines changed ({self.__window})"
+            values["avg_contribution_percent_label"] = (
+                f"Avg contributions ({self.__window})"
+            )
+        values["lines_changed"] = f"{changed:,}"
+        values["avg_contribution_percent"] = avg_contribution_percent
 
         num_repos = len(await self.__stats.repos)
         num_collab_repos = len(await self.__stats.contributed_collab_repos)
@@ -185,19 +941,13 @@ class GenerateImages:
             else add_unit(num_repos)
         )
         repos = f"{repos:,} [{'%g' % round(num_collab_repos / num_repos * 100, 2)}%]"
-        output = sub("{{ repos }}", repos, output)
+        values["repos"] = repos
 
         collaborators_and_contributors = f"{await self.__stats.collaborators:,}"
-        output = sub(
-            "{{ collaborators_and_contributors }}",
-            collaborators_and_contributors,
-            output,
-        )
+        values["collaborators_and_contributors"] = collaborators_and_contributors
 
         views_from = await self.__stats.views_from_date
-        output = sub(
-            "{{ views_from_date }}", f"Repo views (as of {views_from})", output
-        )
+        values["views_from_date"] = f"Repo views (as of {views_from})"
 
         # pull_requests = f"{await self.__stats.pull_requests:,}"
         # pull_requests = (
@@ -213,21 +963,48 @@ class GenerateImages:
         #     + "|   "
         #     + issues
         # )
-        # output = sub("{{ pull_requests_and_issues }}", pull_requests_and_issues, output)
+        # values["pull_requests_and_issues"] = pull_requests_and_issues
 
-        generate_output_folder()
-        with open("{}/{}".format(OUTPUT_DIR, OVERVIEW_FILE_NAME), "w") as f:
-            f.write(output)
+        return values
 
     async def generate_languages(self) -> None:
         """
-        Generate an SVG badge with summary languages used
+        Generate an SVG badge with summary languages used for each theme
         """
-        with open("{}{}".format(TEMPLATE_PATH, LANGUAGES_FILE_NAME), "r") as f:
-            output = f.read()
+        template = SvgTemplate.load(f"{TEMPLATE_PATH}{LANGUAGES_FILE_NAME}")
+        values = self.mark_stale(await self.languages_values())
+
+        generate_output_folder(self.__output_dir)
+        for theme in self.__themes:
+            file_name = themed_file_name(LANGUAGES_FILE_NAME, theme)
+            write_output_file(
+                "{}/{}".format(self.__output_dir, file_name),
+                template.render(values, theme),
+            )
 
-        progress = ""
-        lang_list = ""
+    async def generate_trends(self) -> None:
+        """
+        Generate an SVG badge with the trends of the stats history for each
+        theme, if any stats were recorded
+        """
+        series = self.__history.read()
+        if not len(series):
+            return
+        template = SvgTemplate.load(f"{TEMPLATE_PATH}{TRENDS_FILE_NAME}")
+        values = trends_values(series)
+
+        generate_output_folder(self.__output_dir)
+        for theme in self.__themes:
+            file_name = themed_file_name(TRENDS_FILE_NAME, theme)
+            write_output_file(
+                "{}/{}".format(self.__output_dir, file_name),
+                template.render(values, theme),
+            )
+
+    async def languages_values(self) -> Dict[str, str]:
+        """
+        :return: text of the summary languages for each languages template slot
+        """
         sorted_languages = sorted(
             (await self.__stats.languages).items(),
             reverse=True,
@@ -239,43 +1016,10 @@ class GenerateImages:
         if num_excluded_languages > 0:
             lang_count += " [+" + str(num_excluded_languages) + "]"
 
-        delay_between = 150
-
-        for i, (lang, data) in enumerate(sorted_languages):
-            color = data.get("color")
-            color = color if color is not None else "#000000"
-            progress += (
-                f'<span style="background-color: {color};'
-                f'width: {data.get("prop", 0):0.5f}%;" '
-                f'class="progress-item"></span>'
-            )
-            lang_list += f"""
-            <li style="animation-delay: {i * delay_between}ms;">
-                    <svg xmlns="http://www.w3.org/2000/svg" 
-                         class="octicon" 
-                         style="fill:{color};"
-                         viewBox="0 0 16 16" 
-                         version="1.1" 
-                         width="16" 
-                         height="16">
-                            <path fill-rule="evenodd" 
-                                  d="M8 4a4 4 0 100 8 4 4 0 000-8z">
-                            </path>
-                    </svg>
-                    <span class="lang">
-                        {lang}
-                    </span>
-                    <span class="percent">
-                        {data.get("prop", 0):0.2f}%
-                    </span>
-            </li>"""
-
-        output = sub(r"{{ lang_count }}", lang_count, output)
-
-        output = sub(r"{{ progress }}", progress, output)
-
-        output = sub(r"{{ lang_list }}", lang_list, output)
+        progress, lang_list = languages_markup(sorted_languages)
 
-        generate_output_folder()
-        with open("{}/{}".format(OUTPUT_DIR, LANGUAGES_FILE_NAME), "w") as f:
-            f.write(output)
+        return {
+            "lang_count": lang_count,
+            "progress": progress,
+            "lang_list": lang_list,
+        }
@@ -1,11 +1,18 @@
 #!/usr/bin/python3
 
-from asyncio import Semaphore, sleep
-from requests import post, get
-from aiohttp import ClientSession
-from typing import Dict, Optional, List
-from json import loads
+from asyncio import Semaphore, Task, TimeoutError, ensure_future, sleep, wait_for
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, Optional, List, Tuple
+from json import JSONDecodeError, loads
+from os import getenv
+from random import uniform
+from time import monotonic
 
+from src.request_metrics import RequestMetrics, endpoint_class
+from src.token_pool import CORE, DEFAULT_RETRY_AFTER, GRAPHQL, TokenPool
+from src.trace_events import Tracer
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
 
 ###############################################################################
 # GitHubApiQueries class
@@ -20,24 +27,155 @@ class GitHubApiQueries(object):
 
     __GITHUB_API_URL = "https://api.github.com/"
     __GRAPHQL_PATH = "graphql"
+    # REST base path of GitHub Enterprise Server, which serves GraphQL at
+    # /api/graphql rather than under the REST base URL
+    __ENTERPRISE_REST_PATH = "/api/v3/"
     __REST_QUERY_LIMIT = 60
+    __GRAPHQL_QUERY_LIMIT = 10
     __ASYNCIO_SLEEP_TIME = 2
+    __MAX_BACKOFF = 60  # seconds slept at most between failed attempts
+    # longest Retry-After of a secondary rate limit waited for when no other
+    # token is available, rather than giving up on the request
+    __MAX_RETRY_AFTER = 120
+    __DEFAULT_REQUEST_TIMEOUT = 60  # seconds for a response and its body
     __DEFAULT_MAX_CONNECTIONS = 10
+    # REST paths ending with these return the same data to any user with access
+    # to the repo, so responses can be shared between users in a response cache
+    __SHAREABLE_PATH_SUFFIXES = ("/stats/contributors", "/languages")
+    __language_colors: Optional[Dict] = None
 
     def __init__(
         self,
         username: str,
         access_token: str,
-        session: ClientSession,
+        session: "ClientSession",
         max_connections: int = __DEFAULT_MAX_CONNECTIONS,
+        semaphore: Optional[Semaphore] = None,
+        cache: Optional[Dict[Tuple, Task]] = None,
+        tokens: Optional[TokenPool] = None,
+        metrics: Optional[RequestMetrics] = None,
+        tracer: Optional[Tracer] = None,
+        api_url: Optional[str] = None,
+        request_timeout: float = __DEFAULT_REQUEST_TIMEOUT,
+        retry_delay: float = __ASYNCIO_SLEEP_TIME,
     ):
+        """
+        :param semaphore: semaphore shared with other instances to bound their
+        combined concurrent connections, instead of one per max_connections
+        :param cache: response cache shared with other instances, e.g. of other
+        users, for responses of shareable repo paths
+        :param tokens: pool of tokens to spread requests over, the first being
+        the user's own token, or None to make all requests with access_token
+        :param metrics: metrics shared with other instances to record the
+        requests in, instead of new metrics
+        :param tracer: tracer to record a span of each request in, if enabled
+        :param api_url: base URL of the REST API to query instead of that of
+        the GITHUB_STATS_API_URL variable or api.github.com, e.g. of a mock
+        server or of GitHub Enterprise Server, such as https://host/api/v3/
+        :param request_timeout: seconds to wait for a response and its body
+        before making the request again
+        :param retry_delay: seconds to wait before requesting a path answered
+        with 202 Accepted again, doubled after each failed attempt of a request
+        """
         self.username = username
-        self.access_token = access_token
+        self.api_url = (
+            api_url or getenv("GITHUB_STATS_API_URL") or self.__GITHUB_API_URL
+        ).rstrip("/") + "/"
+        if self.api_url.endswith(self.__ENTERPRISE_REST_PATH):
+            self.graphql_url = (
+                self.api_url[: -len(self.__ENTERPRISE_REST_PATH)]
+                + "/api/"
+                + self.__GRAPHQL_PATH
+            )
+        else:
+            self.graphql_url = self.api_url + self.__GRAPHQL_PATH
+        self.tokens = tokens if tokens is not None else TokenPool([access_token])
+        self.access_token = self.tokens.primary
         self.session = session
-        self.semaphore = Semaphore(max_connections)
-        self.headers = {
-            "Authorization": f"Bearer {self.access_token}",
-        }
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self.retry_delay = retry_delay
+        self.semaphore = (
+            semaphore if semaphore is not None else Semaphore(max_connections)
+        )
+        self.cache = cache
+        self.headers = self.tokens.headers(self.access_token)
+        # ETag and response of each REST path, to make conditional requests
+        # that are answered with 304 Not Modified if the data is unchanged
+        self.__etags: Dict[Tuple, Tuple[str, Any]] = dict()
+
+        # API usage, e.g. to report per refresh in daemon mode; 304 Not
+        # Modified responses do not count against the rate limit
+        self.request_count = 0
+        self.not_modified_count = 0
+        self.rate_limit_remaining: Optional[int] = None
+        self.metrics = metrics if metrics is not None else RequestMetrics()
+        self.tracer = tracer if tracer is not None else Tracer()
+
+    def record_usage(self, headers) -> None:
+        """
+        Counts a REST request and the remaining REST rate limit reported by
+        its response
+        :param headers: headers of the response
+        """
+        self.request_count += 1
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            self.rate_limit_remaining = int(remaining)
+
+    def __backoff(self, failures: int) -> float:
+        """
+        :param failures: failed attempts of a request so far
+        :return: seconds to wait before the next attempt, doubling with each
+        failure, with jitter so concurrent requests do not retry in lockstep
+        """
+        delay = min(self.__MAX_BACKOFF, self.retry_delay * 2 ** (failures - 1))
+        return uniform(delay / 2, delay)
+
+    def __retry_after(self, status: int, headers) -> Optional[int]:
+        """
+        :param status: status of a response hitting a rate limit
+        :param headers: headers of the response
+        :return: seconds to wait as asked by a secondary rate limit, or by
+        default for a 429 without a time to wait, or None if there is no such
+        wait or it is too long to wait for
+        """
+        retry_after = headers.get("Retry-After")
+        if retry_after is None or not retry_after.isdigit():
+            return DEFAULT_RETRY_AFTER if status == 429 else None
+        return int(retry_after) if int(retry_after) <= self.__MAX_RETRY_AFTER else None
+
+    @staticmethod
+    def __failure_reason(error: Exception) -> str:
+        """
+        :return: reason a request failed with the error, for its metrics
+        """
+        if isinstance(error, TimeoutError):
+            return "timeout"
+        if isinstance(error, JSONDecodeError):
+            return "invalid_json"
+        return "client_error"
+
+    async def __send(self, request: Awaitable) -> Tuple[Any, bytes]:
+        """
+        :param request: request of the session
+        :return: the response and its body, read within the request timeout
+        """
+
+        async def send() -> Tuple[Any, bytes]:
+            response = await request
+            return response, await response.read()
+
+        return await wait_for(send(), self.request_timeout)
+
+    async def rate_limits(self) -> Dict[str, Dict[str, int]]:
+        """
+        Fetches the rate limits of the token, which does not count against them
+        :return: limit, remaining requests and reset time of each API, e.g.
+        core for REST and graphql for GraphQL
+        """
+        result = await self.query_rest("/rate_limit")
+        return result.get("resources", {}) if isinstance(result, dict) else {}
 
     async def query(self, generated_query: str) -> Dict:
         """
@@ -46,82 +184,292 @@ class GitHubApiQueries(object):
         :param generated_query: string query to be sent to the API
         :return: decoded GraphQL JSON output
         """
-        try:
-            async with self.semaphore:
-                r_async = await self.session.post(
-                    self.__GITHUB_API_URL + self.__GRAPHQL_PATH,
-                    headers=self.headers,
-                    json={"query": generated_query},
+        from aiohttp import ClientError
+
+        failures = 0
+        # viewer fields are of the token's user, so only the user's own token
+        # may query them
+        is_viewer = "viewer" in generated_query
+        for i in range(self.__GRAPHQL_QUERY_LIMIT):
+            token = (
+                self.tokens.use(self.tokens.primary)
+                if is_viewer
+                else self.tokens.select(GRAPHQL)
+            )
+            try:
+                wait_start = monotonic()
+                async with self.semaphore:
+                    start = monotonic()
+                    r_async, body = await self.__send(
+                        self.session.post(
+                            self.graphql_url,
+                            headers=self.tokens.headers(token),
+                            json={"query": generated_query},
+                        )
+                    )
+                self.request_count += 1
+                end = monotonic()
+                self.metrics.record(
+                    self.__GRAPHQL_PATH,
+                    r_async.status,
+                    end - start,
+                    len(body),
+                    start - wait_start,
+                )
+                self.tracer.add("semaphore wait", "wait", wait_start, start)
+                self.tracer.add(
+                    "POST graphql", "request", start, end, status=r_async.status
                 )
-            result = await r_async.json()
-
-            if result is not None:
-                return result
-        except ConnectionError:
-            print("aiohttp failed for GraphQL query")
-
-            # Fall back on non-async requests
-            async with self.semaphore:
-                r_requests = post(
-                    self.__GITHUB_API_URL + self.__GRAPHQL_PATH,
-                    headers=self.headers,
-                    json={"query": generated_query},
+                is_rate_limited = self.tokens.record(
+                    token, GRAPHQL, r_async.status, r_async.headers
                 )
-                result = r_requests.json()
+
+                if (
+                    is_rate_limited
+                    and not is_viewer
+                    and self.tokens.has_available(set())
+                ):
+                    print("A token hit its rate limit. Retrying with another...")
+                    self.metrics.record_retry("rate_limited")
+                    continue
+
+                if is_rate_limited:
+                    retry_after = self.__retry_after(r_async.status, r_async.headers)
+                    if retry_after is not None:
+                        print(f"GraphQL rate limited. Retrying in {retry_after}s...")
+                        self.metrics.record_retry("retry_after", retry_after)
+                        await sleep(retry_after)
+                        continue
+
+                if r_async.status >= 500:
+                    failures += 1
+                    delay = self.__backoff(failures)
+                    print(f"GraphQL query returned {r_async.status}. Retrying...")
+                    self.metrics.record_retry("server_error", delay)
+                    await sleep(delay)
+                    continue
+
+                result = await r_async.json()
 
                 if result is not None:
                     return result
+            except ConnectionError:
+                print("aiohttp failed for GraphQL query")
+
+                # Fall back on non-async requests
+                from requests import post
+
+                async with self.semaphore:
+                    r_requests = post(
+                        self.graphql_url,
+                        headers=self.tokens.headers(token),
+                        json={"query": generated_query},
+                    )
+                    result = r_requests.json()
+
+                    if result is not None:
+                        return result
+            except (ClientError, TimeoutError, JSONDecodeError) as e:
+                failures += 1
+                delay = self.__backoff(failures)
+                print(f"GraphQL query attempt #{i + 1} failed: {e!r}. Retrying...")
+                self.metrics.record_retry(self.__failure_reason(e), delay)
+                await sleep(delay)
         return dict()
 
     async def query_rest(self, path: str, params: Optional[Dict] = None) -> Dict:
         """
-        Make a request to the REST API
+        Make a request to the REST API, or share the response of an identical
+        request to a shareable path if a response cache is used
         :param path: API path to query
         :param params: Query parameters to be passed to the API
         :return: deserialized REST JSON output
         """
-        for i in range(self.__REST_QUERY_LIMIT):
-            if params is None:
-                params = dict()
-            if path.startswith("/"):
-                path = path[1:]
+        if self.cache is None or not path.endswith(self.__SHAREABLE_PATH_SUFFIXES):
+            return await self.__query_rest(path, params)
+
+        key = (path.lstrip("/"), tuple(sorted((params or dict()).items())))
+        future = self.cache.get(key)
+        if future is None:
+            # cache the pending request so concurrent identical requests share it
+            future = self.cache[key] = ensure_future(self.__query_rest(path, params))
+        else:
+            self.metrics.record_cache_hit("response")
+        try:
+            result = await future
+        except BaseException:
+            self.__evict(key, future)
+            raise
+        # failures, e.g. of a rate limit or too many 202 responses, are not
+        # shared, so later users of a batch request the path again
+        if not self.__is_shareable_result(result):
+            self.__evict(key, future)
+        return result
+
+    @staticmethod
+    def __is_shareable_result(result: Any) -> bool:
+        """
+        :param result: deserialized response of a shareable path
+        :return: True if the response is data of the path, rather than empty
+        after too many retries or the message of an error
+        """
+        if isinstance(result, list):
+            return len(result) > 0
+        return isinstance(result, dict) and len(result) > 0 and "message" not in result
 
+    def __evict(self, key: Tuple, future: Task) -> None:
+        """
+        Removes a failed response from the response cache, unless already
+        replaced by a new request of the path
+        """
+        if self.cache.get(key) is future:
+            del self.cache[key]
+
+    async def __query_rest(self, path: str, params: Optional[Dict] = None) -> Dict:
+        from aiohttp import ClientError
+
+        if params is None:
+            params = dict()
+        if path.startswith("/"):
+            path = path[1:]
+        parts = path.split("/")
+        repo = "/".join(parts[1:3]) if parts[0] == "repos" else None
+        endpoint = endpoint_class(path)
+        # tokens found not to have access to the repo
+        denied = set()
+        failures = 0  # attempts failed with errors, to back off from
+
+        for i in range(self.__REST_QUERY_LIMIT):
+            token = None
             try:
+                key = (path, tuple(params.items()))
+                cached = self.__etags.get(key)
+                wait_start = monotonic()
                 async with self.semaphore:
-                    r_async = await self.session.get(
-                        self.__GITHUB_API_URL + path,
-                        headers=self.headers,
-                        params=tuple(params.items()),
+                    start = monotonic()
+                    # selected once a connection is free, so with the latest
+                    # remaining rate limits
+                    token = self.tokens.select(CORE, repo, denied)
+                    headers = self.tokens.headers(token)
+                    if cached is not None:
+                        headers["If-None-Match"] = cached[0]
+                    r_async, body = await self.__send(
+                        self.session.get(
+                            self.api_url + path,
+                            headers=headers,
+                            params=tuple(params.items()),
+                        )
                     )
+                self.record_usage(r_async.headers)
+                end = monotonic()
+                self.metrics.record(
+                    endpoint,
+                    r_async.status,
+                    end - start,
+                    len(body),
+                    start - wait_start,
+                )
+                self.tracer.add("semaphore wait", "wait", wait_start, start)
+                self.tracer.add(
+                    f"GET {endpoint}",
+                    "request",
+                    start,
+                    end,
+                    path=path,
+                    status=r_async.status,
+                    attempt=i + 1,
+                )
+                is_rate_limited = self.tokens.record(
+                    token, CORE, r_async.status, r_async.headers
+                )
+
+                if is_rate_limited and self.tokens.has_available(denied):
+                    print("A token hit its rate limit. Retrying with another...")
+                    self.metrics.record_retry("rate_limited")
+                    continue
+
+                if is_rate_limited:
+                    # a secondary rate limit asks to wait a little, unlike the
+                    # primary one that resets within the hour
+                    retry_after = self.__retry_after(r_async.status, r_async.headers)
+                    if retry_after is not None:
+                        print(f"A path was rate limited. Retrying in {retry_after}s...")
+                        self.metrics.record_retry("retry_after", retry_after)
+                        await sleep(retry_after)
+                        continue
+
+                if (
+                    r_async.status in (403, 404)
+                    and not is_rate_limited
+                    and repo is not None
+                    and len(denied) + 1 < len(self.tokens)
+                ):
+                    # the token may not have access to the repo, e.g. a private
+                    # repo of another user, while another token does
+                    denied.add(token)
+                    self.metrics.record_retry("denied")
+                    continue
+
+                if r_async.status == 304 and cached is not None:
+                    self.not_modified_count += 1
+                    self.metrics.record_cache_hit("etag")
+                    return cached[1]
+
+                if r_async.status == 200 and repo is not None:
+                    self.tokens.pin(repo, token)
 
                 if r_async.status == 202:
                     print("A path returned 202. Retrying...")
-                    await sleep(self.__ASYNCIO_SLEEP_TIME)
+                    self.metrics.record_retry("202", self.retry_delay)
+                    with self.tracer.span("202 sleep", "sleep", path=path):
+                        await sleep(self.retry_delay)
+                    continue
+
+                if r_async.status >= 500:
+                    failures += 1
+                    delay = self.__backoff(failures)
+                    print(f"A path returned {r_async.status}. Retrying...")
+                    self.metrics.record_retry("server_error", delay)
+                    await sleep(delay)
                     continue
 
                 result = await r_async.json()
 
                 if result is not None:
+                    if r_async.status == 200 and "ETag" in r_async.headers:
+                        self.__etags[key] = (r_async.headers["ETag"], result)
                     return result
             except ConnectionError:
                 print("aiohttp failed for REST query attempt #" + str(i + 1))
+                self.metrics.record_retry("connection_error")
 
                 # Fall back on non-async requests
+                from requests import get
+
                 async with self.semaphore:
                     r_requests = get(
-                        self.__GITHUB_API_URL + path,
-                        headers=self.headers,
+                        self.api_url + path,
+                        headers=self.tokens.headers(token),
                         params=tuple(params.items()),
                     )
 
                     if r_requests.status_code == 202:
                         print("A path returned 202. Retrying...")
-                        await sleep(self.__ASYNCIO_SLEEP_TIME)
+                        self.metrics.record_retry("202", self.retry_delay)
+                        await sleep(self.retry_delay)
                         continue
                     elif r_requests.status_code == 200:
                         return r_requests.json()
+            except (ClientError, TimeoutError, JSONDecodeError) as e:
+                # e.g. a connection reset, a response not received within the
+                # request timeout or a truncated body, likely to succeed later
+                failures += 1
+                delay = self.__backoff(failures)
+                print(f"REST query attempt #{i + 1} failed: {e!r}. Retrying...")
+                self.metrics.record_retry(self.__failure_reason(e), delay)
+                await sleep(delay)
 
-        print("Too many 202s. Data for this repository will be incomplete.")
+        print("Too many retries. Data for this repository will be incomplete.")
         return dict()
 
     @staticmethod
@@ -221,6 +569,80 @@ class GitHubApiQueries(object):
                 }}
             }}"""
 
+    @staticmethod
+    def org_repos_overview(organization: str, cursor: Optional[str] = None) -> str:
+        """
+        :param organization: login of the organization
+        :param cursor: end cursor of the previous page of repositories, if any
+        :return: GraphQL query with overview of organization repositories
+        """
+        return f"""
+            {{
+                organization(login: "{organization}") {{
+                    login,
+                    name,
+                    repositories(
+                    first: 100,
+                    orderBy: {{
+                        field: UPDATED_AT,
+                        direction: DESC
+                    }},
+                    after: {"null" if cursor is None else '"' + cursor + '"'}) {{
+                        pageInfo {{
+                            hasNextPage
+                            endCursor
+                        }}
+                        nodes {{
+                            nameWithOwner
+                            stargazers {{
+                                totalCount
+                            }}
+                            forkCount
+                            isFork
+                            isEmpty
+                            isArchived
+                            isPrivate
+                            languages(first: 20, orderBy: {{
+                                field: SIZE,
+                                direction: DESC
+                            }}) {{
+                                edges {{
+                                    size
+                                    node {{
+                                        name
+                                        color
+                                    }}
+                                }}
+                            }}
+                        }}
+                    }}
+                }}
+            }}"""
+
+    @staticmethod
+    def org_members(organization: str, cursor: Optional[str] = None) -> str:
+        """
+        :param organization: login of the organization
+        :param cursor: end cursor of the previous page of members, if any
+        :return: GraphQL query with logins of organization members
+        """
+        return f"""
+            {{
+                organization(login: "{organization}") {{
+                    membersWithRole(
+                    first: 100,
+                    after: {"null" if cursor is None else '"' + cursor + '"'}) {{
+                        pageInfo {{
+                            hasNextPage
+                            endCursor
+                        }}
+                        nodes {{
+                            login
+                        }}
+                    }}
+                }}
+            }}"""
+
     @staticmethod
     def contributions_all_years() -> str:
         """
@@ -265,9 +687,16 @@ class GitHubApiQueries(object):
                 }}
             }}"""
 
-    @staticmethod
-    def get_language_colors():
-        url = get(
-            "https://raw.githubusercontent.com/ozh/github-colors/master/colors.json"
-        )
-        return loads(url.text)
+    @classmethod
+    def get_language_colors(cls) -> Dict:
+        """
+        :return: colors of languages, downloaded once and shared by all users
+        """
+        if cls.__language_colors is None:
+            from requests import get
+
+            url = get(
+                "https://raw.githubusercontent.com/ozh/github-colors/master/colors.json"
+            )
+            cls.__language_colors = loads(url.text)
+        return cls.__language_colors
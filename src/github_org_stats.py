@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+
+from typing import TYPE_CHECKING, Any, Dict, Optional, Set
+
+from src.checkpoint import Checkpoint
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.hyperloglog import HyperLogLog
+from src.shard import Shard
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+###############################################################################
+# GitHubOrgStats class
+###############################################################################
+
+
+class GitHubOrgStats(GitHubRepoStats):
+    """
+    Retrieve and store statistics aggregated across all repositories and
+    members of a GitHub organization. Changes by any member are counted as the
+    organization's changes and attributed to the member, with the contributor
+    stats of each repo fetched once no matter how many members contribute.
+    """
+
+    def __init__(
+        self,
+        environment_vars: EnvironmentVariables,
+        session: "ClientSession",
+        organization: str,
+        queries: Optional[GitHubApiQueries] = None,
+        shard: Optional[Shard] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        weekly_changes: bool = False,
+    ):
+        super().__init__(
+            environment_vars, session, queries, shard, checkpoint, weekly_changes
+        )
+        self.organization = organization
+
+        self._members: Optional[Set[str]] = None
+        self._member_stats: Optional[Dict[str, Dict[str, int]]] = None
+
+    async def to_str(self) -> str:
+        """
+        :return: summary of all available statistics, including per member
+        """
+        member_stats = await self.member_stats
+        formatted_members = "\n\t\t\t- ".join(
+            [
+                f"{k}: {v['additions'] + v['deletions']:,} lines changed, "
+                f"{v['commits']:,} commits, {v['repos']:,} repos"
+                for k, v in sorted(
+                    member_stats.items(),
+                    key=lambda t: t[1]["additions"] + t[1]["deletions"],
+                    reverse=True,
+                )
+            ]
+        )
+        return f"""{await super().to_str()}
+        Members: {len(await self.members):,}
+        Members' contributions:\n\t\t\t- {formatted_members}"""
+
+    @property
+    async def members(self) -> Set[str]:
+        """
+        :return: logins of the members of the organization
+        """
+        if self._members is not None:
+            return self._members
+
+        members = set()
+        cursor = None
+        while True:
+            raw_results = await self.queries.query(
+                GitHubApiQueries.org_members(self.organization, cursor)
+            )
+            members_page = (
+                (raw_results if raw_results is not None else {})
+                .get("data", {})
+                .get("organization", {})
+                .get("membersWithRole", {})
+            )
+            members.update(
+                member.get("login")
+                for member in members_page.get("nodes", [])
+                if member and member.get("login")
+            )
+
+            if not members_page.get("pageInfo", {}).get("hasNextPage", False):
+                break
+            cursor = members_page.get("pageInfo", {}).get("endCursor", cursor)
+
+        self._members = members
+        return self._members
+
+    async def get_stats(self) -> None:
+        """
+        Get summary stats of all organization repos using one query per page
+        of repos. Sets many attributes
+        """
+        self._is_listing_complete = False
+        self._stargazers = 0
+        self._forks = 0
+        self._excluded_languages = set()
+        self._languages = dict()
+        self._repos = set()
+        self._empty_repos = set()
+        self._repo_counts = dict()
+
+        # members are required to attribute changes before any are fetched
+        await self.members
+
+        cursor = None
+        while True:
+            raw_results = await self.queries.query(
+                GitHubApiQueries.org_repos_overview(self.organization, cursor)
+            )
+            organization = (raw_results if raw_results is not None else {}).get(
+                "data", {}
+            ).get("organization") or {}
+
+            self._name = (
+                organization.get("name") or organization.get("login") or self._NO_NAME
+            )
+
+            repos_page = organization.get("repositories", {})
+            await self.repo_stats(repos_page.get("nodes", []))
+
+            if not repos_page.get("pageInfo", {}).get("hasNextPage", False):
+                break
+            cursor = repos_page.get("pageInfo", {}).get("endCursor", cursor)
+
+        await self.manually_added_repo_stats()
+        self.languages_proportions()
+        self._is_listing_complete = True
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        :return: JSON serializable summary stats of the repo listing, including
+        members, and the per-repo results fetched so far
+        """
+        state = super().export_state()
+        if "listing" in state:
+            state["listing"]["members"] = sorted(self._members)
+        return state
+
+    def import_state(self, state: Dict[str, Any]) -> None:
+        """
+        Sets the summary stats of the repo listing and members, if any, and adds
+        the per-repo results of an exported state to the results already held
+        :param state: state returned by export_state, e.g. of another shard
+        """
+        super().import_state(state)
+        if "listing" in state:
+            self._members = set(state["listing"]["members"])
+
+    async def fetch_partial_state(self) -> Dict[str, Any]:
+        """
+        Fetches the summary stats and the per-repo results of the repos of the
+        shard. Total contributions are summed from the merged results instead
+        :return: the exported state, to be merged with those of other shards
+        """
+        await self.repos
+        await self.fetch_repo_results()
+        return self.export_state()
+
+    def invalidate_repo_lines_changed(self, repo: str) -> None:
+        """
+        Drops the lines changed in a repo, and the total contributions summed
+        from the lines changed in all repos, so they are fetched again
+        :param repo: name of the repo in owner/name format
+        """
+        super().invalidate_repo_lines_changed(repo)
+        self.invalidate_total_contributions()
+
+    def is_users_author(self, author: str) -> bool:
+        """
+        :param author: login of a contributor to a repo
+        :return: True if the author's changes are counted as the organization's
+        """
+        return author in self._members or author in self._EXCLUDED_USER_NAMES
+
+    @property
+    async def member_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        :return: lines added and deleted, commits and repos contributed to, per
+        member, from the contributor stats fetched once per repo
+        """
+        if self._member_stats is not None:
+            return self._member_stats
+        await self.lines_changed
+
+        member_stats: Dict[str, Dict[str, Any]] = dict()
+        for repo, result in self._repo_lines_changed.items():
+            if repo not in self._repos:
+                continue
+            for author, (additions, deletions, commits) in result["authors"].items():
+                if author not in self._members:
+                    continue
+                stats = member_stats.setdefault(
+                    author, {"additions": 0, "deletions": 0, "commits": 0, "repos": 0}
+                )
+                stats["additions"] += additions
+                stats["deletions"] += deletions
+                stats["commits"] += commits
+                stats["repos"] += 1
+
+        self._member_stats = member_stats
+        return self._member_stats
+
+    @property
+    async def total_contributions(self) -> int:
+        """
+        :return: count of commits by members to the organization's repositories
+        """
+        if self._total_contributions is not None:
+            return self._total_contributions
+        self._total_contributions = sum(
+            stats["commits"] for stats in (await self.member_stats).values()
+        )
+        return self._total_contributions
+
+    @property
+    async def collaborators(self) -> int:
+        """
+        :return: count of total collaborators and contributors to the
+        organization's repositories, including its members
+        """
+        if self._collaborators is not None:
+            return self._collaborators
+
+        collaborator_set, _ = await self.raw_collaborators()
+        logins = collaborator_set.union(await self.contributors)
+        # sketches do not count empty logins, e.g. of deleted users, at all
+        collaborators = len(
+            logins if isinstance(logins, HyperLogLog) else logins - {"", None}
+        )
+        self._collaborators = self.environment_vars.more_collaborators + collaborators
+        return self._collaborators
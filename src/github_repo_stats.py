@@ -1,11 +1,34 @@
 #!/usr/bin/python3
 
-from typing import Dict, Optional, Set, Tuple, Any, cast
-from aiohttp import ClientSession
+from asyncio import Future, ensure_future, gather
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    cast,
+)
 from datetime import date, timedelta
+from math import fsum
 
+from src.checkpoint import Checkpoint
 from src.env_vars import EnvironmentVariables
 from src.github_api_queries import GitHubApiQueries
+from src.hyperloglog import APPROX, HyperLogLog
+from src.shard import Shard
+from src.weekly_changes import WeeklyChanges
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
 
 ###############################################################################
 # GitHubRepoStats class
@@ -23,12 +46,37 @@ class GitHubRepoStats(object):
     ]  # exclude bot data from being included in statistical calculations
     _NO_NAME = "No Name"
 
-    def __init__(self, environment_vars: EnvironmentVariables, session: ClientSession):
+    def __init__(
+        self,
+        environment_vars: EnvironmentVariables,
+        session: "ClientSession",
+        queries: Optional[GitHubApiQueries] = None,
+        shard: Optional[Shard] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        weekly_changes: bool = False,
+    ):
+        """
+        :param queries: queries to use instead of a new GitHubApiQueries for the
+        user, e.g. one sharing a semaphore and response cache with other users
+        :param shard: shard of the repos to fetch per-repo results for, if the
+        results of the other repos are fetched by other runs
+        :param checkpoint: checkpoint to periodically save the per-repo results
+        fetched so far to, so an interrupted run can be resumed
+        :param weekly_changes: whether to store the weekly changes in each repo,
+        e.g. if planned to summarize the stats of a window of weeks from
+        """
         self.environment_vars: EnvironmentVariables = environment_vars
-        self.queries = GitHubApiQueries(
-            username=self.environment_vars.username,
-            access_token=self.environment_vars.access_token,
-            session=session,
+        self.shard = shard
+        self.checkpoint = checkpoint
+        self.has_weekly_changes = weekly_changes
+        self.queries = (
+            queries
+            if queries is not None
+            else GitHubApiQueries(
+                username=self.environment_vars.username,
+                access_token=self.environment_vars.access_token,
+                session=session,
+            )
         )
 
         self._name: Optional[str] = None
@@ -44,8 +92,8 @@ class GitHubRepoStats(object):
         self._avg_percent_weighted: Optional[str] = None
         self._views: Optional[int] = None
         self._collaborators: Optional[int] = None
-        self._collaborator_set: Optional[Set[str]] = None
-        self._contributors: Optional[Set[str]] = None
+        self._collaborator_set: Optional[Union[Set[str], HyperLogLog]] = None
+        self._contributors: Optional[Union[Set[str], HyperLogLog]] = None
         self._views_from_date: Optional[str] = None
         self._pull_requests: Optional[int] = None
         self._issues: Optional[int] = None
@@ -53,6 +101,21 @@ class GitHubRepoStats(object):
         self._collab_repos: Optional[Set[str]] = None
         self._contributed_collab_repos: Optional[Set[str]] = None
         self._is_fetch_rate_limit_exceeded: Optional[bool] = False
+        # the listing is filled one page at a time, and is only used, or
+        # saved, once all pages are fetched
+        self._is_listing_complete = False
+
+        # per-repo results, kept apart from the stats summarized from them so
+        # the results of separately fetched shards of repos can be merged
+        self._repo_lines_changed: Dict[str, Dict[str, Any]] = dict()
+        # weekly changes of the same responses, for stats of windows of weeks
+        self._weekly_changes = WeeklyChanges()
+        self._repo_collaborators: Dict[str, List[Optional[str]]] = dict()
+        self._repo_views: Dict[str, List[Tuple[str, int]]] = dict()
+        # stargazers and forks of each listed repo, to update their totals by
+        self._repo_counts: Dict[str, Tuple[int, int]] = dict()
+
+        self.__pending: Dict[str, Future] = dict()
 
     async def to_str(self) -> str:
         """
@@ -86,53 +149,41 @@ class GitHubRepoStats(object):
         Total number of languages: {len(list(languages.keys()))} (+{len(await self.excluded_languages):,})
         Languages:\n\t\t\t- {formatted_languages}"""
 
-    async def is_repo_name_invalid(self, repo_name) -> bool:
+    def is_repo_name_invalid(self, repo_name) -> bool:
         """
         Determines a repo name invalid if:
             - repo is already scraped and the name is in the list
-            - repo name is not included in and only_include_repos is being used
-            - repo name is included in exclude_repos
+            - repo name does not match only_include_repos patterns, if used
+            - repo name matches exclude_repos patterns
         :param repo_name: the name of the repo in owner/name format
         :return: True if repo is not to be included in self._repos
         """
         return (
             repo_name in self._repos
-            or len(self.environment_vars.only_included_repos) > 0
-            and repo_name not in self.environment_vars.only_included_repos
-            or repo_name in self.environment_vars.exclude_repos
+            or self.environment_vars.repo_filter.is_name_excluded(repo_name)
         )
 
-    async def is_repo_type_excluded(self, repo_data) -> bool:
+    def is_repo_type_excluded(self, repo_data) -> bool:
         """
-        Determines a repo type excluded if:
-            - repo is a fork and forked repos are not being included
-            - repo is archived and archived repos are being excluded
-            - repo is private and private repos are being excluded
-            - repo is public and public repos are being excluded
+        Determines a repo type excluded by the fork, archive, private and
+        public repo options
         :param repo_data: repo data returned from API fetch
         :return: True if repo type is not to be included in self._repos
         """
-        return (
-            not self.environment_vars.include_forked_repos
-            and (repo_data.get("isFork") or repo_data.get("fork"))
-            or self.environment_vars.exclude_archive_repos
-            and (repo_data.get("isArchived") or repo_data.get("archived"))
-            or self.environment_vars.exclude_private_repos
-            and (repo_data.get("isPrivate") or repo_data.get("private"))
-            or self.environment_vars.exclude_public_repos
-            and (not repo_data.get("isPrivate") or not repo_data.get("private"))
-        )
+        return self.environment_vars.repo_filter.is_type_excluded(repo_data)
 
     async def get_stats(self) -> None:
         """
         Get lots of summary stats using one big query. Sets many attributes
         """
+        self._is_listing_complete = False
         self._stargazers = 0
         self._forks = 0
         self._excluded_languages = set()
         self._languages = dict()
         self._repos = set()
         self._empty_repos = set()
+        self._repo_counts = dict()
 
         next_owned = None
         next_contrib = None
@@ -184,7 +235,13 @@ class GitHubRepoStats(object):
                 break
 
         await self.manually_added_repo_stats()
+        self.languages_proportions()
+        self._is_listing_complete = True
 
+    def languages_proportions(self) -> None:
+        """
+        Sets the proportion of the total size of all languages for each language
+        """
         # TODO: Improve languages to scale by number of contributions to specific filetypes
         langs_total = sum([v.get("size", 0) for v in self._languages.values()])
         for k, v in self._languages.items():
@@ -194,17 +251,17 @@ class GitHubRepoStats(object):
         """
         Gathers statistical data from fetches for repos user is associated with on GitHub
         """
-        for repo in repos:
-            if not repo or await self.is_repo_type_excluded(repo):
-                continue
-
+        for repo in self.environment_vars.repo_filter.filter(repos):
             name = repo.get("nameWithOwner")
-            if await self.is_repo_name_invalid(name):
+            if name in self._repos:
                 continue
             self._repos.add(name)
 
-            self._stargazers += repo.get("stargazers").get("totalCount", 0)
-            self._forks += repo.get("forkCount", 0)
+            stargazers = repo.get("stargazers").get("totalCount", 0)
+            forks = repo.get("forkCount", 0)
+            self._stargazers += stargazers
+            self._forks += forks
+            self._repo_counts[name] = (stargazers, forks)
 
             if repo.get("isEmpty"):
                 self._empty_repos.add(name)
@@ -212,7 +269,7 @@ class GitHubRepoStats(object):
 
             for lang in repo.get("languages", {}).get("edges", []):
                 name = lang.get("node", {}).get("name", "Other")
-                languages = await self.languages
+                languages = self._languages
 
                 if name in self.environment_vars.exclude_langs:
                     self._excluded_languages.add(name)
@@ -232,19 +289,20 @@ class GitHubRepoStats(object):
         """
         Gathers statistical data from fetches for manually added repos otherwise not fetched by user association
         """
-        lang_cols = self.queries.get_language_colors()
-
         for repo in self.environment_vars.manually_added_repos:
-            if await self.is_repo_name_invalid(repo):
+            if self.is_repo_name_invalid(repo):
                 continue
             self._repos.add(repo)
 
             repo_stats = await self.queries.query_rest(f"/repos/{repo}")
-            if await self.is_repo_type_excluded(repo_stats):
+            if self.is_repo_type_excluded(repo_stats):
                 continue
 
-            self._stargazers += repo_stats.get("stargazers_count", 0)
-            self._forks += repo_stats.get("forks", 0)
+            stargazers = repo_stats.get("stargazers_count", 0)
+            forks = repo_stats.get("forks", 0)
+            self._stargazers += stargazers
+            self._forks += forks
+            self._repo_counts[repo] = (stargazers, forks)
 
             if repo_stats.get("size") == 0:
                 self._empty_repos.add(repo)
@@ -254,7 +312,7 @@ class GitHubRepoStats(object):
                 langs = await self.queries.query_rest(f"/repos/{repo}/languages")
 
                 for lang, size in langs.items():
-                    languages = await self.languages
+                    languages = self._languages
 
                     if lang in self.environment_vars.exclude_langs:
                         continue
@@ -263,20 +321,59 @@ class GitHubRepoStats(object):
                         languages[lang]["size"] += size
                         languages[lang]["occurrences"] += 1
                     else:
+                        # language colors are only downloaded if required
+                        lang_cols = self.queries.get_language_colors()
                         languages[lang] = {
                             "size": size,
                             "occurrences": 1,
-                            "color": lang_cols.get(lang).get("color"),
+                            "color": lang_cols.get(lang, {}).get("color"),
                         }
 
+    async def shared(self, fetch: Callable[[], Awaitable[None]]) -> None:
+        """
+        Runs a fetch once for all concurrent callers, e.g. of stats awaited by
+        more than one image at once, instead of once per caller, timing it as
+        a phase of fetching stats
+        :param fetch: method fetching and setting stats
+        """
+        key = fetch.__name__
+
+        async def timed() -> None:
+            # e.g. lines_changed for fetch_repo_lines_changed
+            with self.phase(key.replace("fetch_repo_", "")):
+                await fetch()
+
+        pending = self.__pending.get(key)
+        if pending is None:
+            pending = self.__pending[key] = ensure_future(timed())
+            pending.add_done_callback(lambda _: self.__pending.pop(key, None))
+        await pending
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times a phase of fetching stats in the metrics of the queries, and
+        records it as a span if tracing
+        :param name: name of the phase, e.g. lines_changed
+        """
+        with self.queries.metrics.phase(name), self.queries.tracer.span(name, "phase"):
+            yield
+
+    async def fetch_listing(self) -> None:
+        """
+        Fetches the summary stats of the repo listing if not yet fully fetched,
+        e.g. by a fetch interrupted after some pages, or waits for a fetch in
+        progress instead of using its partial stats
+        """
+        if not self._is_listing_complete:
+            await self.shared(self.get_stats)
+
     @property
     async def name(self) -> str:
         """
         :return: GitHub user's name
         """
-        if self._name is not None:
-            return self._name
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._name is not None
         return self._name
 
@@ -285,9 +382,7 @@ class GitHubRepoStats(object):
         """
         :return: total number of stargazers on user's repos
         """
-        if self._stargazers is not None:
-            return self._stargazers
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._stargazers is not None
         return self._stargazers
 
@@ -296,9 +391,7 @@ class GitHubRepoStats(object):
         """
         :return: total number of forks on user's repos
         """
-        if self._forks is not None:
-            return self._forks
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._forks is not None
         return self._forks
 
@@ -307,9 +400,7 @@ class GitHubRepoStats(object):
         """
         :return: summary of languages used by the user
         """
-        if self._languages is not None:
-            return self._languages
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._languages is not None
         return self._languages
 
@@ -318,9 +409,7 @@ class GitHubRepoStats(object):
         """
         :return: summary of languages used by the user
         """
-        if self._excluded_languages is not None:
-            return self._excluded_languages
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._excluded_languages is not None
         return self._excluded_languages
 
@@ -329,9 +418,8 @@ class GitHubRepoStats(object):
         """
         :return: summary of languages used by the user, with proportional usage
         """
-        if self._languages is None:
-            await self.get_stats()
-            assert self._languages is not None
+        await self.fetch_listing()
+        assert self._languages is not None
         return {k: v.get("prop", 0) for (k, v) in self._languages.items()}
 
     @property
@@ -339,9 +427,7 @@ class GitHubRepoStats(object):
         """
         :return: list of names of repos user is involved with
         """
-        if self._repos is not None:
-            return self._repos
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._repos is not None
         return self._repos
 
@@ -352,7 +438,7 @@ class GitHubRepoStats(object):
         """
         if self._owned_repos is not None:
             return self._owned_repos
-        await self.get_stats()
+        await self.fetch_listing()
         assert self._repos is not None
         self._owned_repos = set(
             [
@@ -383,20 +469,21 @@ class GitHubRepoStats(object):
             return self._total_contributions
         self._total_contributions = 0
 
-        years = (
-            (await self.queries.query(GitHubApiQueries.contributions_all_years()))
-            .get("data", {})
-            .get("viewer", {})
-            .get("contributionsCollection", {})
-            .get("contributionYears", [])
-        )
+        with self.phase("total_contributions"):
+            years = (
+                (await self.queries.query(GitHubApiQueries.contributions_all_years()))
+                .get("data", {})
+                .get("viewer", {})
+                .get("contributionsCollection", {})
+                .get("contributionYears", [])
+            )
 
-        by_year = (
-            (await self.queries.query(GitHubApiQueries.all_contributions(years)))
-            .get("data", {})
-            .get("viewer", {})
-            .values()
-        )
+            by_year = (
+                (await self.queries.query(GitHubApiQueries.all_contributions(years)))
+                .get("data", {})
+                .get("viewer", {})
+                .values()
+            )
 
         for year in by_year:
             self._total_contributions += year.get("contributionCalendar", {}).get(
@@ -404,6 +491,308 @@ class GitHubRepoStats(object):
             )
         return cast(int, self._total_contributions)
 
+    @property
+    async def shard_repos(self) -> Set[str]:
+        """
+        :return: names of the repos to fetch per-repo results for, all repos
+        unless a shard is used
+        """
+        await self.repos
+        return self.listed_shard_repos()
+
+    def listed_shard_repos(self) -> Set[str]:
+        """
+        :return: names of the repos of the shard in the held repo listing
+        """
+        return self._repos if self.shard is None else self.shard.select(self._repos)
+
+    def export_state(self) -> Dict[str, Any]:
+        """
+        :return: JSON serializable summary stats of the repo listing and the
+        per-repo results fetched so far
+        """
+        state = {
+            "total_contributions": self._total_contributions,
+            "repo_lines_changed": {
+                repo: {
+                    **result,
+                    "contributors": sorted(result["contributors"], key=str),
+                    "other_authors": sorted(result["other_authors"], key=str),
+                }
+                for repo, result in self._repo_lines_changed.items()
+            },
+            "repo_collaborators": self._repo_collaborators,
+            "repo_views": self._repo_views,
+        }
+        if self.has_weekly_changes:
+            state["weekly_changes"] = self._weekly_changes.to_json()
+        # a partial listing is fetched again instead, by the next run
+        if self._is_listing_complete:
+            state["listing"] = {
+                "name": self._name,
+                "stargazers": self._stargazers,
+                "forks": self._forks,
+                "languages": self._languages,
+                "excluded_languages": sorted(self._excluded_languages),
+                "repos": sorted(self._repos),
+                "empty_repos": sorted(self._empty_repos),
+                "repo_counts": {
+                    repo: list(counts) for repo, counts in self._repo_counts.items()
+                },
+            }
+        return state
+
+    def import_state(self, state: Dict[str, Any]) -> None:
+        """
+        Sets the summary stats of the repo listing, if any, and adds the
+        per-repo results of an exported state to the results already held
+        :param state: state returned by export_state, e.g. of another shard
+        """
+        listing = state.get("listing")
+        if listing is not None:
+            self._name = listing["name"]
+            self._stargazers = listing["stargazers"]
+            self._forks = listing["forks"]
+            self._languages = listing["languages"]
+            self._excluded_languages = set(listing["excluded_languages"])
+            self._repos = set(listing["repos"])
+            self._empty_repos = set(listing["empty_repos"])
+            self._repo_counts = {
+                repo: tuple(counts)
+                for repo, counts in listing.get("repo_counts", {}).items()
+            }
+            self._is_listing_complete = True
+        if state.get("total_contributions") is not None:
+            self._total_contributions = state["total_contributions"]
+
+        for repo, result in state.get("repo_lines_changed", {}).items():
+            self._repo_lines_changed[repo] = {
+                **result,
+                "contributors": set(result["contributors"]),
+                "other_authors": set(result["other_authors"]),
+                "authors": {k: tuple(v) for k, v in result["authors"].items()},
+            }
+        self._weekly_changes.update(
+            WeeklyChanges.from_json(state.get("weekly_changes", {}))
+        )
+        self._repo_collaborators.update(state.get("repo_collaborators", {}))
+        for repo, views in state.get("repo_views", {}).items():
+            self._repo_views[repo] = [tuple(view) for view in views]
+
+    def has_listing(self) -> bool:
+        """
+        :return: True if the summary stats of the repo listing are held, e.g.
+        imported from the saved stats of the last run
+        """
+        return self._is_listing_complete
+
+    def is_repo_listed(self, repo: str, with_languages: bool = False) -> bool:
+        """
+        :param repo: name of the repo in owner/name format
+        :param with_languages: whether the languages of the repo must be listed
+        too, which they are not while the repo is empty
+        :return: True if the repo is in the held repo listing
+        """
+        return (
+            self._is_listing_complete
+            and repo in self._repos
+            and not (with_languages and repo in self._empty_repos)
+        )
+
+    def pending_repos(self) -> Dict[str, Set[str]]:
+        """
+        :return: repos of the shard whose per-repo results are yet to be
+        fetched, by REST endpoint, e.g. to estimate the cost of a run from the
+        held repo listing
+        """
+        repos = self.listed_shard_repos()
+        return {
+            "contributors": {
+                repo
+                for repo in repos
+                if repo not in self._empty_repos
+                and repo not in self._repo_lines_changed
+            },
+            "collaborators": {
+                repo for repo in repos if repo not in self._repo_collaborators
+            },
+            "traffic": {repo for repo in repos if repo not in self._repo_views},
+        }
+
+    def has_total_contributions(self) -> bool:
+        """
+        :return: True if the count of total contributions is held, e.g.
+        imported from saved stats
+        """
+        return self._total_contributions is not None
+
+    def set_repo_counts(self, repo: str, stargazers: int, forks: int) -> None:
+        """
+        Updates the stargazers and forks of a listed repo, and their totals,
+        e.g. to the counts sent with a webhook event of the repo
+        :param repo: name of the repo in owner/name format
+        :param stargazers: current number of stargazers of the repo
+        :param forks: current number of forks of the repo
+        """
+        if repo not in self._repo_counts:
+            return
+        old_stargazers, old_forks = self._repo_counts[repo]
+        self._stargazers += stargazers - old_stargazers
+        self._forks += forks - old_forks
+        self._repo_counts[repo] = (stargazers, forks)
+
+    def invalidate_listing(self) -> None:
+        """
+        Drops the summary stats of the repo listing, e.g. when a repo not yet
+        listed is pushed to, so the listing is fetched again. Per-repo results
+        are kept, so only those of repos not yet fetched are fetched
+        """
+        self._is_listing_complete = False
+        self._repos = None
+        self._owned_repos = None
+
+    def invalidate_repo_lines_changed(self, repo: str) -> None:
+        """
+        Drops the lines changed in a repo, e.g. when the repo is pushed to, so
+        they are fetched again
+        :param repo: name of the repo in owner/name format
+        """
+        self._repo_lines_changed.pop(repo, None)
+        self._weekly_changes.remove(repo)
+
+    def invalidate_total_contributions(self) -> None:
+        """
+        Drops the count of total contributions, e.g. when the user pushes to a
+        repo, so it is fetched again
+        """
+        self._total_contributions = None
+
+    async def fetch_partial_state(self) -> Dict[str, Any]:
+        """
+        Fetches the summary stats and the per-repo results of the repos of the
+        shard, without summarizing the per-repo results
+        :return: the exported state, to be merged with those of other shards
+        """
+        await self.repos
+        await self.total_contributions
+        await self.fetch_repo_results()
+        return self.export_state()
+
+    async def fetch_repo_results(self) -> None:
+        """
+        Concurrently fetches all per-repo results not yet fetched
+        """
+        await gather(
+            self.shared(self.fetch_repo_lines_changed),
+            self.shared(self.fetch_repo_collaborators),
+            self.shared(self.fetch_repo_views),
+        )
+
+    async def for_each_repo(
+        self, repos: Iterable[str], path: str, process: Callable[[str, Any], None]
+    ) -> None:
+        """
+        Concurrently fetches a REST path for each repo, bounded by the number of
+        connections of the queries, processing each response as it is returned
+        and saving a checkpoint whenever one is due
+        :param repos: names of repos in owner/name format
+        :param path: REST path to fetch with {repo} in place of the repo name
+        :param process: function called with each repo name and its response
+        """
+
+        async def fetch(repo: str) -> None:
+            process(repo, await self.queries.query_rest(path.format(repo=repo)))
+            if self.checkpoint is not None and self.checkpoint.is_due():
+                self.checkpoint.save(self.export_state())
+
+        await gather(*[fetch(repo) for repo in repos])
+
+    def is_users_author(self, author: str) -> bool:
+        """
+        :param author: login of a contributor to a repo
+        :return: True if the author's changes are counted as the user's changes
+        """
+        return (
+            author == self.environment_vars.username
+            or author in self._EXCLUDED_USER_NAMES
+        )
+
+    def new_login_set(self) -> Union[Set[str], HyperLogLog]:
+        """
+        :return: an empty set of logins summed over all repos, or a sketch
+        estimating their count in fixed memory in the approx count mode
+        """
+        if self.environment_vars.count_mode == APPROX:
+            return HyperLogLog()
+        return set()
+
+    def repo_lines_changed(self, contributors_data: Any) -> Dict[str, Any]:
+        """
+        Sums the weekly lines added and deleted in a repo by the user and others
+        :param contributors_data: response of the repo /stats/contributors path
+        :return: the user's additions, deletions and commits, the other authors'
+        total changes, all contributors and the user's changes by author
+        """
+        result = {
+            "additions": 0,
+            "deletions": 0,
+            "commits": 0,
+            "others_changes": 0,
+            "contributors": set(),
+            "other_authors": set(),
+            "authors": dict(),
+        }
+
+        for author_obj in contributors_data:
+            # Handle malformed response from API by skipping this repo
+            if not isinstance(author_obj, dict) or not isinstance(
+                author_obj.get("author", {}), dict
+            ):
+                continue
+            author = author_obj.get("author", {}).get("login", "")
+            result["contributors"].add(author)  # count number of total contributors
+
+            if not self.is_users_author(author):
+                for week in author_obj.get("weeks", []):
+                    result["others_changes"] += week.get("a", 0)
+                    result["others_changes"] += week.get("d", 0)
+                    result["other_authors"].add(author)
+            else:
+                additions = deletions = 0
+                for week in author_obj.get("weeks", []):
+                    additions += week.get("a", 0)
+                    deletions += week.get("d", 0)
+                commits = author_obj.get("total", 0)
+                result["additions"] += additions
+                result["deletions"] += deletions
+                result["commits"] += commits
+                result["authors"][author] = (additions, deletions, commits)
+        return result
+
+    async def fetch_repo_lines_changed(self) -> None:
+        """
+        Fetches the lines changed in each non-empty repo not yet fetched
+        """
+        repos = await self.shard_repos
+
+        def process(repo: str, r: Any) -> None:
+            # errors, e.g. of rate limits, are left to be fetched again
+            if isinstance(r, list):
+                self._repo_lines_changed[repo] = self.repo_lines_changed(r)
+                if self.has_weekly_changes:
+                    self._weekly_changes.add(repo, r, self.is_users_author)
+
+        await self.for_each_repo(
+            [
+                repo
+                for repo in repos
+                if repo not in self._empty_repos
+                and repo not in self._repo_lines_changed
+            ],
+            "/repos/{repo}/stats/contributors",
+            process,
+        )
+
     @property
     async def lines_changed(self) -> Tuple[int, int]:
         """
@@ -416,9 +805,12 @@ class GitHubRepoStats(object):
             return self._users_lines_changed
         _, collab_repos = await self.raw_collaborators()
         slave_status_repos = self.environment_vars.more_collab_repos
-        exclusive_collab_repos = self.environment_vars.only_included_collab_repos
+        collab_repo_filter = self.environment_vars.collab_repo_filter
+
+        await self.shared(self.fetch_repo_lines_changed)
+        repos = await self.repos
 
-        contributor_set = set()
+        contributor_set = self.new_login_set()
         repo_total_changes_arr = []
         author_contribution_percentages = []
         author_contribution_percentages_weighted = []
@@ -428,39 +820,21 @@ class GitHubRepoStats(object):
         self._contributed_collab_repos = collab_repos.copy().union(
             slave_status_repos.copy()
         )
+        all_collab_repos = collab_repos.union(slave_status_repos)
 
-        for repo in await self.repos:
-            if repo in self._empty_repos:
+        # repos are summarized in name order so results do not depend on the
+        # order responses are returned in, or on how the repos were sharded
+        for repo in sorted(self._repo_lines_changed):
+            if repo not in repos:
                 continue
-            repo_contributors = set()
-            repo_contributors.add(self.environment_vars.username)
-            other_authors_total_changes = 0
-            author_additions = 0
-            author_deletions = 0
-
-            r = await self.queries.query_rest(f"/repos/{repo}/stats/contributors")
-
-            for author_obj in r:
-                # Handle malformed response from API by skipping this repo
-                if not isinstance(author_obj, dict) or not isinstance(
-                    author_obj.get("author", {}), dict
-                ):
-                    continue
-                author = author_obj.get("author", {}).get("login", "")
-                contributor_set.add(author)  # count number of total other contributors
-
-                if (
-                    author != self.environment_vars.username
-                    and author not in self._EXCLUDED_USER_NAMES
-                ):
-                    for week in author_obj.get("weeks", []):
-                        other_authors_total_changes += week.get("a", 0)
-                        other_authors_total_changes += week.get("d", 0)
-                        repo_contributors.add(author)
-                else:
-                    for week in author_obj.get("weeks", []):
-                        author_additions += week.get("a", 0)
-                        author_deletions += week.get("d", 0)
+            result = self._repo_lines_changed[repo]
+            # the user is always counted as a contributor to the repo
+            repo_contributors = {self.environment_vars.username}
+            repo_contributors.update(result["other_authors"])
+            contributor_set.update(result["contributors"])
+            other_authors_total_changes = result["others_changes"]
+            author_additions = result["additions"]
+            author_deletions = result["deletions"]
             author_total_additions += author_additions
             author_total_deletions += author_deletions
 
@@ -468,22 +842,18 @@ class GitHubRepoStats(object):
             if other_authors_total_changes > 0:
                 self._contributed_collab_repos.add(repo)
 
+            included = not collab_repo_filter.matches_excluded(repo) and (
+                collab_repo_filter.matches_included(repo) or repo in slave_status_repos
+            )
+            # either collaborators are ghosting or no show in repo
+            collab = repo in all_collab_repos
+            self._weekly_changes.classify(repo, included, collab)
+
             # calculate average author's contributions to each repository with at least one other collaborator
             if (
-                repo not in self.environment_vars.exclude_collab_repos
-                and (
-                    not exclusive_collab_repos
-                    or repo in exclusive_collab_repos
-                    or repo in slave_status_repos
-                )
+                included
                 and (author_additions + author_deletions) > 0
-                and (
-                    other_authors_total_changes > 0
-                    or repo
-                    in collab_repos.union(
-                        slave_status_repos
-                    )  # either collaborators are ghosting or no show in repo
-                )
+                and (other_authors_total_changes > 0 or collab)
             ):
                 repo_total_changes = (
                     other_authors_total_changes + author_additions + author_deletions
@@ -505,8 +875,8 @@ class GitHubRepoStats(object):
                 repo_total_changes_arr.append(repo_total_changes)
 
         if sum(author_contribution_percentages) > 0:
-            self._avg_percent = f"{(sum(author_contribution_percentages) / len(repo_total_changes_arr) * 100):0.2f}%"
-            self._avg_percent_weighted = f"{(sum(author_contribution_percentages_weighted) / len(repo_total_changes_arr) * 100):0.2f}%"
+            self._avg_percent = f"{(fsum(author_contribution_percentages) / len(repo_total_changes_arr) * 100):0.2f}%"
+            self._avg_percent_weighted = f"{(fsum(author_contribution_percentages_weighted) / len(repo_total_changes_arr) * 100):0.2f}%"
         else:
             self._avg_percent_weighted = self._avg_percent = "N/A"
 
@@ -515,6 +885,17 @@ class GitHubRepoStats(object):
         self._users_lines_changed = (author_total_additions, author_total_deletions)
         return self._users_lines_changed
 
+    @property
+    async def weekly_changes(self) -> WeeklyChanges:
+        """
+        :return: store of the weekly changes in each repo, to summarize the
+        stats of windows of weeks from, empty unless stored
+        """
+        # the repos whose shares of changes are averaged are classified with
+        # those of all weeks
+        await self.lines_changed
+        return self._weekly_changes
+
     @property
     async def avg_contribution_percent(self) -> str:
         """
@@ -537,6 +918,26 @@ class GitHubRepoStats(object):
         assert self._avg_percent_weighted is not None
         return self._avg_percent_weighted
 
+    async def fetch_repo_views(self) -> None:
+        """
+        Fetches the daily views of the last 14 days of each repo not yet fetched
+        """
+        repos = await self.shard_repos
+
+        def process(repo: str, r: Dict) -> None:
+            # errors, e.g. of rate limits, are left to be fetched again
+            if isinstance(r, dict) and "views" in r:
+                self._repo_views[repo] = [
+                    (view.get("timestamp")[:10], view.get("count", 0))
+                    for view in r.get("views", [])
+                ]
+
+        await self.for_each_repo(
+            [repo for repo in repos if repo not in self._repo_views],
+            "/repos/{repo}/traffic/views",
+            process,
+        )
+
     @property
     async def views(self) -> int:
         """
@@ -552,16 +953,24 @@ class GitHubRepoStats(object):
         yesterday = (date.today() - timedelta(1)).strftime(self._DATE_FORMAT)
         dates = {last_viewed, yesterday}
 
+        await self.shared(self.fetch_repo_views)
+        repos = await self.repos
+
         today_view_count = 0
-        for repo in await self.repos:
-            r = await self.queries.query_rest(f"/repos/{repo}/traffic/views")
+        new_view_count = 0
+        for repo, views in self._repo_views.items():
+            if repo not in repos:
+                continue
+            for day, count in views:
+                if day == today:
+                    today_view_count += count
+                elif day > last_viewed:
+                    new_view_count += count
+                    dates.add(day)
 
-            for view in r.get("views", []):
-                if view.get("timestamp")[:10] == today:
-                    today_view_count += view.get("count", 0)
-                elif view.get("timestamp")[:10] > last_viewed:
-                    self.environment_vars.set_views(view.get("count", 0))
-                    dates.add(view.get("timestamp")[:10])
+        # stored views are updated once all repos are summarized, and only
+        # written to the db when the run commits its environment
+        self.environment_vars.set_views(new_view_count)
 
         if last_viewed == "0000-00-00":
             dates.remove(last_viewed)
@@ -592,27 +1001,45 @@ class GitHubRepoStats(object):
         assert self._views_from_date is not None
         return self._views_from_date
 
-    async def raw_collaborators(self) -> (Set, Set):
+    async def raw_collaborators(self) -> (Union[Set, HyperLogLog], Set):
         if self._collaborator_set is not None and self._collab_repos is not None:
             return self._collaborator_set, self._collab_repos
 
-        self._collaborator_set = set()
-        self._collab_repos = set()
+        await self.shared(self.fetch_repo_collaborators)
+        repos = await self.repos
 
-        for repo in await self.repos:
-            r = await self.queries.query_rest(f"/repos/{repo}/collaborators")
-            collab_count = 0
+        self._collaborator_set = self.new_login_set()
+        self._collab_repos = set()
 
-            for obj in r:
-                if isinstance(obj, dict):
-                    collab_count += 1
-                    self._collaborator_set.add(obj.get("login"))
+        for repo, collaborators in self._repo_collaborators.items():
+            if repo not in repos:
+                continue
+            self._collaborator_set.update(collaborators)
 
-                    if collab_count > 1:
-                        self._collab_repos.add(repo)
+            if len(collaborators) > 1:
+                self._collab_repos.add(repo)
 
         return self._collaborator_set, self._collab_repos
 
+    async def fetch_repo_collaborators(self) -> None:
+        """
+        Fetches the logins of the collaborators of each repo not yet fetched
+        """
+        repos = await self.shard_repos
+
+        def process(repo: str, r: Any) -> None:
+            # errors, e.g. of rate limits, are left to be fetched again
+            if isinstance(r, list):
+                self._repo_collaborators[repo] = [
+                    obj.get("login") for obj in r if isinstance(obj, dict)
+                ]
+
+        await self.for_each_repo(
+            [repo for repo in repos if repo not in self._repo_collaborators],
+            "/repos/{repo}/collaborators",
+            process,
+        )
+
     @property
     async def collaborators(self) -> int:
         """
@@ -627,9 +1054,10 @@ class GitHubRepoStats(object):
         return self._collaborators
 
     @property
-    async def contributors(self) -> Set:
+    async def contributors(self) -> Union[Set, HyperLogLog]:
         """
-        :return: count of total contributors to user's repositories
+        :return: total contributors to user's repositories, counted by len,
+        as a sketch in the approx count mode
         """
         if self._contributors is not None:
             return self._contributors
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+
+from base64 import b64decode, b64encode
+from hashlib import blake2b
+from itertools import islice
+from math import log, sqrt
+from typing import Any, Dict, Iterable, Optional, Set, Union
+from zlib import compress, decompress
+
+EXACT = "exact"  # distinct logins counted with sets of all of them
+APPROX = "approx"  # distinct logins estimated with HyperLogLog sketches
+COUNT_MODES = (EXACT, APPROX)
+DEFAULT_PRECISION = 14  # 2**14 one-byte registers, a 0.81% standard error
+HASH_BITS = 64
+# bias correction of the estimate by number of registers, for fewer than 128
+ALPHAS = {16: 0.673, 32: 0.697, 64: 0.709}
+# 2**-rank of each rank a register can hold, summed by the estimate
+POWERS = [2.0**-rank for rank in range(HASH_BITS + 1)]
+# distinct items held before hashing them into the registers, so items added
+# again, e.g. the user and frequent contributors of each repo, are hashed once
+PENDING_LIMIT = 4096
+
+###############################################################################
+# HyperLogLog class
+###############################################################################
+
+
+class HyperLogLog(object):
+    """
+    Sketch estimating the number of distinct items added to it in a fixed
+    2**precision bytes, however many items are added. Sketches of the same
+    precision merge into the sketch of the union of their items, e.g. of the
+    contributors of separately fetched shards of repos or of many users, and
+    their estimates have a relative standard error of 1.04 / sqrt(2**precision).
+    """
+
+    def __init__(
+        self, precision: int = DEFAULT_PRECISION, registers: Optional[bytes] = None
+    ):
+        """
+        :param precision: number of bits of the hash of an item that select its
+        register, from 4 to 16
+        :param registers: registers of a sketch to copy, empty if None
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(
+                f"Invalid HyperLogLog precision {precision} (expected 4 to 16)"
+            )
+        self.precision = precision
+        self.__registers = (
+            bytearray(registers) if registers is not None else bytearray(1 << precision)
+        )
+        if len(self.__registers) != 1 << precision:
+            raise ValueError(
+                f"Invalid HyperLogLog registers ({len(self.__registers)} bytes, "
+                f"expected {1 << precision})"
+            )
+        self.__pending: Set[str] = set()
+
+    @property
+    def error(self) -> float:
+        """
+        :return: relative standard error of the estimated count
+        """
+        return 1.04 / sqrt(len(self.__registers))
+
+    def add(self, item: str) -> None:
+        """
+        :param item: item to count, ignored if empty, e.g. the login of a
+        deleted user
+        """
+        self.update((item,))
+
+    def update(self, items: Iterable[str]) -> None:
+        """
+        :param items: items to count, as with set.update
+        """
+        if (
+            isinstance(items, (set, frozenset, list, tuple))
+            and len(items) < PENDING_LIMIT
+        ):
+            # e.g. the contributors of a repo
+            self.__pending.update(items)
+            if len(self.__pending) >= PENDING_LIMIT:
+                self.__flush()
+            return
+        # held in chunks, so counting many items at once takes fixed memory
+        iterator = iter(items)
+        chunk = list(islice(iterator, PENDING_LIMIT))
+        while chunk:
+            self.__pending.update(chunk)
+            if len(self.__pending) >= PENDING_LIMIT:
+                self.__flush()
+            chunk = list(islice(iterator, PENDING_LIMIT))
+
+    def __flush(self) -> bytearray:
+        """
+        Hashes the pending items into the registers
+        :return: the registers
+        """
+        if not self.__pending:
+            return self.__registers
+        # hashed in one loop with the lookups of each item bound once, as
+        # hashing is most of the cost of counting in approx mode
+        registers = self.__registers
+        bits = HASH_BITS - self.precision
+        mask = (1 << bits) - 1
+        digest_size = HASH_BITS // 8
+        from_bytes = int.from_bytes
+        for item in self.__pending:
+            if not item:
+                continue
+            value = from_bytes(
+                blake2b(item.encode("utf-8"), digest_size=digest_size).digest(), "big"
+            )
+            # position of the first set bit of the rest of the hash
+            rank = bits - (value & mask).bit_length() + 1
+            if rank > registers[value >> bits]:
+                registers[value >> bits] = rank
+        self.__pending.clear()
+        return registers
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """
+        Counts the items of another sketch of the same precision
+        """
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Cannot merge HyperLogLog sketches of precisions "
+                f"{self.precision} and {other.precision}"
+            )
+        self.__registers = bytearray(map(max, self.__flush(), other.__flush()))
+
+    def union(self, *others: Union["HyperLogLog", Iterable[str]]) -> "HyperLogLog":
+        """
+        :param others: sketches or items, as with set.union
+        :return: a new sketch of the items of this and all others
+        """
+        result = self.copy()
+        for other in others:
+            if isinstance(other, HyperLogLog):
+                result.merge(other)
+            else:
+                result.update(other)
+        return result
+
+    def copy(self) -> "HyperLogLog":
+        """
+        :return: a new sketch of the same items
+        """
+        return HyperLogLog(self.precision, self.__flush())
+
+    def __len__(self) -> int:
+        """
+        :return: estimated number of distinct items added
+        """
+        registers = self.__flush()
+        num_registers = len(registers)
+        alpha = ALPHAS.get(num_registers, 0.7213 / (1 + 1.079 / num_registers))
+        estimate = (
+            alpha
+            * num_registers
+            * num_registers
+            / sum(map(POWERS.__getitem__, registers))
+        )
+        zeros = registers.count(0)
+        # linear counting of the empty registers is more accurate while many
+        # registers are still empty
+        if estimate <= 2.5 * num_registers and zeros:
+            estimate = num_registers * log(num_registers / zeros)
+        return round(estimate)
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        :return: the sketch in the form of JSON, with its registers compressed,
+        e.g. to store in a stats artifact
+        """
+        return {
+            "precision": self.precision,
+            "registers": b64encode(compress(self.__flush())).decode("ascii"),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        """
+        :param data: a sketch in the form of JSON, as returned by to_json
+        :return: the sketch
+        """
+        return cls(data["precision"], decompress(b64decode(data["registers"])))
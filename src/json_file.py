@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+
+from gzip import open as gzip_open
+from json import loads
+from os import makedirs, replace
+from os.path import dirname
+from typing import Any
+
+
+def write_json_file(path: str, text: str) -> None:
+    """
+    Atomically writes JSON to a file, gzip compressed if the path ends in .gz,
+    so a run stopped while writing never leaves a partially written file
+    :param path: the file path to write to
+    :param text: the serialized JSON
+    """
+    if dirname(path):
+        makedirs(dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    if path.endswith(".gz"):
+        with gzip_open(temp_path, "wt", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    replace(temp_path, path)
+
+
+def read_json_file(path: str) -> Any:
+    """
+    Reads JSON from a file, decompressing it if the path ends in .gz
+    :param path: the file path to read from
+    :return: the deserialized JSON
+    """
+    if path.endswith(".gz"):
+        with gzip_open(path, "rt", encoding="utf-8") as f:
+            return loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return loads(f.read())
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+
+from fnmatch import translate
+from re import compile as compile_regex, Pattern
+from typing import Dict, Iterable, List, Optional
+
+###############################################################################
+# Pattern helpers
+###############################################################################
+
+GLOB_CHARS = "*?["  # characters that make a pattern a glob rather than a name
+ANY_OWNER_PREFIX = "*/"  # prefix of globs matching a repo name under any owner
+REGEX_PREFIX = "re:"  # prefix marking a pattern as a regular expression
+NEGATION_PREFIX = "!"  # prefix marking a pattern as a negation (re-include)
+
+
+def split_patterns(patterns: Optional[str]) -> List[str]:
+    """
+    Split a comma separated environment variable value into patterns
+    :param patterns: comma separated patterns, or None
+    :return: list of stripped, non-empty patterns
+    """
+    if not patterns:
+        return []
+    return [x.strip() for x in patterns.split(",") if x.strip()]
+
+
+###############################################################################
+# PatternSet class
+###############################################################################
+
+
+class PatternSet(object):
+    """
+    A set of exact names, globs and regexes compiled into a single matcher.
+    Exact names are kept in a set, globs are indexed in a trie by their literal
+    prefix and the remainder of every glob sharing a prefix is combined into a
+    single regex, so each name is tested against at most one regex per prefix
+    character instead of against every pattern. Globs for any owner (*/name)
+    are indexed by the literal prefix of their repo name instead.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.__exact = set()
+        self.__trie: Dict = dict()
+        self.__size = 0
+        self.__any_owner: Optional[PatternSet] = None
+
+        any_owner = []
+        pending: Dict[int, List[str]] = dict()
+        nodes: Dict[int, Dict] = dict()
+
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern:
+                continue
+            self.__size += 1
+
+            if pattern.startswith(ANY_OWNER_PREFIX):
+                any_owner.append(pattern[len(ANY_OWNER_PREFIX) :])
+                continue
+            elif pattern.startswith(REGEX_PREFIX):
+                prefix, remainder = "", f"(?:{pattern[len(REGEX_PREFIX):]})"
+            else:
+                cut = min(
+                    [i for i in map(pattern.find, GLOB_CHARS) if i >= 0],
+                    default=-1,
+                )
+                if cut < 0:
+                    self.__exact.add(pattern)
+                    continue
+                prefix, remainder = pattern[:cut], translate(pattern[cut:])
+
+            node = self.__trie
+            for char in prefix:
+                node = node.setdefault(char, dict())
+            nodes[id(node)] = node
+            pending.setdefault(id(node), []).append(remainder)
+
+        # the empty string key of a trie node holds the combined regex for it
+        for key, remainders in pending.items():
+            nodes[key][""] = compile_regex("|".join(remainders))
+
+        if any_owner:
+            self.__any_owner = PatternSet(any_owner)
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def matches(self, name: str) -> bool:
+        """
+        :param name: the name to test, e.g. a repo name in owner/name format
+        :return: True if the name matches any pattern in the set
+        """
+        if name in self.__exact:
+            return True
+
+        if self.__any_owner is not None:
+            _, separator, repo_name = name.partition("/")
+            if separator and self.__any_owner.matches(repo_name):
+                return True
+
+        node = self.__trie
+        for i in range(len(name) + 1):
+            regex: Optional[Pattern] = node.get("")
+            if regex is not None and regex.fullmatch(name, i):
+                return True
+            if i == len(name):
+                break
+            node = node.get(name[i])
+            if node is None:
+                break
+        return False
+
+
+###############################################################################
+# RepoFilter class
+###############################################################################
+
+
+class RepoFilter(object):
+    """
+    Repository name and type rules compiled once into a synchronous matcher.
+
+    Name patterns may be exact names (owner/repo), globs (owner/prefix-*) or
+    regexes (re:owner/.+-legacy), and any pattern prefixed with ! negates it,
+    re-including names otherwise matched by the other patterns of its list.
+    """
+
+    def __init__(
+        self,
+        exclude_patterns: Iterable[str] = (),
+        include_patterns: Iterable[str] = (),
+        include_forked_repos: bool = True,
+        exclude_archive_repos: bool = False,
+        exclude_private_repos: bool = False,
+        exclude_public_repos: bool = False,
+    ):
+        self.__exclude, self.__exclude_negated = self.__compile(exclude_patterns)
+        self.__include, self.__include_negated = self.__compile(include_patterns)
+
+        self.include_forked_repos = include_forked_repos
+        self.exclude_archive_repos = exclude_archive_repos
+        self.exclude_private_repos = exclude_private_repos
+        self.exclude_public_repos = exclude_public_repos
+
+    @staticmethod
+    def __compile(patterns: Iterable[str]) -> (PatternSet, PatternSet):
+        positive, negated = [], []
+        for pattern in patterns:
+            if pattern.startswith(NEGATION_PREFIX):
+                negated.append(pattern[len(NEGATION_PREFIX) :])
+            else:
+                positive.append(pattern)
+        return PatternSet(positive), PatternSet(negated)
+
+    def matches_excluded(self, repo_name: str) -> bool:
+        """
+        :param repo_name: the name of the repo in owner/name format
+        :return: True if the name matches the exclusion patterns
+        """
+        return (
+            len(self.__exclude) > 0
+            and self.__exclude.matches(repo_name)
+            and not self.__exclude_negated.matches(repo_name)
+        )
+
+    def matches_included(self, repo_name: str) -> bool:
+        """
+        :param repo_name: the name of the repo in owner/name format
+        :return: True if the name matches the inclusion patterns, or if there
+        are none, in which case all names are included
+        """
+        if len(self.__include) == 0 and len(self.__include_negated) == 0:
+            return True
+        return (
+            len(self.__include) == 0 or self.__include.matches(repo_name)
+        ) and not self.__include_negated.matches(repo_name)
+
+    def is_name_excluded(self, repo_name: str) -> bool:
+        """
+        Determines a repo name excluded if:
+            - repo name does not match the inclusion patterns, if any are used
+            - repo name matches the exclusion patterns
+        :param repo_name: the name of the repo in owner/name format
+        :return: True if repo name is not to be included
+        """
+        return not self.matches_included(repo_name) or self.matches_excluded(repo_name)
+
+    def is_type_excluded(self, repo_data: Dict) -> bool:
+        """
+        Determines a repo type excluded if:
+            - repo is a fork and forked repos are not being included
+            - repo is archived and archived repos are being excluded
+            - repo is private and private repos are being excluded
+            - repo is public and public repos are being excluded
+        :param repo_data: repo data returned from API fetch (GraphQL or REST)
+        :return: True if repo type is not to be included
+        """
+        is_private = repo_data.get("isPrivate") or repo_data.get("private")
+        return bool(
+            not self.include_forked_repos
+            and (repo_data.get("isFork") or repo_data.get("fork"))
+            or self.exclude_archive_repos
+            and (repo_data.get("isArchived") or repo_data.get("archived"))
+            or self.exclude_private_repos
+            and is_private
+            or self.exclude_public_repos
+            and not is_private
+        )
+
+    def filter(self, repos: Iterable[Optional[Dict]]) -> List[Dict]:
+        """
+        Apply all rules to a whole page of repos returned from an API fetch
+        :param repos: repo data returned from API fetch
+        :return: the repos that are not excluded, in their original order
+        """
+        return [
+            repo
+            for repo in repos
+            if repo
+            and not self.is_type_excluded(repo)
+            and not self.is_name_excluded(
+                repo.get("nameWithOwner") or repo.get("full_name") or ""
+            )
+        ]
+
+    def filter_names(self, repo_names: Iterable[str]) -> List[str]:
+        """
+        Apply the name rules to many repo names at once
+        :param repo_names: names of repos in owner/name format
+        :return: the names that are not excluded, in their original order
+        """
+        return [name for name in repo_names if not self.is_name_excluded(name)]
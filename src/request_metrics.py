@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from json import dumps
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.json_file import write_json_file
+
+# upper bounds of the histogram buckets of each measurement
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+METRIC_PREFIX = "github_stats"
+
+
+def endpoint_class(path: str) -> str:
+    """
+    :param path: path of a REST request, or graphql for GraphQL queries
+    :return: the endpoint requested without the repo name and parameters,
+    e.g. stats/contributors for /repos/owner/name/stats/contributors
+    """
+    parts = path.split("?")[0].strip("/").split("/")
+    if parts[0] != "repos":
+        return parts[0]
+    return "/".join(parts[3:]) or "repo"
+
+
+###############################################################################
+# Histogram class
+###############################################################################
+
+
+class Histogram(object):
+    """
+    Counts of measurements in fixed buckets, recorded in constant time and
+    memory however many requests are made
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        :param buckets: upper bounds of the buckets, in increasing order
+        """
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value: float) -> None:
+        """
+        :param value: measurement to count in the first bucket it fits
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        :param q: quantile between 0 and 1, e.g. 0.95
+        :return: upper bound of the bucket holding the quantile, None if the
+        quantile is above the last bound or nothing was recorded
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: the counts of the buckets with the sum and estimated quantiles
+        """
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {
+                str(bound): count
+                for bound, count in zip(self.buckets + ("+Inf",), self.counts)
+            },
+        }
+
+
+###############################################################################
+# EndpointMetrics class
+###############################################################################
+
+
+class EndpointMetrics(object):
+    """
+    Responses of the requests to one endpoint: their statuses, latencies,
+    sizes and the time waited for a free connection before each was made
+    """
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = dict()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.wait = Histogram(WAIT_BUCKETS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: the request count by status and the histograms
+        """
+        return {
+            "requests": sum(self.statuses.values()),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "latency_seconds": self.latency.to_dict(),
+            "response_bytes": self.size.to_dict(),
+            "semaphore_wait_seconds": self.wait.to_dict(),
+        }
+
+
+###############################################################################
+# RequestMetrics class
+###############################################################################
+
+
+class RequestMetrics(object):
+    """
+    Instrumentation of the requests made by GitHubApiQueries and the wall time
+    of each phase of fetching stats, aggregated into per-endpoint histograms
+    as requests are made, so it costs a few counter updates per request and
+    is always on. Exported as a JSON report or in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.endpoints: Dict[str, EndpointMetrics] = dict()
+        # retries by reason, e.g. 202 while GitHub computes contributor stats
+        self.retries: Dict[str, int] = dict()
+        self.accepted_wait = 0.0  # seconds slept waiting out 202 responses
+        # seconds slept before retries by reason, e.g. backing off timeouts
+        self.retry_wait: Dict[str, float] = dict()
+        # responses answered without a request by each cache
+        self.cache_hits: Dict[str, int] = {"response": 0, "etag": 0}
+        # total wall time and runs of each phase of fetching stats
+        self.phases: Dict[str, List[float]] = dict()
+
+    def record(
+        self, endpoint: str, status: int, latency: float, size: int, wait: float
+    ) -> None:
+        """
+        :param endpoint: endpoint class of the request, from endpoint_class
+        :param status: status of the response
+        :param latency: seconds from sending the request to reading the body
+        :param size: bytes of the response body
+        :param wait: seconds waited for a free connection
+        """
+        metrics = self.endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self.endpoints[endpoint] = EndpointMetrics()
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.latency.record(latency)
+        metrics.size.record(size)
+        metrics.wait.record(wait)
+
+    def record_retry(self, reason: str, wait: float = 0.0) -> None:
+        """
+        :param reason: reason the request is made again, e.g. 202
+        :param wait: seconds slept before making the request again
+        """
+        self.retries[reason] = self.retries.get(reason, 0) + 1
+        self.retry_wait[reason] = self.retry_wait.get(reason, 0.0) + wait
+        if reason == "202":
+            self.accepted_wait += wait
+
+    def record_cache_hit(self, cache: str) -> None:
+        """
+        :param cache: the cache answering the request, response or etag
+        """
+        self.cache_hits[cache] = self.cache_hits.get(cache, 0) + 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Times the wall time of a phase of fetching stats, e.g. get_stats,
+        including that of phases running concurrently with it
+        :param name: name of the phase
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += monotonic() - start
+            totals[1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: report of the requests made by endpoint, the retries, cache
+        hits and the wall time of each phase
+        """
+        return {
+            "endpoints": {
+                endpoint: metrics.to_dict()
+                for endpoint, metrics in sorted(self.endpoints.items())
+            },
+            "retries": dict(sorted(self.retries.items())),
+            "accepted_wait_seconds": round(self.accepted_wait, 6),
+            "retry_wait_seconds": {
+                reason: round(wait, 6)
+                for reason, wait in sorted(self.retry_wait.items())
+            },
+            "cache_hits": self.cache_hits,
+            "phases": {
+                name: {"seconds": round(seconds, 6), "runs": runs}
+                for name, (seconds, runs) in self.phases.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_requests_total API requests made by endpoint and status",
+            f"# TYPE {p}_requests_total counter",
+        ]
+        for endpoint, metrics in sorted(self.endpoints.items()):
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(
+                    f'{p}_requests_total{{endpoint="{endpoint}",status="{status}"}} '
+                    f"{count}"
+                )
+
+        for name, attribute, description in (
+            ("request_duration_seconds", "latency", "Latency of API requests"),
+            ("response_size_bytes", "size", "Size of API response bodies"),
+            (
+                "semaphore_wait_seconds",
+                "wait",
+                "Time API requests waited for a free connection",
+            ),
+        ):
+            lines.append(f"# HELP {p}_{name} {description}")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for endpoint, metrics in sorted(self.endpoints.items()):
+                histogram: Histogram = getattr(metrics, attribute)
+                total = 0
+                for bound, count in zip(
+                    histogram.buckets + ("+Inf",), histogram.counts
+                ):
+                    total += count
+                    lines.append(
+                        f'{p}_{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                        f"{total}"
+                    )
+                lines.append(f'{p}_{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                lines.append(
+                    f'{p}_{name}_count{{endpoint="{endpoint}"}} {histogram.count}'
+                )
+
+        lines.append(f"# HELP {p}_retries_total API requests made again by reason")
+        lines.append(f"# TYPE {p}_retries_total counter")
+        for reason, count in sorted(self.retries.items()):
+            lines.append(f'{p}_retries_total{{reason="{reason}"}} {count}')
+        lines.append(
+            f"# HELP {p}_accepted_wait_seconds_total Time slept waiting out 202 "
+            f"responses"
+        )
+        lines.append(f"# TYPE {p}_accepted_wait_seconds_total counter")
+        lines.append(f"{p}_accepted_wait_seconds_total {self.accepted_wait}")
+        lines.append(
+            f"# HELP {p}_retry_wait_seconds_total Time slept before API requests "
+            f"made again by reason"
+        )
+        lines.append(f"# TYPE {p}_retry_wait_seconds_total counter")
+        for reason, wait in sorted(self.retry_wait.items()):
+            lines.append(f'{p}_retry_wait_seconds_total{{reason="{reason}"}} {wait}')
+        lines.append(f"# HELP {p}_cache_hits_total API requests answered by a cache")
+        lines.append(f"# TYPE {p}_cache_hits_total counter")
+        for cache, count in sorted(self.cache_hits.items()):
+            lines.append(f'{p}_cache_hits_total{{cache="{cache}"}} {count}')
+        lines.append(f"# HELP {p}_phase_seconds_total Wall time of fetching stats")
+        lines.append(f"# TYPE {p}_phase_seconds_total counter")
+        for name, (seconds, _) in self.phases.items():
+            lines.append(f'{p}_phase_seconds_total{{phase="{name}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+    def save(
+        self, json_path: Optional[str] = None, prometheus_path: Optional[str] = None
+    ) -> None:
+        """
+        Atomically writes the metrics, e.g. for the textfile collector of the
+        Prometheus node exporter to pick up
+        :param json_path: path to write the JSON report to, if any
+        :param prometheus_path: path to write the Prometheus text to, if any
+        """
+        if json_path:
+            write_json_file(json_path, dumps(self.to_dict(), indent=2))
+        if prometheus_path:
+            write_json_file(prometheus_path, self.to_prometheus())
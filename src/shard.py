@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+from typing import Iterable, Optional, Set
+from zlib import crc32
+
+HASH_MODE = "hash"  # repos assigned by a stable hash of their name
+INDEX_MODE = "index"  # repos assigned round-robin in name order
+SHARD_MODES = (HASH_MODE, INDEX_MODE)
+
+###############################################################################
+# Shard class
+###############################################################################
+
+
+class Shard(object):
+    """
+    One of a number of disjoint shards of a user's repos, so the per-repo
+    fetches of the repos can be split between separate runs, e.g. a matrix of
+    CI jobs, whose partial results are merged afterwards.
+    """
+
+    def __init__(self, index: int, count: int, mode: str = HASH_MODE):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        if mode not in SHARD_MODES:
+            raise ValueError(
+                f"Invalid shard mode {mode} (expected one of {', '.join(SHARD_MODES)})"
+            )
+        self.index = index
+        self.count = count
+        self.mode = mode
+
+    @classmethod
+    def parse(cls, spec: str, mode: Optional[str] = None) -> "Shard":
+        """
+        :param spec: shard in index/count format, with index counted from 0,
+        e.g. 2/8 for the third of eight shards
+        :param mode: how repos are assigned to shards, hash by default
+        :return: the shard
+        """
+        index, _, count = spec.strip().partition("/")
+        try:
+            index, count = int(index), int(count)
+        except ValueError:
+            raise ValueError(f"Invalid shard {spec} (expected index/count)")
+        return cls(index, count, mode or HASH_MODE)
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def owns(self, repo: str) -> bool:
+        """
+        :param repo: name of a repo in owner/name format
+        :return: True if the repo is assigned to the shard in hash mode
+        """
+        return crc32(repo.encode("utf-8")) % self.count == self.index
+
+    def select(self, repos: Iterable[str]) -> Set[str]:
+        """
+        :param repos: names of all repos in owner/name format
+        :return: names of the repos assigned to the shard
+        """
+        if self.mode == INDEX_MODE:
+            return set(sorted(repos)[self.index :: self.count])
+        return {repo for repo in repos if self.owns(repo)}
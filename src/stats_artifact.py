@@ -0,0 +1,278 @@
+#!/usr/bin/python3
+
+from json import dumps
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Set, Tuple, Union
+
+from src.github_repo_stats import GitHubRepoStats
+from src.hyperloglog import HyperLogLog
+from src.json_file import read_json_file, write_json_file
+from src.stats_plan import DEFAULT_FIELDS, FIELDS
+from src.weekly_changes import WeeklyChanges
+
+ARTIFACT_VERSION = 1  # increment when the layout of stored stats changes
+# fields derived from the stored stats of other fields, instead of stored
+DERIVED_FIELDS = {
+    "languages_proportional": ("languages",),
+    "raw_collaborators": ("collaborator_set", "collab_repos"),
+}
+
+
+def logins(value: Any) -> Union[Set[str], HyperLogLog]:
+    """
+    :param value: stored logins, as a list or a sketch in the form of JSON
+    :return: the logins, as a set or a sketch
+    """
+    if isinstance(value, dict):
+        return HyperLogLog.from_json(value)
+    return set(value)
+
+
+###############################################################################
+# StatsArtifact class
+###############################################################################
+
+
+class StatsArtifact(object):
+    """
+    Versioned snapshot of computed GitHubRepoStats state that can be saved to
+    and loaded from compact (optionally gzip compressed) JSON. Exposes the same
+    awaitable properties as GitHubRepoStats so images can be rendered from it
+    without querying the GitHub APIs.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        version = data.get("version")
+        if version != ARTIFACT_VERSION:
+            raise ValueError(
+                f"Unsupported stats artifact version {version} "
+                f"(expected {ARTIFACT_VERSION})"
+            )
+        self.data = data
+        self.username: str = data.get("username")
+        self.generated_at: str = data.get("generated_at")
+        self.__stats: Dict[str, Any] = data.get("stats", {})
+        self.__field_times: Dict[str, str] = data.get("field_times", {})
+
+    @classmethod
+    async def from_stats(
+        cls,
+        stats: GitHubRepoStats,
+        field_times: Optional[Dict[str, str]] = None,
+        fields: Optional[Iterable[str]] = None,
+    ) -> "StatsArtifact":
+        """
+        Computes (if not already computed) and collects the statistics
+        :param stats: the statistics to snapshot
+        :param field_times: times the stats of any fields carried over from an
+        earlier artifact were fetched, by field name
+        :param fields: names of the fields to collect, all but the optional
+        fields if None
+        :return: an artifact with the computed state of the statistics
+        """
+        fields = set(DEFAULT_FIELDS if fields is None else fields)
+        data = dict()
+
+        if "raw_collaborators" in fields:
+            collaborator_set, collab_repos = await stats.raw_collaborators()
+            data["collaborator_set"] = (
+                collaborator_set.to_json()
+                if isinstance(collaborator_set, HyperLogLog)
+                else sorted(filter(None, collaborator_set))
+            )
+            data["collab_repos"] = sorted(collab_repos)
+
+        for field in FIELDS:
+            if field not in fields or field in DERIVED_FIELDS:
+                continue
+            value = await getattr(stats, field)
+            if isinstance(value, set):
+                value = sorted(value)
+            elif isinstance(value, (HyperLogLog, WeeklyChanges)):
+                value = value.to_json()
+            elif isinstance(value, tuple):
+                value = list(value)
+            data[field] = value
+
+        return cls(
+            {
+                "version": ARTIFACT_VERSION,
+                "username": stats.environment_vars.username,
+                "generated_at": datetime.now(timezone.utc).isoformat(
+                    timespec="seconds"
+                ),
+                "field_times": field_times if field_times is not None else dict(),
+                "stats": data,
+            }
+        )
+
+    def to_json(self) -> str:
+        """
+        :return: compact JSON serialization of the artifact
+        """
+        return dumps(self.data, separators=(",", ":"), sort_keys=True)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the artifact to a file, gzip compressed if the path ends in .gz
+        :param path: the file path to write to
+        """
+        write_json_file(path, self.to_json())
+
+    @classmethod
+    def load(cls, path: str) -> "StatsArtifact":
+        """
+        Reads an artifact from a file, decompressing it if the path ends in .gz
+        :param path: the file path to read from
+        :return: the loaded artifact
+        """
+        return cls(read_json_file(path))
+
+    def has_field(self, field: str) -> bool:
+        """
+        :param field: name of a stats property, e.g. lines_changed
+        :return: True if the stats of the field were saved in the artifact,
+        which they are not if not selected when it was saved
+        """
+        return all(key in self.__stats for key in DERIVED_FIELDS.get(field, (field,)))
+
+    def field_time(self, field: str) -> str:
+        """
+        :param field: name of a stats property, e.g. lines_changed
+        :return: the time the stats of the field were fetched
+        """
+        return self.__field_times.get(field, self.generated_at)
+
+    async def raw_collaborators(
+        self,
+    ) -> Tuple[Union[Set[str], HyperLogLog], Set[str]]:
+        """
+        :return: collaborators of user's repositories and repos with more than
+        one collaborator
+        """
+        return (
+            logins(self.__stats["collaborator_set"]),
+            set(self.__stats["collab_repos"]),
+        )
+
+    @property
+    async def name(self) -> str:
+        """
+        :return: GitHub user's name
+        """
+        return self.__stats["name"]
+
+    @property
+    async def stargazers(self) -> int:
+        """
+        :return: total number of stargazers on user's repos
+        """
+        return self.__stats["stargazers"]
+
+    @property
+    async def forks(self) -> int:
+        """
+        :return: total number of forks on user's repos
+        """
+        return self.__stats["forks"]
+
+    @property
+    async def total_contributions(self) -> int:
+        """
+        :return: count of user's total contributions as defined by GitHub
+        """
+        return self.__stats["total_contributions"]
+
+    @property
+    async def languages(self) -> Dict:
+        """
+        :return: summary of languages used by the user
+        """
+        return self.__stats["languages"]
+
+    @property
+    async def excluded_languages(self) -> Set:
+        """
+        :return: languages excluded from the summary of languages
+        """
+        return set(self.__stats["excluded_languages"])
+
+    @property
+    async def languages_proportional(self) -> Dict:
+        """
+        :return: summary of languages used by the user, with proportional usage
+        """
+        return {k: v.get("prop", 0) for (k, v) in self.__stats["languages"].items()}
+
+    @property
+    async def repos(self) -> Set[str]:
+        """
+        :return: list of names of repos user is involved with
+        """
+        return set(self.__stats["repos"])
+
+    @property
+    async def contributed_collab_repos(self) -> Set[str]:
+        """
+        :return: list of names of repos contributed to user in collaborations with at least one other
+        """
+        return set(self.__stats["contributed_collab_repos"])
+
+    @property
+    async def lines_changed(self) -> Tuple[int, int]:
+        """
+        :return: count of total lines added and removed by the user
+        """
+        additions, deletions = self.__stats["lines_changed"]
+        return additions, deletions
+
+    @property
+    async def weekly_changes(self) -> WeeklyChanges:
+        """
+        :return: store of the weekly changes in each repo, to summarize the
+        stats of windows of weeks from
+        """
+        return WeeklyChanges.from_json(self.__stats["weekly_changes"])
+
+    @property
+    async def avg_contribution_percent(self) -> str:
+        """
+        :return: str representing the avg percent of user's repo contributions
+        """
+        return self.__stats["avg_contribution_percent"]
+
+    @property
+    async def avg_contribution_percent_weighted(self) -> str:
+        """
+        :return: str representing the avg percent of user's repo contributions weighted by number of contributors
+        """
+        return self.__stats["avg_contribution_percent_weighted"]
+
+    @property
+    async def views(self) -> int:
+        """
+        :return: view count of user's repositories as of a given (first) date
+        """
+        return self.__stats["views"]
+
+    @property
+    async def views_from_date(self) -> str:
+        """
+        :return: the first date included in the repo view count
+        """
+        return self.__stats["views_from_date"]
+
+    @property
+    async def collaborators(self) -> int:
+        """
+        :return: count of total collaborators to user's repositories
+        """
+        return self.__stats["collaborators"]
+
+    @property
+    async def contributors(self) -> Union[Set, HyperLogLog]:
+        """
+        :return: set of total contributors to user's repositories, or their
+        sketch if counted approximately
+        """
+        return logins(self.__stats["contributors"])
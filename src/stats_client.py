@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+
+from asyncio import Semaphore
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from src.db.db import GitRepoStatsDB
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.hyperloglog import EXACT, HyperLogLog
+from src.request_metrics import RequestMetrics
+from src.stats_artifact import StatsArtifact
+from src.stats_plan import FIELD_ALIASES, FIELDS
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+GITHUB_API_URL = "https://api.github.com/"
+
+###############################################################################
+# StatsConfig class
+###############################################################################
+
+
+class StatsConfig(NamedTuple):
+    """
+    Options of the stats fetched by a StatsClient, set explicitly rather than
+    read from environment variables, with the defaults of those left unset
+    """
+
+    exclude_repos: Tuple[str, ...] = ()  # names or patterns of repos
+    only_included_repos: Tuple[str, ...] = ()
+    exclude_langs: Tuple[str, ...] = ()
+    include_forked_repos: bool = False
+    exclude_contrib_repos: bool = False
+    exclude_archive_repos: bool = False
+    exclude_private_repos: bool = False
+    exclude_public_repos: bool = False
+    manually_added_repos: Tuple[str, ...] = ()
+    more_collaborators: int = 0
+    only_included_collab_repos: Tuple[str, ...] = ()
+    exclude_collab_repos: Tuple[str, ...] = ()
+    more_collab_repos: Tuple[str, ...] = ()
+    # exact, or approx to estimate distinct contributors and collaborators
+    count_mode: str = EXACT
+    # db file to carry view counts over between calls in, none if None
+    db_path: Optional[str] = None
+    api_url: str = GITHUB_API_URL
+    max_connections: int = 10  # concurrent connections of all calls
+    request_timeout: float = 60.0  # seconds
+    retry_delay: float = 2.0  # seconds
+
+    def environment(self, username: str, access_token: str) -> EnvironmentVariables:
+        """
+        :return: the options of stats of the user, in the form of their
+        environment variables
+        """
+
+        def names(values: Tuple[str, ...]) -> Optional[str]:
+            return ",".join(values) if values else None
+
+        return EnvironmentVariables(
+            username=username,
+            access_token=access_token,
+            exclude_repos=names(self.exclude_repos),
+            only_included_repos=names(self.only_included_repos),
+            exclude_langs=names(self.exclude_langs),
+            include_forked_repos=str(self.include_forked_repos),
+            exclude_contrib_repos=str(self.exclude_contrib_repos),
+            exclude_archive_repos=str(self.exclude_archive_repos),
+            exclude_private_repos=str(self.exclude_private_repos),
+            exclude_public_repos=str(self.exclude_public_repos),
+            manually_added_repos=names(self.manually_added_repos),
+            more_collaborators=str(self.more_collaborators),
+            only_included_collab_repos=names(self.only_included_collab_repos),
+            exclude_collab_repos=names(self.exclude_collab_repos),
+            more_collab_repos=names(self.more_collab_repos),
+            count_mode=self.count_mode,
+            db=(
+                GitRepoStatsDB(self.db_path)
+                if self.db_path is not None
+                else GitRepoStatsDB(in_memory=True)
+            ),
+        )
+
+
+###############################################################################
+# UserStats class
+###############################################################################
+
+
+class UserStats(NamedTuple):
+    """
+    Stats of a user fetched by a StatsClient, None for fields not fetched
+    """
+
+    username: str
+    name: Optional[str] = None
+    stargazers: Optional[int] = None
+    forks: Optional[int] = None
+    languages: Optional[Dict[str, Dict[str, Any]]] = None
+    excluded_languages: Optional[List[str]] = None
+    repos: Optional[List[str]] = None
+    total_contributions: Optional[int] = None
+    lines_changed: Optional[Tuple[int, int]] = None
+    avg_contribution_percent: Optional[str] = None
+    avg_contribution_percent_weighted: Optional[str] = None
+    # logins, or a sketch estimating their number if counted approximately
+    contributors: Optional[Union[List[str], HyperLogLog]] = None
+    contributed_collab_repos: Optional[List[str]] = None
+    collaborators: Optional[int] = None
+    views: Optional[int] = None
+    views_from_date: Optional[str] = None
+
+    @classmethod
+    def from_artifact(cls, artifact: StatsArtifact) -> "UserStats":
+        """
+        :return: the stats held by the artifact
+        """
+        stats = artifact.data["stats"]
+        values = {field: stats.get(field) for field in cls._fields[1:]}
+        if values["lines_changed"] is not None:
+            values["lines_changed"] = tuple(values["lines_changed"])
+        if isinstance(values["contributors"], dict):
+            values["contributors"] = HyperLogLog.from_json(values["contributors"])
+        return cls(username=artifact.username, **values)
+
+
+###############################################################################
+# StatsClient class
+###############################################################################
+
+
+class StatsClient(object):
+    """
+    Async client fetching the stats of users, for embedding in an asyncio
+    service, e.g.
+        async with StatsClient(StatsConfig(exclude_langs=("HTML",))) as client:
+            stats = await client.fetch("octocat", token)
+    Calls may be made concurrently and share the session, a bound on their
+    concurrent connections and request metrics. Environment variables are
+    not read, and no db file is read or written unless db_path is set.
+    """
+
+    def __init__(
+        self,
+        config: Optional[StatsConfig] = None,
+        session: Optional["ClientSession"] = None,
+    ):
+        """
+        :param config: options of the stats, the defaults if None
+        :param session: session to make requests with, e.g. the service's own,
+        or None for one opened on first use and closed by close
+        """
+        self.config = config if config is not None else StatsConfig()
+        self.metrics = RequestMetrics()
+        self.__session = session
+        self.__owns_session = session is None
+        self.__semaphore = Semaphore(self.config.max_connections)
+
+    async def __aenter__(self) -> "StatsClient":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Closes the session opened by the client, if any
+        """
+        if self.__owns_session and self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def fetch_artifact(
+        self,
+        username: str,
+        access_token: str,
+        fields: Optional[Iterable[str]] = None,
+    ) -> StatsArtifact:
+        """
+        :param username: login of the user
+        :param access_token: token of the user, to query private repos with
+        :param fields: names of the stats fields to fetch, e.g. languages or
+        stars, or None for all fields but the optional fields, e.g. the
+        weekly changes
+        :return: the fetched stats, e.g. to render images from
+        """
+        if fields is not None:
+            fields = {FIELD_ALIASES.get(field, field) for field in fields}
+            unknown = fields.difference(FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown stats fields: {', '.join(sorted(unknown))}")
+        if self.__session is None:
+            from aiohttp import ClientSession
+
+            self.__session = ClientSession()
+
+        environment_vars = self.config.environment(username, access_token)
+        queries = GitHubApiQueries(
+            username=username,
+            access_token=access_token,
+            session=self.__session,
+            semaphore=self.__semaphore,
+            metrics=self.metrics,
+            api_url=self.config.api_url,
+            request_timeout=self.config.request_timeout,
+            retry_delay=self.config.retry_delay,
+        )
+        stats = GitHubRepoStats(
+            environment_vars=environment_vars,
+            session=self.__session,
+            queries=queries,
+            weekly_changes=fields is not None and "weekly_changes" in fields,
+        )
+        artifact = await StatsArtifact.from_stats(stats, fields=fields)
+        environment_vars.commit()
+        return artifact
+
+    async def fetch(
+        self,
+        username: str,
+        access_token: str,
+        fields: Optional[Iterable[str]] = None,
+    ) -> UserStats:
+        """
+        :param username: login of the user
+        :param access_token: token of the user, to query private repos with
+        :param fields: names of the stats fields to fetch, e.g. languages or
+        stars, or None for all fields
+        :return: the fetched stats
+        """
+        return UserStats.from_artifact(
+            await self.fetch_artifact(username, access_token, fields)
+        )
@@ -0,0 +1,281 @@
+#!/usr/bin/python3
+
+from array import array
+from bisect import bisect_left
+from math import nan
+from mmap import ACCESS_READ, mmap
+from os import makedirs
+from os.path import dirname, getsize, isfile
+from struct import Struct
+from time import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b"GSH1"
+# metrics of each sample, in the order stored; new metrics are only appended,
+# and recorded in files created after
+METRICS = (
+    "stargazers",
+    "forks",
+    "total_contributions",
+    "lines_added",
+    "lines_deleted",
+    "views",
+    "collaborators",
+    "contributors",
+    "repos",
+)
+LANGUAGES_FIELD = "languages"
+HEADER = Struct("<4sH")  # magic, and number of metrics of each sample
+ENTRY = Struct("<BH")  # kind, and length of the name or number of languages
+NAME = 0  # names the language of the next index
+SAMPLE = 1  # timestamp and metrics, followed by the languages' percents
+LANGUAGE = Struct("<Hf")  # index of the language, and its percent
+
+
+###############################################################################
+# Helper Functions
+###############################################################################
+
+
+async def stats_sample(
+    stats: Any, fields: Iterable[str]
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+    :param stats: stats of a user, whether fetched or from an artifact
+    :param fields: names of the fields computed, e.g. those of the plan
+    :return: the metrics computed from the fields, and the percent of each
+    language, empty if languages are not computed
+    """
+    fields = set(fields)
+    metrics: Dict[str, float] = dict()
+    if "stargazers" in fields:
+        metrics["stargazers"] = await stats.stargazers
+    if "forks" in fields:
+        metrics["forks"] = await stats.forks
+    if "total_contributions" in fields:
+        metrics["total_contributions"] = await stats.total_contributions
+    if "lines_changed" in fields:
+        metrics["lines_added"], metrics["lines_deleted"] = await stats.lines_changed
+    if "views" in fields:
+        metrics["views"] = await stats.views
+    if "collaborators" in fields:
+        metrics["collaborators"] = await stats.collaborators
+    if "contributors" in fields:
+        # without the user, as in the summary of the stats
+        metrics["contributors"] = max(len(await stats.contributors) - 1, 0)
+    if "repos" in fields:
+        metrics["repos"] = len(await stats.repos)
+
+    languages: Dict[str, float] = dict()
+    if LANGUAGES_FIELD in fields:
+        languages = {
+            name: data.get("prop", 0) for name, data in (await stats.languages).items()
+        }
+    return metrics, languages
+
+
+###############################################################################
+# HistorySeries class
+###############################################################################
+
+
+class HistorySeries(object):
+    """
+    Time series of the samples of a stats history, with a column of values
+    per metric, NaN in samples the metric was not computed in
+    """
+
+    def __init__(self, metrics: Iterable[str] = METRICS):
+        """
+        :param metrics: names of the metrics of each sample
+        """
+        self.timestamps = array("d")
+        self.metrics: Dict[str, array] = {name: array("d") for name in metrics}
+        self.__language_names: List[str] = []
+        # indices of the samples each language is in, and its percent in them
+        self.__languages: Dict[str, Tuple[array, array]] = dict()
+        # whether languages were computed in each sample
+        self.__has_languages = array("B")
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def languages(self) -> List[str]:
+        """
+        :return: names of the languages of any sample, in order of appearance
+        """
+        return list(self.__language_names)
+
+    def add_language(self, name: str) -> None:
+        """
+        :param name: name of the language of the next index
+        """
+        self.__language_names.append(name)
+        self.__languages[name] = (array("I"), array("d"))
+
+    def add(
+        self,
+        timestamp: float,
+        values: Iterable[float],
+        languages: Iterable[Tuple[int, float]],
+    ) -> None:
+        """
+        :param timestamp: seconds since the epoch the sample was taken at
+        :param values: value of each metric, in the order of the metrics
+        :param languages: index and percent of each language of the sample
+        """
+        index = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        for column, value in zip(self.metrics.values(), values):
+            column.append(value)
+        has_languages = False
+        for language, percent in languages:
+            indices, percents = self.__languages[self.__language_names[language]]
+            indices.append(index)
+            percents.append(percent)
+            has_languages = True
+        self.__has_languages.append(has_languages)
+
+    def language(self, name: str) -> array:
+        """
+        :param name: name of a language
+        :return: percent of the language in each sample, 0 in samples without
+        it, and NaN in samples languages were not computed in
+        """
+        values = array("d", (0.0 if has else nan for has in self.__has_languages))
+        indices, percents = self.__languages.get(name, ((), ()))
+        for index, percent in zip(indices, percents):
+            values[index] = percent
+        return values
+
+    def latest_languages(self) -> Dict[str, float]:
+        """
+        :return: percent of each language of the last sample with languages
+        """
+        last = len(self.__has_languages) - 1
+        while last >= 0 and not self.__has_languages[last]:
+            last -= 1
+        return {
+            name: percents[-1]
+            for name, (indices, percents) in self.__languages.items()
+            if indices and indices[-1] == last
+        }
+
+    def index_at(self, timestamp: float) -> int:
+        """
+        :param timestamp: seconds since the epoch
+        :return: index of the first sample taken at or after the time
+        """
+        return bisect_left(self.timestamps, timestamp)
+
+
+###############################################################################
+# StatsHistory class
+###############################################################################
+
+
+class StatsHistory(object):
+    """
+    Append-only binary file of the stats computed by each run, e.g. daily, so
+    trends are rendered from their history instead of only the latest stats.
+    Each sample is a fixed-size record of its timestamp and metrics, followed
+    by the percents of its languages by index, with each language named once
+    by an entry before the first sample it is in. Files are read through a
+    memory map in a single pass, so years of daily samples load in
+    milliseconds, and a sample only partly written by an interrupted run is
+    ignored, then overwritten by the next sample appended.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: path of the history file, created by the first sample
+        """
+        self.path = path
+
+    def read(self) -> HistorySeries:
+        """
+        :return: all samples of the history, none if the file does not exist
+        """
+        series, _ = self.__scan()
+        return series
+
+    def append(
+        self,
+        metrics: Dict[str, float],
+        languages: Dict[str, float],
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """
+        Appends a sample to the history
+        :param metrics: value of each metric computed, by name
+        :param languages: percent of each language, empty if not computed
+        :param timestamp: seconds since the epoch the sample was taken at, now
+        if None
+        """
+        series, end = self.__scan()
+        names = series.metrics if end else METRICS
+        known = {name: index for index, name in enumerate(series.languages)}
+
+        data = bytearray()
+        if not end:
+            data += HEADER.pack(MAGIC, len(names))
+        for name in languages:
+            if name not in known:
+                encoded = name.encode("utf-8")
+                data += ENTRY.pack(NAME, len(encoded)) + encoded
+                known[name] = len(known)
+        data += ENTRY.pack(SAMPLE, len(languages))
+        data += Struct(f"<{len(names) + 1}d").pack(
+            time() if timestamp is None else timestamp,
+            *(float(metrics.get(name, nan)) for name in names),
+        )
+        for name, percent in languages.items():
+            data += LANGUAGE.pack(known[name], percent)
+
+        if dirname(self.path):
+            makedirs(dirname(self.path), exist_ok=True)
+        with open(self.path, "r+b" if isfile(self.path) else "wb") as f:
+            # a sample partly written by an interrupted run is overwritten
+            f.truncate(end)
+            f.seek(end)
+            f.write(data)
+
+    def __scan(self) -> Tuple[HistorySeries, int]:
+        """
+        :return: the samples of the history, and the length of the file up to
+        the end of the last complete entry
+        """
+        if not isfile(self.path) or getsize(self.path) < HEADER.size:
+            return HistorySeries(), 0
+        with open(self.path, "rb") as f, mmap(f.fileno(), 0, access=ACCESS_READ) as m:
+            magic, num_metrics = HEADER.unpack_from(m)
+            if magic != MAGIC:
+                raise RuntimeError(f"{self.path} is not a stats history file")
+            series = HistorySeries(METRICS[:num_metrics])
+            # the timestamp and metrics of a sample, unpacked at once
+            record = Struct(f"<{num_metrics + 1}d")
+            size = len(m)
+            offset = HEADER.size
+            while offset + ENTRY.size <= size:
+                kind, count = ENTRY.unpack_from(m, offset)
+                start = offset + ENTRY.size
+                if kind == NAME:
+                    end = start + count
+                    if end > size:
+                        break
+                    series.add_language(m[start:end].decode("utf-8"))
+                elif kind == SAMPLE:
+                    end = start + record.size + count * LANGUAGE.size
+                    if end > size:
+                        break
+                    timestamp, *values = record.unpack_from(m, start)
+                    series.add(
+                        timestamp,
+                        values,
+                        LANGUAGE.iter_unpack(m[start + record.size : end]),
+                    )
+                else:
+                    break
+                offset = end
+        return series, offset
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+
+from json import dumps
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from src.github_repo_stats import GitHubRepoStats
+from src.json_file import read_json_file, write_json_file
+from src.shard import Shard
+
+PARTIAL_VERSION = 1  # increment when the layout of stored partial stats changes
+
+###############################################################################
+# PartialStats class
+###############################################################################
+
+
+class PartialStats(object):
+    """
+    Versioned partial result of one shard of a sharded run, holding the summary
+    stats of the repo listing and the unsummarized per-repo results of the
+    repos of the shard, e.g. the lines changed by each contributor and the
+    collaborators of each repo. Merging the partial results of all shards and
+    summarizing them gives exactly the stats of a run without shards.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        version = data.get("version")
+        if version != PARTIAL_VERSION:
+            raise ValueError(
+                f"Unsupported partial stats version {version} "
+                f"(expected {PARTIAL_VERSION})"
+            )
+        self.data = data
+        self.username: str = data.get("username")
+        self.generated_at: str = data.get("generated_at")
+        self.shard = Shard(**data.get("shard", {}))
+        self.state: Dict[str, Any] = data.get("state", {})
+
+    @classmethod
+    async def from_stats(cls, stats: GitHubRepoStats) -> "PartialStats":
+        """
+        Fetches the partial result of the shard of the stats
+        :param stats: the statistics, with the shard to fetch
+        :return: the partial result of the shard
+        """
+        if stats.shard is None:
+            raise ValueError("Partial stats can only be fetched for a shard")
+        return cls(
+            {
+                "version": PARTIAL_VERSION,
+                "username": stats.environment_vars.username,
+                "generated_at": datetime.now(timezone.utc).isoformat(
+                    timespec="seconds"
+                ),
+                "shard": {
+                    "index": stats.shard.index,
+                    "count": stats.shard.count,
+                    "mode": stats.shard.mode,
+                },
+                "state": await stats.fetch_partial_state(),
+            }
+        )
+
+    def to_json(self) -> str:
+        """
+        :return: compact JSON serialization of the partial result
+        """
+        return dumps(self.data, separators=(",", ":"), sort_keys=True)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the partial result to a file, gzip compressed if the path ends
+        in .gz
+        :param path: the file path to write to
+        """
+        write_json_file(path, self.to_json())
+
+    @classmethod
+    def load(cls, path: str) -> "PartialStats":
+        """
+        Reads a partial result from a file, decompressing it if the path ends
+        in .gz
+        :param path: the file path to read from
+        :return: the loaded partial result
+        """
+        return cls(read_json_file(path))
+
+    @staticmethod
+    def merge(partials: List["PartialStats"], stats: GitHubRepoStats) -> None:
+        """
+        Adds the per-repo results of the partial results of all shards to the
+        stats, with the summary stats of the repo listing of the first shard
+        :param partials: the partial result of each shard of a sharded run
+        :param stats: the statistics to merge the results into, without a shard
+        """
+        if not partials:
+            raise ValueError("No partial stats to merge")
+        partials = sorted(partials, key=lambda partial: partial.shard.index)
+        first = partials[0]
+
+        shards = [(p.shard.index, p.shard.count, p.shard.mode) for p in partials]
+        expected = [
+            (i, first.shard.count, first.shard.mode) for i in range(first.shard.count)
+        ]
+        if shards != expected:
+            raise ValueError(
+                f"Partial stats of shards {', '.join(str(p.shard) for p in partials)} "
+                f"are not exactly all {first.shard.count} {first.shard.mode} shards"
+            )
+
+        for partial in partials:
+            if partial.username != stats.environment_vars.username:
+                raise ValueError(
+                    f"Partial stats of shard {partial.shard} are of "
+                    f"{partial.username}, not {stats.environment_vars.username}"
+                )
+            repos = partial.state.get("listing", {}).get("repos")
+            if repos != first.state.get("listing", {}).get("repos"):
+                # repos must be listed alike for every repo to be in one shard
+                raise ValueError(
+                    f"Partial stats of shards {first.shard} and {partial.shard} "
+                    f"list different repos"
+                )
+
+        # the first shard is imported last so its listing stats are kept
+        for partial in reversed(partials):
+            stats.import_state(partial.state)
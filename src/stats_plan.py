@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# fields computed by awaiting each independently fetched stats property, i.e.
+# each phase of fetching stats and the endpoints it fetches
+FIELD_GROUPS: Dict[str, Tuple[str, ...]] = {
+    # one GraphQL query per page of repos
+    "repos": (
+        "name",
+        "stargazers",
+        "forks",
+        "languages",
+        "excluded_languages",
+        "languages_proportional",
+        "repos",
+    ),
+    # two GraphQL queries
+    "total_contributions": ("total_contributions",),
+    # /stats/contributors and /collaborators of each repo
+    "lines_changed": (
+        "lines_changed",
+        "avg_contribution_percent",
+        "avg_contribution_percent_weighted",
+        "contributors",
+        "contributed_collab_repos",
+        "weekly_changes",
+    ),
+    # /collaborators and /stats/contributors of each repo
+    "collaborators": ("collaborators", "raw_collaborators"),
+    # /traffic/views of each repo
+    "views": ("views", "views_from_date"),
+}
+FIELDS = [field for fields in FIELD_GROUPS.values() for field in fields]
+# fields only computed when selected, e.g. for the overview of a window of
+# weeks, rather than carried by every artifact and saved state
+OPTIONAL_FIELDS = ("weekly_changes",)
+DEFAULT_FIELDS = [field for field in FIELDS if field not in OPTIONAL_FIELDS]
+
+# fields rendered in each image
+IMAGE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "overview": (
+        "name",
+        "views",
+        "views_from_date",
+        "forks",
+        "stargazers",
+        "total_contributions",
+        "lines_changed",
+        "avg_contribution_percent",
+        "avg_contribution_percent_weighted",
+        "repos",
+        "contributed_collab_repos",
+        "collaborators",
+    ),
+    "languages": ("languages", "excluded_languages"),
+    # rendered from the stats history, if kept, rather than the stats
+    "trends": (),
+}
+
+# shorter names fields can be selected by
+FIELD_ALIASES = {
+    "stars": "stargazers",
+    "contributions": "total_contributions",
+    "lines": "lines_changed",
+}
+
+###############################################################################
+# StatsPlan class
+###############################################################################
+
+
+class StatsPlan(object):
+    """
+    Plan of the stats to compute for the images and fields selected, e.g. by
+    STATS=languages,stars, so only the phases fetching the fields used are
+    run, e.g. only the repo listing for the languages image instead of the
+    contributor stats of every repo as well.
+    """
+
+    def __init__(self, images: Iterable[str], fields: Optional[Iterable[str]] = None):
+        """
+        :param images: names of the images to render
+        :param fields: names of other fields to compute, e.g. to save in the
+        stats artifact, or None for all fields but the optional fields
+        """
+        images = set(images)
+        self.images: List[str] = [image for image in IMAGE_FIELDS if image in images]
+        self.image_fields: Set[str] = {
+            field for image in self.images for field in IMAGE_FIELDS[image]
+        }
+        self.fields: Set[str] = (
+            set(DEFAULT_FIELDS) if fields is None else self.image_fields.union(fields)
+        )
+        self.groups: List[str] = [
+            group
+            for group, fields in FIELD_GROUPS.items()
+            if self.fields.intersection(fields)
+        ]
+
+    @classmethod
+    def parse(cls, selection: Optional[str]) -> "StatsPlan":
+        """
+        :param selection: comma separated names of images and fields, e.g. from
+        the STATS variable, or None for all images and fields
+        :return: plan of the stats to compute for the selection
+        """
+        if not selection or not selection.strip():
+            return cls(IMAGE_FIELDS)
+
+        images = set()
+        fields = set()
+        for name in selection.split(","):
+            name = FIELD_ALIASES.get(name.strip(), name.strip())
+            if not name:
+                continue
+            if name in IMAGE_FIELDS:
+                images.add(name)
+            elif name in FIELDS:
+                fields.add(name)
+            else:
+                raise RuntimeError(
+                    f"Unknown image or field '{name}' in environment variable "
+                    f"STATS. Available images: {', '.join(IMAGE_FIELDS)}, and "
+                    f"fields: {', '.join(list(FIELD_ALIASES) + FIELDS)}"
+                )
+        return cls(images, fields)
+
+    def __str__(self) -> str:
+        return (
+            f"images: {', '.join(self.images) or 'none'}, "
+            f"phases: {', '.join(self.groups) or 'none'}"
+        )
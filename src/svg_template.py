@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+from re import compile as compile_regex
+from typing import Dict, List, Tuple
+
+SLOT_PATTERN = compile_regex(r"{{ (\w+) }}")  # e.g. {{ name }}
+
+# colors substituted into the theme slots of every template
+THEMES: Dict[str, Dict[str, str]] = {
+    "default": {
+        "accent_color": "#538cc6",
+        "border_color": "#b2cce5",
+        "light_background_color": "#ffffff",
+        "dark_background_color": "#0d1117",
+    },
+    "high_contrast": {
+        "accent_color": "#0969da",
+        "border_color": "#d0d7de",
+        "light_background_color": "#ffffff",
+        "dark_background_color": "#010409",
+    },
+    "monochrome": {
+        "accent_color": "#6e7781",
+        "border_color": "#8c959f",
+        "light_background_color": "#f6f8fa",
+        "dark_background_color": "#161b22",
+    },
+}
+DEFAULT_THEME = "default"
+
+###############################################################################
+# SvgTemplate class
+###############################################################################
+
+
+class SvgTemplate(object):
+    """
+    An SVG template parsed once into literal and slot segments, so that each
+    render is a single join of the literals with the slot values instead of a
+    substitution pass over the whole document per slot.
+    """
+
+    __cache: Dict[str, "SvgTemplate"] = dict()
+
+    def __init__(self, source: str):
+        self.__segments: List[str] = []  # literals and slots, alternating
+        self.__slots: List[Tuple[int, str]] = []  # segment index and slot name
+
+        end = 0
+        for match in SLOT_PATTERN.finditer(source):
+            self.__segments.append(source[end : match.start()])
+            self.__slots.append((len(self.__segments), match.group(1)))
+            # keep the placeholder text for any slot not given a value
+            self.__segments.append(match.group(0))
+            end = match.end()
+        self.__segments.append(source[end:])
+
+    @classmethod
+    def load(cls, path: str) -> "SvgTemplate":
+        """
+        Reads and parses a template file once, then reuses the parsed template
+        :param path: path of the template file
+        :return: the parsed template
+        """
+        template = cls.__cache.get(path)
+        if template is None:
+            with open(path, "r") as f:
+                template = cls.__cache[path] = cls(f.read())
+        return template
+
+    @property
+    def slots(self) -> List[str]:
+        """
+        :return: names of the slots in the template, in document order
+        """
+        return [name for _, name in self.__slots]
+
+    def render(self, values: Dict[str, str], theme: str = DEFAULT_THEME) -> str:
+        """
+        :param values: text to substitute for each slot, by slot name
+        :param theme: name of the theme providing colors for the theme slots
+        :return: the rendered document
+        """
+        theme_values = THEMES[theme]
+        segments = self.__segments.copy()
+        for i, name in self.__slots:
+            value = values.get(name)
+            if value is None:
+                value = theme_values.get(name)
+            if value is not None:
+                segments[i] = value
+        return "".join(segments)
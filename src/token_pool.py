@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+
+from time import time
+from typing import Dict, List, Optional, Set
+
+CORE = "core"  # rate limit resource of REST requests
+GRAPHQL = "graphql"  # rate limit resource of GraphQL queries
+# seconds to rest tokens hitting secondary limits without a Retry-After
+DEFAULT_RETRY_AFTER = 60
+
+
+def split_tokens(*values: Optional[str]) -> List[str]:
+    """
+    :param values: access tokens, or comma separated access tokens, e.g. from
+    the ACCESS_TOKEN and ACCESS_TOKENS variables
+    :return: list of unique tokens, in the order given
+    """
+    tokens = []
+    for value in values:
+        for token in (value or "").split(","):
+            if token.strip() and token.strip() not in tokens:
+                tokens.append(token.strip())
+    return tokens
+
+
+###############################################################################
+# TokenUsage class
+###############################################################################
+
+
+class TokenUsage(object):
+    """
+    Requests made with an access token and its remaining rate limits, as
+    reported by the headers of its latest responses
+    """
+
+    def __init__(self, index: int, token: str):
+        self.name = f"token {index + 1} (...{(token or '')[-4:]})"
+        self.requests = 0
+        self.rate_limited = 0
+        self.remaining: Dict[str, int] = dict()
+        self.limited_until = 0.0
+
+
+###############################################################################
+# TokenPool class
+###############################################################################
+
+
+class TokenPool(object):
+    """
+    Pool of access tokens each request is made with one of, so a run is
+    bounded by their combined rate limits instead of those of one token.
+    Requests are made with the token with the most remaining requests, tokens
+    hitting primary or secondary rate limits are rested until their limits
+    reset, and requests of each repo are pinned to a token with access to it.
+    """
+
+    def __init__(self, tokens: List[str]):
+        """
+        :param tokens: access tokens, the first being the user's own token
+        used for queries of the user, e.g. of GraphQL viewer fields
+        """
+        if not tokens:
+            raise ValueError("A token pool requires at least one access token")
+        self.tokens = tokens
+        self.__usage = {
+            token: TokenUsage(index, token) for index, token in enumerate(tokens)
+        }
+        self.__pins: Dict[str, str] = dict()
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def primary(self) -> str:
+        """
+        :return: the user's own token
+        """
+        return self.tokens[0]
+
+    @staticmethod
+    def headers(token: str) -> Dict[str, str]:
+        """
+        :param token: access token to make a request with
+        :return: headers authorizing the request
+        """
+        return {"Authorization": f"Bearer {token}"}
+
+    def select(
+        self, resource: str, repo: Optional[str] = None, denied: Set[str] = frozenset()
+    ) -> Optional[str]:
+        """
+        :param resource: rate limit resource of the request, CORE or GRAPHQL
+        :param repo: name of the repo requested, if any, in owner/name format
+        :param denied: tokens found not to have access to the repo
+        :return: the token pinned to the repo, or else the token with the most
+        remaining requests, resting tokens hitting limits unless all are, or
+        None if all tokens are denied. The request is counted as made with it.
+        """
+        candidates = [token for token in self.tokens if token not in denied]
+        if not candidates:
+            return None
+        now = time()
+        available = [
+            token for token in candidates if self.__usage[token].limited_until <= now
+        ]
+        if not available:
+            token = min(candidates, key=lambda token: self.__usage[token].limited_until)
+        elif repo in self.__pins and self.__pins[repo] in available:
+            token = self.__pins[repo]
+        else:
+            # tokens not yet answered are assumed to have their whole rate
+            # limit left, and ties go to the token with the fewest requests,
+            # e.g. of concurrent requests made before any are answered
+            token = max(
+                available,
+                key=lambda token: (
+                    self.__usage[token].remaining.get(resource, float("inf")),
+                    -self.__usage[token].requests,
+                ),
+            )
+        return self.use(token)
+
+    def use(self, token: str) -> str:
+        """
+        :param token: access token a request is made with
+        :return: the token, with the request counted as made with it
+        """
+        self.__usage[token].requests += 1
+        return token
+
+    def has_available(self, exclude: Set[str]) -> bool:
+        """
+        :param exclude: tokens to exclude, e.g. found not to have repo access
+        :return: True if any other token is not resting after hitting a limit
+        """
+        now = time()
+        return any(
+            self.__usage[token].limited_until <= now
+            for token in self.tokens
+            if token not in exclude
+        )
+
+    def record(self, token: str, resource: str, status: int, headers) -> bool:
+        """
+        Records the remaining rate limit of a token reported by the response
+        to a request, resting the token if it reports a rate limit hit
+        :param token: access token the request was made with
+        :param resource: rate limit resource of the request, if not reported
+        :param status: status of the response
+        :param headers: headers of the response
+        :return: True if the token hit a primary or secondary rate limit
+        """
+        usage = self.__usage[token]
+        resource = headers.get("X-RateLimit-Resource") or resource
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            usage.remaining[resource] = int(remaining)
+
+        retry_after = headers.get("Retry-After")
+        # a 429 is always a rate limit, while a 403 is one only if it reports
+        # no remaining requests or a time to retry after
+        if status != 429 and (
+            status != 403 or (remaining != "0" and retry_after is None)
+        ):
+            return False
+
+        usage.rate_limited += 1
+        reset = headers.get("X-RateLimit-Reset")
+        if retry_after is not None and retry_after.isdigit():
+            usage.limited_until = time() + int(retry_after)
+        elif remaining == "0" and reset is not None and reset.isdigit():
+            usage.limited_until = float(reset)
+        else:
+            usage.limited_until = time() + DEFAULT_RETRY_AFTER
+        return True
+
+    def pin(self, repo: str, token: str) -> None:
+        """
+        Pins the requests of a repo to a token found to have access to it
+        :param repo: name of the repo in owner/name format
+        :param token: access token a request of the repo succeeded with
+        """
+        self.__pins[repo] = token
+
+    def report(self) -> str:
+        """
+        :return: summary of the requests made with each token, and their
+        remaining rate limits
+        """
+        lines = ["Token usage:"]
+        for token in self.tokens:
+            usage = self.__usage[token]
+            remaining = ", ".join(
+                f"{resource} {count:,} left"
+                for resource, count in sorted(usage.remaining.items())
+            )
+            lines.append(
+                f"  {usage.name}: {usage.requests:,} requests, "
+                f"{usage.rate_limited:,} rate limited"
+                + (f", {remaining}" if remaining else "")
+            )
+        return "\n".join(lines)
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+from asyncio import Task, current_task
+from contextlib import contextmanager, nullcontext
+from json import dumps
+from os import getpid
+from time import monotonic
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+from src.json_file import write_json_file
+
+###############################################################################
+# Tracer class
+###############################################################################
+
+
+class Tracer(object):
+    """
+    Opt-in timeline of the requests, semaphore waits, 202 sleeps, phases of
+    fetching stats and images rendered, each as a span on the track of the
+    asyncio task it ran in, saved in the Chrome trace event format, which
+    chrome://tracing and ui.perfetto.dev open. Shows where concurrent work
+    serializes and where the connection pool sits idle. Disabled tracers
+    record nothing.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: True to record spans, e.g. if TRACE_PATH is set
+        """
+        self.enabled = enabled
+        self.__start = monotonic()
+        self.__pid = getpid()
+        self.__events: List[Dict[str, Any]] = []
+        # track id of each task, in the order the tasks first recorded a span;
+        # tasks are kept until cleared, so their ids are not reused
+        self.__tids: Dict[Optional[Task], int] = dict()
+
+    def __tid(self) -> int:
+        """
+        :return: track id of the current asyncio task, naming the track after
+        the task and its coroutine the first time the task records a span
+        """
+        task = current_task()
+        tid = self.__tids.get(task)
+        if tid is None:
+            tid = self.__tids[task] = len(self.__tids) + 1
+            name = (
+                "main"
+                if task is None
+                else f"{task.get_name()} {task.get_coro().__qualname__}"
+            )
+            self.__events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.__pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+        return tid
+
+    def add(
+        self, name: str, category: str, start: float, end: float, **args: Any
+    ) -> None:
+        """
+        Records a span of the current task from already measured times
+        :param name: name of the span, e.g. GET stats/contributors
+        :param category: category of the span, e.g. request
+        :param start: monotonic time the span started
+        :param end: monotonic time the span ended
+        :param args: details of the span shown when it is selected
+        """
+        if not self.enabled:
+            return
+        self.__events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.__start) * 1e6, 3),
+                "dur": round((end - start) * 1e6, 3),
+                "pid": self.__pid,
+                "tid": self.__tid(),
+                "args": args,
+            }
+        )
+
+    def span(self, name: str, category: str, **args: Any) -> ContextManager:
+        """
+        :param name: name of the span, e.g. lines_changed
+        :param category: category of the span, e.g. phase
+        :param args: details of the span shown when it is selected
+        :return: context manager recording a span of the current task for the
+        time it is entered
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self.__span(name, category, args)
+
+    @contextmanager
+    def __span(self, name: str, category: str, args: Dict[str, Any]) -> Iterator:
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, monotonic(), **args)
+
+    def clear(self) -> None:
+        """
+        Removes the spans recorded so far, e.g. of the last refresh
+        """
+        self.__events = []
+        self.__tids = dict()
+
+    def save(self, path: Optional[str]) -> None:
+        """
+        Atomically writes the spans recorded, if enabled
+        :param path: path of the trace file, gzip compressed if it ends in .gz
+        """
+        if self.enabled and path:
+            write_json_file(
+                path,
+                dumps({"traceEvents": self.__events, "displayTimeUnit": "ms"}),
+            )
@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+
+from glob import glob
+from hashlib import sha256
+from hmac import compare_digest, new as new_hmac
+from json import dumps
+from os import remove
+from os.path import isfile, join
+from typing import Any, Dict, List, Optional
+
+from src.github_repo_stats import GitHubRepoStats
+from src.json_file import read_json_file, write_json_file
+
+# webhook events applied to the stats, other events are ignored
+WEBHOOK_EVENTS = ("push", "pull_request", "issues", "star", "fork")
+DEFAULT_WEBHOOK_DIR = "webhook_events"  # directory of recorded webhook events
+SIGNATURE_PREFIX = "sha256="
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    :param secret: secret the webhook is configured with
+    :param body: raw body of the webhook request
+    :param signature: X-Hub-Signature-256 header of the webhook request
+    :return: True if the body was signed with the secret
+    """
+    if not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = new_hmac(secret.encode("utf-8"), body, sha256).hexdigest()
+    return compare_digest(signature[len(SIGNATURE_PREFIX) :], expected)
+
+
+###############################################################################
+# WebhookEvent class
+###############################################################################
+
+
+class WebhookEvent(object):
+    """
+    GitHub webhook event, e.g. a push or a star of a repo, applied to the
+    saved stats of the last run as a change to the per-repo results, so only
+    the results of the repos changed since are fetched again. Events are
+    recorded as JSON files holding the event name from the X-GitHub-Event
+    header, the delivery id and the payload.
+    """
+
+    def __init__(
+        self, event: str, payload: Dict[str, Any], delivery: Optional[str] = None
+    ):
+        """
+        :param event: name of the event, e.g. push
+        :param payload: payload of the event
+        :param delivery: unique id of the delivery of the event, if known
+        """
+        self.event = event
+        self.payload = payload
+        self.delivery = delivery
+
+    @classmethod
+    def load(cls, path: str) -> "WebhookEvent":
+        """
+        :param path: path of a recorded event, gzip compressed if it ends in .gz
+        :return: the recorded event
+        """
+        data = read_json_file(path)
+        if not isinstance(data.get("payload"), dict) or not data.get("event"):
+            raise ValueError(f"{path} is not a recorded webhook event")
+        return cls(data["event"], data["payload"], data.get("delivery"))
+
+    def save(self, path: str) -> None:
+        """
+        Atomically writes the event to a file, so it is never read partly
+        written by a run applying recorded events
+        :param path: the file path to write to
+        """
+        write_json_file(
+            path,
+            dumps(
+                {
+                    "event": self.event,
+                    "delivery": self.delivery,
+                    "payload": self.payload,
+                },
+                separators=(",", ":"),
+            ),
+        )
+
+    @property
+    def repo(self) -> Optional[str]:
+        """
+        :return: name of the repo of the event in owner/name format, if any
+        """
+        return (self.payload.get("repository") or {}).get("full_name")
+
+    @property
+    def action(self) -> Optional[str]:
+        """
+        :return: action of the event, e.g. opened for pull_request events
+        """
+        return self.payload.get("action")
+
+    def is_by_user(self, stats: GitHubRepoStats) -> bool:
+        """
+        :param stats: the statistics the event is applied to
+        :return: True if the event was sent by the user, or a member of the
+        organization
+        """
+        if self.event == "pull_request":
+            sender = (self.payload.get("pull_request") or {}).get("user") or {}
+        elif self.event == "issues":
+            sender = (self.payload.get("issue") or {}).get("user") or {}
+        else:
+            sender = self.payload.get("sender") or {}
+        return stats.is_users_author(sender.get("login", ""))
+
+    def apply(self, stats: GitHubRepoStats) -> bool:
+        """
+        Applies the event to the stats, updating the stargazers and forks of
+        the repo to those sent with the event, invalidating the lines changed
+        in the repo if pushed to or merged into, and counting pull requests and
+        issues opened by the user
+        :param stats: the statistics of the last run, to apply the event to
+        :return: True if the event changed the stats
+        """
+        if self.event not in WEBHOOK_EVENTS:
+            return False
+        environment_vars = stats.environment_vars
+        is_by_user = self.is_by_user(stats)
+        is_changed = False
+
+        if self.action == "opened" and is_by_user:
+            if self.event == "pull_request":
+                environment_vars.set_pull_requests(
+                    environment_vars.pull_requests_count + 1
+                )
+                is_changed = True
+            elif self.event == "issues":
+                environment_vars.set_issues(environment_vars.issues_count + 1)
+                is_changed = True
+
+        if is_by_user and (self.event == "push" or self.action == "opened"):
+            stats.invalidate_total_contributions()
+            is_changed = True
+
+        repo = self.repo
+        if repo is None:
+            return is_changed
+
+        # dropped even once the listing is, as the results of repos already
+        # fetched are kept when the listing is fetched again
+        if self.event == "push" or (
+            self.event == "pull_request"
+            and self.action == "closed"
+            and (self.payload.get("pull_request") or {}).get("merged")
+        ):
+            stats.invalidate_repo_lines_changed(repo)
+            is_changed = True
+
+        # the listing of saved stats is only missing when fetched again anyway
+        if not stats.has_listing():
+            return is_changed
+
+        if not stats.is_repo_listed(repo, with_languages=self.event == "push"):
+            repository = self.payload.get("repository") or {}
+            if environment_vars.repo_filter.is_name_excluded(
+                repo
+            ) or environment_vars.repo_filter.is_type_excluded(repository):
+                return is_changed
+            # new or no longer empty repos need their languages listed
+            stats.invalidate_listing()
+            return True
+
+        repository = self.payload["repository"]
+        if "stargazers_count" in repository and "forks_count" in repository:
+            stats.set_repo_counts(
+                repo, repository["stargazers_count"], repository["forks_count"]
+            )
+            is_changed = True
+        return is_changed
+
+
+def find_webhook_events(directory: str) -> List[str]:
+    """
+    :param directory: directory of recorded webhook events
+    :return: paths of the recorded events, in the order they were received
+    """
+    return sorted(glob(join(directory, "*.json")))
+
+
+def apply_webhook_events(stats: GitHubRepoStats, paths: List[str]) -> int:
+    """
+    Applies recorded webhook events to the stats, in the order of their paths
+    :param stats: the statistics of the last run, to apply the events to
+    :param paths: paths of the recorded events, e.g. named by time received
+    :return: number of events that changed the stats
+    """
+    applied = 0
+    for path in paths:
+        try:
+            event = WebhookEvent.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping webhook event {path}: {e}")
+            continue
+        if event.apply(stats):
+            applied += 1
+    return applied
+
+
+def remove_webhook_events(paths: List[str]) -> None:
+    """
+    Removes recorded webhook events once applied by a completed run, so they
+    are not applied again
+    :param paths: paths of the recorded events
+    """
+    for path in paths:
+        if isfile(path):
+            remove(path)
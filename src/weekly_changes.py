@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+
+from datetime import date, datetime, timedelta, timezone
+from math import fsum
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+WEEK_SECONDS = 7 * 24 * 60 * 60
+# weeks of /stats/contributors start on Sundays, 3 days after the epoch's
+SUNDAY_OFFSET = 3 * 24 * 60 * 60
+
+
+def week_of(day: date) -> int:
+    """
+    :param day: a date
+    :return: number of the week starting on the Sunday of or before the date,
+    counted from the week of the epoch
+    """
+    timestamp = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return (int(timestamp.timestamp()) - SUNDAY_OFFSET) // WEEK_SECONDS
+
+
+###############################################################################
+# StatsWindow class
+###############################################################################
+
+
+class StatsWindow(object):
+    """
+    Window of weeks to summarize stats over, either the last number of days,
+    e.g. 30d, or a calendar year, e.g. 2024. Weeks are those of the
+    /stats/contributors path, so a window includes every week overlapping the
+    last days, or every week starting in the year.
+    """
+
+    def __init__(self, days: Optional[int] = None, year: Optional[int] = None):
+        if (days is None) == (year is None):
+            raise ValueError("A stats window is either of days or of a year")
+        if days is not None and days < 1:
+            raise ValueError(f"Invalid stats window of {days} days")
+        self.days = days
+        self.year = year
+
+    @classmethod
+    def parse(cls, spec: str) -> "StatsWindow":
+        """
+        :param spec: number of days followed by d, e.g. 30d, 90d or 365d, or
+        a calendar year, e.g. 2024
+        :return: the window
+        """
+        spec = spec.strip().lower()
+        try:
+            if spec.endswith("d"):
+                return cls(days=int(spec[:-1]))
+            if len(spec) == 4:
+                return cls(year=int(spec))
+        except ValueError:
+            pass
+        raise ValueError(f"Invalid stats window {spec} (expected e.g. 30d or 2024)")
+
+    def __str__(self) -> str:
+        return f"last {self.days} days" if self.days is not None else str(self.year)
+
+    def weeks(self, today: Optional[date] = None) -> Tuple[int, int]:
+        """
+        :param today: date the last days are counted back from, today if None
+        :return: numbers of the first and last weeks of the window
+        """
+        if self.year is not None:
+            first_day = date(self.year, 1, 1)
+            # the week of January 1st starts in the year only on a Sunday
+            first = week_of(first_day) + (first_day.isoweekday() != 7)
+            return first, week_of(date(self.year, 12, 31))
+        today = today if today is not None else date.today()
+        return week_of(today - timedelta(days=self.days - 1)), week_of(today)
+
+
+###############################################################################
+# WindowStats class
+###############################################################################
+
+
+class WindowStats(NamedTuple):
+    """
+    Stats of the weeks of a window, summarized like those of all weeks
+    """
+
+    additions: int
+    deletions: int
+    avg_contribution_percent: str
+    avg_contribution_percent_weighted: str
+
+
+###############################################################################
+# WeeklyChanges class
+###############################################################################
+
+
+class WeeklyChanges(object):
+    """
+    Compact week-indexed store of the changes in each repo, kept from the
+    weekly buckets of the /stats/contributors responses fetched for the
+    lifetime lines changed, so stats of any window of weeks are summarized
+    from it without fetching them again. Only weeks with changes are stored,
+    as flat lists of numbers:
+        {repo: {"user": [week, additions, deletions, commits, ...],
+                "others": {author: [week, changes, ...]}}}
+    The repos whose shares of changes are averaged are kept with them, as
+    classified when summarizing all weeks.
+    """
+
+    def __init__(
+        self,
+        repos: Optional[Dict[str, Dict[str, Any]]] = None,
+        percent_repos: Optional[Dict[str, bool]] = None,
+    ):
+        """
+        :param repos: weekly changes of each repo, as returned by to_json
+        :param percent_repos: repos included by the collab repo filters,
+        mapped to whether they are in collaboration with others regardless of
+        their changes, e.g. by having other collaborators
+        """
+        self.repos: Dict[str, Dict[str, Any]] = repos if repos is not None else {}
+        self.percent_repos: Dict[str, bool] = (
+            percent_repos if percent_repos is not None else {}
+        )
+
+    def add(
+        self,
+        repo: str,
+        contributors_data: Any,
+        is_users_author: Callable[[str], bool],
+    ) -> None:
+        """
+        Stores the weekly changes of a repo, replacing any stored before
+        :param repo: name of the repo in owner/name format
+        :param contributors_data: response of the repo /stats/contributors path
+        :param is_users_author: whether an author's changes are the user's
+        """
+        users: Dict[int, List[int]] = dict()
+        others: Dict[str, List[int]] = dict()
+        for author_obj in contributors_data:
+            # malformed responses are skipped as for the lifetime lines changed
+            if not isinstance(author_obj, dict) or not isinstance(
+                author_obj.get("author", {}), dict
+            ):
+                continue
+            author = author_obj.get("author", {}).get("login", "")
+            is_users = is_users_author(author)
+            weeks = []
+            for week in author_obj.get("weeks", []):
+                additions, deletions = week.get("a", 0), week.get("d", 0)
+                commits = week.get("c", 0)
+                if not (additions or deletions or commits):
+                    continue
+                number = (week.get("w", 0) - SUNDAY_OFFSET) // WEEK_SECONDS
+                if is_users:
+                    # changes of all of the user's authors, e.g. bots, summed
+                    counts = users.setdefault(number, [0, 0, 0])
+                    counts[0] += additions
+                    counts[1] += deletions
+                    counts[2] += commits
+                else:
+                    weeks.extend((number, additions + deletions))
+            if weeks:
+                others[author] = weeks
+        self.repos[repo] = {
+            "user": [
+                value for number in sorted(users) for value in (number, *users[number])
+            ],
+            "others": others,
+        }
+
+    def remove(self, repo: str) -> None:
+        """
+        :param repo: name of the repo in owner/name format
+        """
+        self.repos.pop(repo, None)
+        self.percent_repos.pop(repo, None)
+
+    def classify(self, repo: str, included: bool, collab: bool) -> None:
+        """
+        Sets whether the user's share of the changes of a repo is averaged
+        :param repo: name of the repo in owner/name format
+        :param included: whether the repo is included by the collab repo
+        filters
+        :param collab: whether the repo is in collaboration with others even
+        in windows only the user changed it in
+        """
+        if included:
+            self.percent_repos[repo] = collab
+        else:
+            self.percent_repos.pop(repo, None)
+
+    def update(self, other: "WeeklyChanges") -> None:
+        """
+        Stores the weekly changes of the repos of another store, e.g. of
+        another shard
+        """
+        self.repos.update(other.repos)
+        self.percent_repos.update(other.percent_repos)
+
+    def summarize(self, window: StatsWindow, repos: Iterable[str]) -> WindowStats:
+        """
+        :param window: window of weeks to summarize
+        :param repos: names of the repos to summarize, e.g. those of the user
+        :return: the user's lines changed in the window, the average share of
+        the changes of each repo the user and others changed in the window
+        """
+        first, last = window.weeks()
+        additions = deletions = 0
+        percentages = []
+        percentages_weighted = []
+        # repos are summarized in name order, as for all weeks
+        for repo in sorted(set(repos).intersection(self.repos)):
+            changes = self.repos[repo]
+            user = changes["user"]
+            repo_additions = repo_deletions = 0
+            for i in range(0, len(user), 4):
+                if first <= user[i] <= last:
+                    repo_additions += user[i + 1]
+                    repo_deletions += user[i + 2]
+            others_changes = 0
+            repo_authors = set()
+            for author, weeks in changes["others"].items():
+                for i in range(0, len(weeks), 2):
+                    if first <= weeks[i] <= last:
+                        others_changes += weeks[i + 1]
+                        repo_authors.add(author)
+            additions += repo_additions
+            deletions += repo_deletions
+
+            users_changes = repo_additions + repo_deletions
+            if (
+                repo in self.percent_repos
+                and users_changes > 0
+                and (others_changes > 0 or self.percent_repos[repo])
+            ):
+                # the user is always counted as a contributor to the repo
+                num_contributors = len(repo_authors) + 1
+                percentages.append(users_changes / (users_changes + others_changes))
+                percentages_weighted.append(
+                    min(
+                        1.0,
+                        percentages[-1]
+                        / (1 / num_contributors * (2 if num_contributors > 1 else 1)),
+                    )
+                )
+
+        if percentages:
+            avg_percent = f"{fsum(percentages) / len(percentages) * 100:0.2f}%"
+            avg_percent_weighted = (
+                f"{fsum(percentages_weighted) / len(percentages) * 100:0.2f}%"
+            )
+        else:
+            avg_percent = avg_percent_weighted = "N/A"
+        return WindowStats(
+            additions=additions,
+            deletions=deletions,
+            avg_contribution_percent=avg_percent,
+            avg_contribution_percent_weighted=avg_percent_weighted,
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        :return: the weekly changes of each repo and the repos whose shares of
+        changes are averaged in the form of JSON
+        """
+        return {"repos": self.repos, "percent_repos": self.percent_repos}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "WeeklyChanges":
+        """
+        :param data: weekly changes of each repo, as returned by to_json
+        :return: the store
+        """
+        return cls(dict(data.get("repos", {})), dict(data.get("percent_repos", {})))
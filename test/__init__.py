@@ -1 +1,21 @@
-__all__ = ["git_stats_test"]
+__all__ = [
+    "badge_server_benchmark",
+    "cassette_test",
+    "checkpoint_test",
+    "end_to_end_benchmark",
+    "fault_injection_benchmark",
+    "git_stats_test",
+    "hot_paths_benchmark",
+    "hyperloglog_benchmark",
+    "hyperloglog_test",
+    "mock_github_server",
+    "repo_filter_benchmark",
+    "response_cache_test",
+    "startup_benchmark",
+    "stats_client_test",
+    "stats_history_test",
+    "svg_template_benchmark",
+    "token_pool_test",
+    "webhooks_test",
+    "weekly_changes_test",
+]
@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+
+"""
+Load tests the badge server with a mix of full, gzip and conditional requests
+"""
+
+from aiohttp import ClientSession, TCPConnector, web
+from asyncio import gather, run, sleep
+from gzip import decompress
+from multiprocessing import Process
+from os.path import join
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from src.badge_server import BadgeServer
+from src.stats_artifact import StatsArtifact, ARTIFACT_VERSION
+from src.svg_template import THEMES
+
+NUM_REQUESTS = 20000
+CONCURRENCY = 64
+HOST = "127.0.0.1"
+PORT = 8089
+USERNAME = "octocat"
+CONDITIONAL_SHARE = 0.6  # share of requests sent with a current ETag
+
+STATS = {
+    "name": "The Octocat",
+    "stargazers": 12345,
+    "forks": 321,
+    "total_contributions": 4567,
+    "languages": {
+        f"Language{i}": {"size": 1000 * (12 - i), "occurrences": 1, "prop": 8.0}
+        for i in range(12)
+    },
+    "excluded_languages": ["HTML"],
+    "repos": [f"octocat/repo-{i}" for i in range(120)],
+    "lines_changed": [1234567, 89012],
+    "avg_contribution_percent": "51.23%",
+    "avg_contribution_percent_weighted": "78.90%",
+    "views": 12345,
+    "views_from_date": "2024-01-01",
+    "collaborators": 89,
+    "collaborator_set": ["octocat"],
+    "contributors": ["octocat", "hubot"],
+    "collab_repos": [],
+    "contributed_collab_repos": [f"octocat/repo-{i}" for i in range(45)],
+}
+
+
+def serve(artifact_path: str) -> None:
+    web.run_app(BadgeServer([artifact_path]).app(), host=HOST, port=PORT, print=None)
+
+
+async def load_test(num_requests: int, concurrency: int) -> None:
+    base_url = f"http://{HOST}:{PORT}"
+    paths = [
+        f"/{USERNAME}/{image}.svg?theme={theme}"
+        for image in ("overview", "languages")
+        for theme in THEMES
+    ]
+
+    async with ClientSession(
+        connector=TCPConnector(limit=concurrency), auto_decompress=False
+    ) as session:
+        for _ in range(50):
+            try:
+                async with session.get(base_url + paths[0]):
+                    break
+            except OSError:
+                await sleep(0.1)
+
+        # check each badge is served alike with and without gzip, and as 304
+        etags = dict()
+        for path in paths:
+            async with session.get(
+                base_url + path, headers={"Accept-Encoding": "identity"}
+            ) as r:
+                assert "Content-Encoding" not in r.headers
+                body = await r.read()
+                etags[path] = r.headers["ETag"]
+            async with session.get(
+                base_url + path, headers={"Accept-Encoding": "gzip"}
+            ) as r:
+                assert r.headers["Content-Encoding"] == "gzip"
+                assert decompress(await r.read()) == body, path
+            async with session.get(
+                base_url + path, headers={"If-None-Match": etags[path]}
+            ) as r:
+                assert r.status == 304, path
+
+        latencies = []
+        statuses = {200: 0, 304: 0}
+
+        async def client(worker: int) -> None:
+            for i in range(worker, num_requests, concurrency):
+                path = paths[i % len(paths)]
+                headers = {"Accept-Encoding": "gzip"}
+                if (i % 100) < CONDITIONAL_SHARE * 100:
+                    headers["If-None-Match"] = etags[path]
+                start = perf_counter()
+                async with session.get(base_url + path, headers=headers) as r:
+                    await r.read()
+                    statuses[r.status] += 1
+                latencies.append(perf_counter() - start)
+
+        start = perf_counter()
+        await gather(*[client(worker) for worker in range(concurrency)])
+        elapsed = perf_counter() - start
+
+    latencies.sort()
+    print(f"Requests: {num_requests:,} | Concurrency: {concurrency}")
+    print(
+        f"Throughput: {num_requests / elapsed:,.0f} requests/s "
+        f"(200: {statuses[200]:,}, 304: {statuses[304]:,})"
+    )
+    print(
+        f"Latency: p50 {latencies[len(latencies) // 2] * 1000:0.2f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:0.2f} ms"
+    )
+
+
+def main() -> None:
+    num_requests = int(argv[1]) if len(argv) > 1 else NUM_REQUESTS
+    concurrency = int(argv[2]) if len(argv) > 2 else CONCURRENCY
+
+    with TemporaryDirectory() as temp_dir:
+        artifact_path = join(temp_dir, "stats_artifact.json.gz")
+        StatsArtifact(
+            {
+                "version": ARTIFACT_VERSION,
+                "username": USERNAME,
+                "generated_at": "2024-01-02T00:00:00+00:00",
+                "stats": STATS,
+            }
+        ).save(artifact_path)
+
+        # the server runs on its own core, as it would in production
+        server = Process(target=serve, args=(artifact_path,), daemon=True)
+        server.start()
+        try:
+            run(load_test(num_requests, concurrency))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+"""
+Records the exchanges of fetching a synthetic user's stats from the mock
+GitHub API into a cassette, then replays them with the mock stopped, checking
+the replayed stats match, and prints the results for testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import run
+from os.path import getsize, join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Dict
+
+from src.cassette import Cassette, RecordingSession, ReplayingSession
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_artifact import StatsArtifact
+from test.mock_github_server import HOST, USERNAME, MockGitHub, SyntheticData
+
+NUM_REPOS = 200
+ACCEPTED_PROBABILITY = 0.05
+
+
+async def fetch_stats(session: Any, api_url: str, db_path: str) -> Dict[str, Any]:
+    """
+    :return: all stats of the synthetic user, fetched through the session
+    """
+    environment_vars = EnvironmentVariables(
+        username=USERNAME, access_token="mock-token", db_path=db_path
+    )
+    queries = GitHubApiQueries(
+        username=USERNAME, access_token="mock-token", session=session, api_url=api_url
+    )
+    stats = GitHubRepoStats(
+        environment_vars=environment_vars, session=session, queries=queries
+    )
+    return (await StatsArtifact.from_stats(stats)).data["stats"]
+
+
+async def main() -> None:
+    """
+    Used for testing
+    """
+    mock = MockGitHub(
+        SyntheticData(NUM_REPOS), accepted_probability=ACCEPTED_PROBABILITY
+    )
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    api_url = f"http://{HOST}:{port}/"
+
+    with TemporaryDirectory() as temp_dir:
+        path = join(temp_dir, "cassette.json.gz")
+        try:
+            cassette = Cassette(api_url)
+            start = perf_counter()
+            async with ClientSession() as session:
+                recorded = await fetch_stats(
+                    RecordingSession(session, cassette),
+                    api_url,
+                    join(temp_dir, "record_db.json"),
+                )
+            record_time = perf_counter() - start
+            cassette.save(path)
+        finally:
+            # replaying must not need the API
+            await runner.cleanup()
+        print(
+            f"Recorded {len(cassette.exchanges)} exchanges "
+            f"({mock.stats['accepted']} accepted) in {record_time:0.2f}s, "
+            f"{getsize(path) / 1024:0.1f} KiB compressed"
+        )
+        assert len(cassette.exchanges) == mock.stats["graphql"] + mock.stats["core"]
+
+        start = perf_counter()
+        replayed = await fetch_stats(
+            ReplayingSession(Cassette.load(path, api_url), speed=0),
+            api_url,
+            join(temp_dir, "replay_db.json"),
+        )
+        replay_time = perf_counter() - start
+        assert replayed == recorded, "replayed stats differ from those recorded"
+        print(f"Replayed in {replay_time:0.2f}s: stats match")
+
+
+if __name__ == "__main__":
+    run(main())
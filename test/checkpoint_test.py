@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+
+"""
+Interrupts runs fetching a synthetic user's stats from the mock GitHub API,
+before and during the repo listing and during the per-repo results, or by a
+time budget passing during the listing, saves a checkpoint of each and
+resumes it in a new run, checking the resumed stats
+match those of an uninterrupted run, that a partly fetched listing is never
+saved, and that the per-repo results saved are not fetched again, and prints
+the results for testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import ensure_future, gather, run, sleep
+from time import monotonic
+from os.path import join
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Dict, Tuple
+
+from src.checkpoint import Checkpoint
+from src.db.db import GitRepoStatsDB
+from src.deadline_stats import DeadlineStats
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from test.mock_github_server import HOST, USERNAME, MockGitHub, SyntheticData
+
+NUM_REPOS = 600  # several pages of owned repos
+LATENCY = 0.02  # seconds, so runs are interrupted mid-phase
+
+
+def new_stats(session: ClientSession, api_url: str, token: str) -> GitHubRepoStats:
+    """
+    :param token: token of the run, each run with its own rate limits
+    :return: stats of the synthetic user, with a db held in memory
+    """
+    return GitHubRepoStats(
+        environment_vars=EnvironmentVariables(
+            username=USERNAME,
+            access_token=token,
+            db=GitRepoStatsDB(in_memory=True),
+        ),
+        session=session,
+        queries=GitHubApiQueries(
+            username=USERNAME,
+            access_token=token,
+            session=session,
+            api_url=api_url,
+        ),
+    )
+
+
+async def summary(stats: GitHubRepoStats) -> Tuple[Any, ...]:
+    """
+    :return: the stats of the listing and the per-repo results compared
+    """
+    return (
+        await stats.name,
+        len(await stats.repos),
+        await stats.stargazers,
+        await stats.forks,
+        await stats.lines_changed,
+        await stats.collaborators,
+    )
+
+
+async def interrupt(
+    stats: GitHubRepoStats, mock: MockGitHub, until: Callable[[Dict], bool]
+) -> None:
+    """
+    Runs the fetch of the stats until the requests it has had answered by the
+    mock API, by API, meet the condition, then cancels it as an interrupted
+    run is
+    """
+    start = dict(mock.stats)
+
+    def answered() -> Dict[str, int]:
+        return {api: mock.stats[api] - start[api] for api in ("graphql", "core")}
+
+    task = ensure_future(summary(stats))
+    # at least until the first requests are sent, but not answered
+    await sleep(LATENCY / 2)
+    while not until(answered()) and not task.done():
+        await sleep(0.001)
+    assert not task.done(), "run completed before it was interrupted"
+    task.cancel()
+    await gather(task, return_exceptions=True)
+
+
+async def exceed_budget(stats: GitHubRepoStats, *_: Any) -> None:
+    """
+    Computes the stats until a time budget passing during the listing, as a
+    run with TIME_BUDGET set does, cancelling the phases still pending
+    """
+    deadline = monotonic() + LATENCY * 1.5
+    assert not await DeadlineStats(stats, None, deadline).compute()
+
+
+async def main() -> None:
+    """
+    Used for testing
+    """
+    mock = MockGitHub(SyntheticData(NUM_REPOS), latency=LATENCY)
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    api_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+
+    # interrupted before the first page is answered, after it, and after the
+    # listing
+    cases = {
+        "before listing": (interrupt, lambda counts: True),
+        "during listing": (interrupt, lambda counts: counts["graphql"] >= 1),
+        "during per-repo results": (
+            interrupt,
+            lambda counts: counts["core"] >= NUM_REPOS // 2,
+        ),
+        "by the time budget": (exceed_budget, None),
+    }
+    results = dict()
+    try:
+        async with ClientSession() as session:
+            expected = await summary(new_stats(session, api_url, "token"))
+            requests = mock.stats["core"]
+
+            with TemporaryDirectory() as temp_dir:
+                for case, (stop, until) in cases.items():
+                    checkpoint = Checkpoint(join(temp_dir, "checkpoint.json"), USERNAME)
+                    stats = new_stats(session, api_url, f"{case}-interrupted")
+                    await stop(stats, mock, until)
+                    assert not stats.has_listing() or case.endswith("results")
+                    checkpoint.save(stats.export_state())
+
+                    state = checkpoint.load()
+                    assert ("listing" in state) == case.endswith("results"), case
+                    resumed = new_stats(session, api_url, f"{case}-resumed")
+                    resumed.import_state(state)
+                    start = mock.stats["core"]
+                    assert await summary(resumed) == expected, f"{case}: differ"
+                    results[case] = (
+                        len(state["repo_lines_changed"])
+                        + len(state["repo_collaborators"]),
+                        mock.stats["core"] - start,
+                    )
+                    checkpoint.clear()
+    finally:
+        await runner.cleanup()
+
+    saved, fetched = results["during per-repo results"]
+    assert saved > 0 and fetched < requests, "saved results fetched again"
+    for case, (saved, fetched) in results.items():
+        print(
+            f"Interrupted {case}: {saved} per-repo results saved, resumed with "
+            f"{fetched:,} of {requests:,} REST requests; stats match"
+        )
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks full GenerateImages runs against the mock GitHub API for synthetic
+users of each scenario's size, reporting the wall time, requests made, peak
+RSS and API cost of each, and fails if any regressed from the baseline, e.g.
+python -m test.end_to_end_benchmark small,medium
+python -m test.end_to_end_benchmark small,medium --update-baseline
+"""
+
+from json import dumps, load, loads
+from multiprocessing import Process
+from os import environ, makedirs, wait4, waitstatus_to_exitcode
+from os.path import abspath, dirname, isfile, join
+from shutil import copyfile
+from socket import socket
+from subprocess import Popen
+from sys import argv, executable
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+from typing import Any, Dict
+from urllib.request import urlopen
+
+from test.mock_github_server import HOST, SCENARIOS, USERNAME, serve
+
+ROOT = dirname(dirname(abspath(__file__)))
+BASELINE_PATH = join(dirname(__file__), "fixtures", "benchmarks", "end_to_end.json")
+LATENCY = 0.02  # seconds per request of the mock API
+ACCEPTED_PROBABILITY = 0.05  # of 202 responses to contributor stats
+RATE_LIMIT = 10**9  # high enough for the largest scenario with one token
+DEFAULT_SCENARIOS = "small,medium"
+# relative increase over the baseline reported as a regression of each metric;
+# the requests and API cost of a run are deterministic, unlike its timing
+TOLERANCES = {"requests": 0.0, "api_cost": 0.0, "wall_time": 0.5, "peak_rss_mb": 0.25}
+WALL_TIME_SLACK = 0.5  # seconds, so the timing of small runs is not flaky
+
+
+def free_port() -> int:
+    """
+    :return: a port no other server is listening on
+    """
+    with socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(base_url: str) -> None:
+    """
+    Waits until the mock API started in another process answers requests
+    """
+    for _ in range(100):
+        try:
+            with urlopen(base_url + "__stats"):
+                return
+        except OSError:
+            sleep(0.1)
+    raise RuntimeError(f"Mock GitHub API at {base_url} did not start")
+
+
+def run_scenario(num_repos: int) -> Dict[str, Any]:
+    """
+    Runs git_stats_imgs.py in a fresh directory against the mock API
+    :param num_repos: number of repos of the synthetic user
+    :return: the wall time, requests, peak RSS and API cost of the run
+    """
+    port = free_port()
+    base_url = f"http://{HOST}:{port}/"
+    server = Process(
+        target=serve,
+        args=(num_repos, port, LATENCY, ACCEPTED_PROBABILITY, RATE_LIMIT),
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(base_url)
+        with TemporaryDirectory() as temp_dir:
+            # the db is read relative to the working directory, so the run
+            # does not update the repo's own
+            makedirs(join(temp_dir, "src", "db"))
+            copyfile(
+                join(ROOT, "src", "db", "db.json"),
+                join(temp_dir, "src", "db", "db.json"),
+            )
+            metrics_path = join(temp_dir, "metrics.json")
+            log_path = join(temp_dir, "run.log")
+            env = {
+                # none of the other variables, which may set other modes
+                "PATH": environ.get("PATH", ""),
+                "GITHUB_STATS_API_URL": base_url,
+                "GITHUB_ACTOR": USERNAME,
+                "ACCESS_TOKEN": "mock-token",
+                "METRICS_PATH": metrics_path,
+            }
+
+            start = perf_counter()
+            with open(log_path, "w") as log:
+                process = Popen(
+                    [executable, join(ROOT, "git_stats_imgs.py")],
+                    cwd=temp_dir,
+                    env=env,
+                    stdout=log,
+                    stderr=log,
+                )
+                # the resource usage of only this child, unlike getrusage
+                _, status, usage = wait4(process.pid, 0)
+                process.returncode = waitstatus_to_exitcode(status)
+            elapsed = perf_counter() - start
+
+            if process.returncode != 0 or not isfile(
+                join(temp_dir, "generated_images", "overview.svg")
+            ):
+                with open(log_path, "r") as log:
+                    raise RuntimeError(f"Run failed:\n{log.read()}")
+            with open(metrics_path, "r") as f:
+                metrics = load(f)
+
+        with urlopen(base_url + "__stats") as response:
+            api = loads(response.read())
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        "wall_time": round(elapsed, 3),
+        "requests": sum(
+            endpoint["requests"] for endpoint in metrics["endpoints"].values()
+        ),
+        # kilobytes on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        # requests counted against the rate limits
+        "api_cost": api["graphql"] + api["core"],
+    }
+
+
+def regressions(name: str, result: Dict[str, Any], baseline: Dict) -> list:
+    """
+    :return: descriptions of the metrics of the result worse than the baseline
+    """
+    found = []
+    for metric, tolerance in TOLERANCES.items():
+        if metric not in baseline.get(name, {}):
+            continue
+        limit = baseline[name][metric] * (1 + tolerance)
+        if metric == "wall_time":
+            limit += WALL_TIME_SLACK
+        if result[metric] > limit:
+            found.append(
+                f"{name}: {metric} {result[metric]:,} exceeds {limit:,.3f} "
+                f"(baseline {baseline[name][metric]:,})"
+            )
+    return found
+
+
+def main() -> None:
+    names = (argv[1] if len(argv) > 1 else DEFAULT_SCENARIOS).split(",")
+    update_baseline = "--update-baseline" in argv
+    baseline = dict()
+    if isfile(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            baseline = load(f)
+
+    results = dict()
+    for name in names:
+        result = results[name] = run_scenario(SCENARIOS[name])
+        print(
+            f"{name} ({SCENARIOS[name]:,} repos): {result['wall_time']:0.2f}s, "
+            f"{result['requests']:,} requests, {result['peak_rss_mb']:0.1f} MB "
+            f"peak RSS, API cost {result['api_cost']:,}"
+        )
+
+    if update_baseline:
+        makedirs(dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            f.write(dumps({**baseline, **results}, indent=2) + "\n")
+        print(f"Updated baseline {BASELINE_PATH}")
+        return
+
+    found = [
+        regression
+        for name, result in results.items()
+        for regression in regressions(name, result, baseline)
+    ]
+    for regression in found:
+        print(f"Regression: {regression}")
+    if found:
+        raise SystemExit(1)
+    print("No regressions from the baseline")
+
+
+if __name__ == "__main__":
+    main()
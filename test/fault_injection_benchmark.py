@@ -0,0 +1,236 @@
+#!/usr/bin/python3
+
+"""
+Fetches a synthetic user's stats from the mock GitHub API with faults injected
+at configurable rates, e.g. 202 storms, secondary rate limits with
+Retry-After, timeouts, truncated JSON and connection resets, and reports the
+throughput, completion rate and data completeness of each fault profile, so
+changes to the concurrency and backoff of GitHubApiQueries can be compared,
+e.g.
+python -m test.fault_injection_benchmark
+python -m test.fault_injection_benchmark mixed,reset --runs=5 --max-connections=20
+python -m test.fault_injection_benchmark timeout=0.05,reset=0.05 --retry-delay=0.5
+"""
+
+from aiohttp import ClientSession
+from asyncio import run, wait_for
+from contextlib import redirect_stdout
+from io import StringIO
+from multiprocessing import Process
+from os.path import join
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.request_metrics import RequestMetrics
+from src.stats_artifact import StatsArtifact
+from test.end_to_end_benchmark import free_port, wait_for_server
+from test.mock_github_server import HOST, USERNAME, parse_faults, serve
+
+NUM_REPOS = 200
+LATENCY = 0.01  # seconds per request of the mock API
+REQUEST_TIMEOUT = 2.0  # seconds, so injected timeouts are detected quickly
+RUN_TIMEOUT = 600.0  # seconds before a run is counted as not completed
+DEFAULT_RUNS = 3
+# rates of the faults injected by each profile; 202 Accepted is only
+# injected into contributor stats, the other faults into any request
+PROFILES = {
+    "none": "",
+    "accepted_storm": "accepted=0.5",
+    "secondary_limit": "secondary_limit=0.05",
+    "timeout": "timeout=0.02",
+    "truncated": "truncated=0.05",
+    "reset": "reset=0.05",
+    "mixed": "accepted=0.2,secondary_limit=0.01,timeout=0.01,"
+    "truncated=0.02,reset=0.02",
+}
+
+
+def leaves(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """
+    :return: the values of the stats by path, with each item of a list of
+    names, e.g. of repos, as a leaf of its own
+    """
+    if isinstance(value, dict):
+        result = dict()
+        for key, item in value.items():
+            result.update(leaves(item, f"{prefix}/{key}"))
+        return result
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return {f"{prefix}/{item}": True for item in value}
+    if isinstance(value, list):
+        result = dict()
+        for i, item in enumerate(value):
+            result.update(leaves(item, f"{prefix}/{i}"))
+        return result
+    return {prefix: value}
+
+
+def completeness(stats: Optional[Dict], reference: Dict[str, Any]) -> float:
+    """
+    :param stats: stats fetched with faults injected, None if not completed
+    :param reference: leaves of the stats fetched without faults
+    :return: share of the reference's values that the stats match
+    """
+    if stats is None:
+        return 0.0
+    found = leaves(stats)
+    matching = sum(found.get(path) == value for path, value in reference.items())
+    return matching / len(reference)
+
+
+async def fetch_stats(
+    api_url: str, db_path: str, max_connections: int, retry_delay: float
+) -> Dict[str, Any]:
+    """
+    :return: the stats, requests made and retries by reason of a full run
+    """
+    environment_vars = EnvironmentVariables(
+        username=USERNAME, access_token="mock-token", db_path=db_path
+    )
+    metrics = RequestMetrics()
+    async with ClientSession() as session:
+        queries = GitHubApiQueries(
+            username=USERNAME,
+            access_token="mock-token",
+            session=session,
+            max_connections=max_connections,
+            metrics=metrics,
+            api_url=api_url,
+            request_timeout=REQUEST_TIMEOUT,
+            retry_delay=retry_delay,
+        )
+        stats = GitHubRepoStats(
+            environment_vars=environment_vars, session=session, queries=queries
+        )
+        artifact = await StatsArtifact.from_stats(stats)
+    return {
+        "stats": artifact.data["stats"],
+        "requests": sum(
+            sum(endpoint.statuses.values()) for endpoint in metrics.endpoints.values()
+        ),
+        "retries": metrics.retries,
+    }
+
+
+def run_profile(
+    faults: Dict[str, float], seed: int, max_connections: int, retry_delay: float
+) -> Dict[str, Any]:
+    """
+    Fetches the stats from a mock API injecting the faults
+    :param seed: seed of the faults injected
+    :return: the wall time, stats (None if the run did not complete), requests
+    made and retries by reason of the run
+    """
+    port = free_port()
+    api_url = f"http://{HOST}:{port}/"
+    server = Process(
+        target=serve,
+        args=(NUM_REPOS, port, LATENCY, 0.0, 10**9, faults, seed),
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(api_url)
+        with TemporaryDirectory() as temp_dir:
+            start = perf_counter()
+            try:
+                # the retries of the queries are reported by the metrics
+                with redirect_stdout(StringIO()):
+                    result = run(
+                        wait_for(
+                            fetch_stats(
+                                api_url,
+                                join(temp_dir, "db.json"),
+                                max_connections,
+                                retry_delay,
+                            ),
+                            RUN_TIMEOUT,
+                        )
+                    )
+            except Exception as e:
+                print(f"  run failed: {e!r}")
+                result = {"stats": None, "requests": 0, "retries": dict()}
+            result["wall_time"] = perf_counter() - start
+    finally:
+        server.terminate()
+        server.join()
+    return result
+
+
+def summarize(results: List[Dict[str, Any]], reference: Dict) -> Dict[str, Any]:
+    """
+    :return: the mean wall time, throughput, completion rate, completeness
+    and total retries of the runs of a profile
+    """
+    wall_time = sum(result["wall_time"] for result in results)
+    retries = dict()
+    for result in results:
+        for reason, count in result["retries"].items():
+            retries[reason] = retries.get(reason, 0) + count
+    return {
+        "wall_time": wall_time / len(results),
+        # requests answered per second, including those retried
+        "throughput": sum(result["requests"] for result in results) / wall_time,
+        "completion_rate": sum(result["stats"] is not None for result in results)
+        / len(results),
+        "completeness": sum(
+            completeness(result["stats"], reference) for result in results
+        )
+        / len(results),
+        "retries": retries,
+    }
+
+
+def main() -> None:
+    options = dict(
+        arg[2:].partition("=")[::2] for arg in argv[1:] if arg.startswith("--")
+    )
+    names = [arg for arg in argv[1:] if not arg.startswith("--")]
+    profiles = dict()
+    for name in (names[0] if names else ",".join(PROFILES)).split(","):
+        if name in PROFILES:
+            profiles[name] = parse_faults(PROFILES[name])
+        else:
+            # rates of faults given directly, e.g. timeout=0.05
+            profiles = {names[0]: parse_faults(names[0])}
+            break
+    runs = int(options.get("runs", DEFAULT_RUNS))
+    max_connections = int(options.get("max-connections", 10))
+    retry_delay = float(options.get("retry-delay", 2))
+    print(
+        f"{NUM_REPOS} repos, {runs} runs per profile, {max_connections} "
+        f"connections, {retry_delay}s retry delay, {REQUEST_TIMEOUT}s timeout"
+    )
+
+    reference_run = run_profile(dict(), 0, max_connections, retry_delay)
+    if reference_run["stats"] is None:
+        raise RuntimeError("Run without faults failed")
+    reference = leaves(reference_run["stats"])
+
+    for name, faults in profiles.items():
+        summary = summarize(
+            [
+                run_profile(faults, seed, max_connections, retry_delay)
+                for seed in range(runs)
+            ],
+            reference,
+        )
+        retries = ", ".join(
+            f"{reason} {count}" for reason, count in sorted(summary["retries"].items())
+        )
+        print(
+            f"{name}: {summary['wall_time']:0.2f}s, "
+            f"{summary['throughput']:0.1f} requests/s, "
+            f"{summary['completion_rate']:0.0%} completed, "
+            f"{summary['completeness']:0.1%} complete data"
+            + (f", retries: {retries}" if retries else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks the CPU-bound hot paths of fetching stats and rendering images on
+synthetic inputs scaled to 100,000 repos, and fails if any regressed from the
+baseline, so optimizations of these paths can be measured, e.g.
+python -m test.hot_paths_benchmark
+python -m test.hot_paths_benchmark repo_stats,lines_changed
+python -m test.hot_paths_benchmark --update-baseline
+"""
+
+from asyncio import run
+from json import dump, load
+from os import makedirs
+from os.path import dirname, isfile, join
+from random import Random
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.env_vars import EnvironmentVariables
+from src.generate_images import add_unit, fit_name, languages_markup
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from test.mock_github_server import PAGE_SIZE, USERNAME, SyntheticData
+
+BASELINE_PATH = join(dirname(__file__), "fixtures", "benchmarks", "hot_paths.json")
+NUM_REPOS = 100000
+NUM_LANGUAGES = 500  # distinct languages of the languages image
+NUM_RESPONSES = 1000  # distinct contributor stats, shared by repos in turn
+REPEATS = 5  # runs of each benchmark, the fastest of which is reported
+# relative increase over the baseline reported as a regression, and seconds
+# of slack so the timing of the fastest benchmarks is not flaky
+THRESHOLD = 0.3
+SLACK = 0.002
+SEED = 42
+
+# a benchmark prepares its inputs, then runs the hot path on them
+Benchmark = Tuple[Callable[[], Any], Callable[[Any], Any]]
+
+
+def new_stats(db_path: str) -> GitHubRepoStats:
+    """
+    :return: stats of the synthetic user with an empty repo listing, which
+    make no requests for the per-repo results held
+    """
+    stats = GitHubRepoStats(
+        environment_vars=EnvironmentVariables(
+            username=USERNAME, access_token="token", db_path=db_path
+        ),
+        session=None,
+    )
+    stats.import_state(
+        {
+            "listing": {
+                "name": "The Octocat",
+                "stargazers": 0,
+                "forks": 0,
+                "languages": dict(),
+                "excluded_languages": [],
+                "repos": [],
+                "empty_repos": [],
+            }
+        }
+    )
+    return stats
+
+
+def benchmarks(data: SyntheticData, db_path: str) -> Dict[str, Benchmark]:
+    """
+    :return: the benchmarks of each hot path, on inputs of the synthetic user
+    """
+    rand = Random(SEED)
+    responses = [data.contributors(i) for i in range(NUM_RESPONSES)]
+    names = list(data.repos)
+
+    def lines_changed_state() -> GitHubRepoStats:
+        stats = new_stats(db_path)
+        stats.import_state(
+            {
+                "listing": {
+                    **stats.export_state()["listing"],
+                    "repos": names,
+                },
+                "repo_lines_changed": {
+                    name: stats.repo_lines_changed(responses[i % NUM_RESPONSES])
+                    for i, name in enumerate(names)
+                },
+                "repo_collaborators": {name: [USERNAME] for name in names},
+            }
+        )
+        return stats
+
+    languages = [
+        (
+            f"Language {i}",
+            {
+                "size": rand.randrange(1000, 10**9),
+                "color": f"#{rand.randrange(2**24):06x}",
+                "prop": rand.random() * 100 / NUM_LANGUAGES,
+            },
+        )
+        for i in range(NUM_LANGUAGES)
+    ]
+    numbers = [f"{int(rand.paretovariate(0.5)):,}" for _ in range(NUM_REPOS)]
+    people = [
+        (
+            " ".join(
+                rand.choice(["Mona", "Octavia", "Alexander", "Li", "Bartholomew"])
+                for _ in range(rand.randrange(1, 5))
+            ),
+            f"user{'s' * rand.randrange(1, 20)}",
+        )
+        for _ in range(NUM_REPOS)
+    ]
+    cursors = [str(page * PAGE_SIZE) for page in range(NUM_REPOS // PAGE_SIZE)]
+
+    return {
+        # weekly additions and deletions summed in each repo's contributor stats
+        "repo_lines_changed": (
+            lambda: new_stats(db_path),
+            lambda stats: [
+                stats.repo_lines_changed(responses[i % NUM_RESPONSES])
+                for i in range(NUM_REPOS)
+            ],
+        ),
+        # the lines changed and contribution percentages summed over all repos
+        "lines_changed": (
+            lines_changed_state,
+            lambda stats: run(stats.lines_changed),
+        ),
+        # the stars, forks and languages of each repo of the listing aggregated
+        "repo_stats": (
+            lambda: new_stats(db_path),
+            lambda stats: run(stats.repo_stats(data.nodes)),
+        ),
+        "add_unit": (lambda: numbers, lambda args: [add_unit(n) for n in args]),
+        "fit_name": (
+            lambda: people,
+            lambda args: [fit_name(name, username) for name, username in args],
+        ),
+        # as many languages rendered in total as there are repos
+        "languages_markup": (
+            lambda: languages,
+            lambda args: [
+                languages_markup(args) for _ in range(NUM_REPOS // NUM_LANGUAGES)
+            ],
+        ),
+        # the query of each page of the repo listing
+        "repos_overview": (
+            lambda: cursors,
+            lambda args: [
+                GitHubApiQueries.repos_overview(cursor, cursor) for cursor in args
+            ],
+        ),
+    }
+
+
+def measure(benchmark: Benchmark) -> float:
+    """
+    :return: seconds taken by the fastest of the runs of the benchmark
+    """
+    setup, hot_path = benchmark
+    times = []
+    for _ in range(REPEATS):
+        args = setup()
+        start = perf_counter()
+        hot_path(args)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    names = [arg for arg in argv[1:] if not arg.startswith("--")]
+    update_baseline = "--update-baseline" in argv
+    baseline = dict()
+    if isfile(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            baseline = load(f)
+
+    data = SyntheticData(NUM_REPOS)
+    results: Dict[str, float] = dict()
+    with TemporaryDirectory() as temp_dir:
+        all_benchmarks = benchmarks(data, join(temp_dir, "db.json"))
+        for name in names[0].split(",") if names else all_benchmarks:
+            results[name] = measure(all_benchmarks[name])
+            print(
+                f"{name}: {results[name] * 1000:0.2f}ms, "
+                f"{results[name] / NUM_REPOS * 1e6:0.3f}µs per repo"
+            )
+
+    if update_baseline:
+        makedirs(dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            dump(
+                {
+                    name: round(seconds, 6)
+                    for name, seconds in {**baseline, **results}.items()
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"Updated baseline {BASELINE_PATH}")
+        return
+
+    regressions: List[str] = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        limit = baseline[name] * (1 + THRESHOLD) + SLACK
+        if seconds > limit:
+            regressions.append(
+                f"{name}: {seconds * 1000:0.2f}ms exceeds {limit * 1000:0.2f}ms "
+                f"(baseline {baseline[name] * 1000:0.2f}ms)"
+            )
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        raise SystemExit(1)
+    print("No regressions from the baseline")
+
+
+if __name__ == "__main__":
+    main()
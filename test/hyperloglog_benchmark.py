@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks summarizing the contributors and collaborators of a synthetic
+organization-scale user in the exact and approx count modes, comparing their
+counts, peak memory and time, and checks the sketches of approx stats are
+saved in stats artifacts, e.g.
+python -m test.hyperloglog_benchmark
+python -m test.hyperloglog_benchmark 50000
+"""
+
+from asyncio import run
+from json import loads
+from random import Random
+from sys import argv
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+from typing import Any, Dict, List, Tuple
+
+from src.db.db import GitRepoStatsDB
+from src.env_vars import EnvironmentVariables
+from src.github_repo_stats import GitHubRepoStats
+from src.hyperloglog import APPROX, EXACT, HyperLogLog
+from src.stats_artifact import StatsArtifact
+from test.mock_github_server import USERNAME
+
+NUM_REPOS = 5000
+NUM_LOGINS = 500000  # logins the contributors and collaborators are drawn from
+SEED = 42
+
+
+def new_stats(count_mode: str) -> GitHubRepoStats:
+    """
+    :return: stats of the synthetic user counted in the count mode, with a db
+    held in memory
+    """
+    return GitHubRepoStats(
+        environment_vars=EnvironmentVariables(
+            username=USERNAME,
+            access_token="token",
+            count_mode=count_mode,
+            db=GitRepoStatsDB(in_memory=True),
+        ),
+        session=None,
+    )
+
+
+def synthetic_state(num_repos: int) -> Dict[str, Any]:
+    """
+    :return: per-repo results of a user with many distinct contributors and
+    collaborators over all repos, and few in each
+    """
+    rand = Random(SEED)
+    names = [f"org/repo-{i}" for i in range(num_repos)]
+    stats = new_stats(EXACT)
+
+    def logins(count: int) -> List[str]:
+        return [f"user{rand.randrange(NUM_LOGINS)}" for _ in range(count)]
+
+    return {
+        "listing": {
+            "name": "The Octocat",
+            "stargazers": 0,
+            "forks": 0,
+            "languages": dict(),
+            "excluded_languages": [],
+            "repos": names,
+            "empty_repos": [],
+        },
+        "repo_lines_changed": {
+            name: stats.repo_lines_changed(
+                [
+                    {"author": {"login": login}, "total": 1, "weeks": []}
+                    for login in [USERNAME] + logins(rand.randrange(1, 20))
+                ]
+            )
+            for name in names
+        },
+        "repo_collaborators": {
+            name: [USERNAME] + logins(rand.randrange(5)) for name in names
+        },
+    }
+
+
+def summarize(state: Dict[str, Any], count_mode: str) -> Tuple[int, int, int, float]:
+    """
+    :return: the collaborators and contributors counted in the count mode, and
+    the peak bytes allocated and seconds taken counting them
+    """
+    stats = new_stats(count_mode)
+    stats.import_state(state)
+    begin = perf_counter()
+    collaborators = run(stats.collaborators)
+    contributors = len(run(stats.contributors))
+    elapsed = perf_counter() - begin
+
+    # counted again while tracing allocations, which slows counting down
+    stats = new_stats(count_mode)
+    stats.import_state(state)
+    start()
+    run(stats.collaborators)
+    _, peak = get_traced_memory()
+    stop()
+    return collaborators, contributors, peak, elapsed
+
+
+def check_artifact(state: Dict[str, Any]) -> None:
+    """
+    Checks the sketches of approx stats are saved in and loaded from artifacts
+    """
+    stats = new_stats(APPROX)
+    stats.import_state(state)
+    artifact = run(
+        StatsArtifact.from_stats(
+            stats, fields=["collaborators", "raw_collaborators", "contributors"]
+        )
+    )
+    loaded = StatsArtifact(loads(artifact.to_json()))
+    collaborator_set, _ = run(loaded.raw_collaborators())
+    assert len(run(loaded.contributors)) == len(run(stats.contributors))
+    assert len(collaborator_set) == len(run(stats.raw_collaborators())[0])
+    print(f"Artifact of approx stats: {len(artifact.to_json()):,} bytes")
+
+
+def main() -> None:
+    num_repos = int(argv[1]) if len(argv) > 1 else NUM_REPOS
+    state = synthetic_state(num_repos)
+    exact = summarize(state, EXACT)
+    approx = summarize(state, APPROX)
+    check_artifact(state)
+    error = HyperLogLog().error
+    for name, exact_count, approx_count in zip(
+        ("collaborators", "contributors"), exact, approx
+    ):
+        relative = (approx_count - exact_count) / exact_count
+        assert abs(relative) <= 3 * error, f"{name}: {relative:0.2%} error"
+        print(
+            f"{name}: {exact_count:,} exact, {approx_count:,} approx "
+            f"({relative:+0.2%})"
+        )
+    print(
+        f"{num_repos:,} repos summarized with {exact[2] / 2**20:0.1f} MB peak "
+        f"in {exact[3]:0.2f}s exact, {approx[2] / 2**20:0.1f} MB peak "
+        f"in {approx[3]:0.2f}s approx"
+    )
+
+
+if __name__ == "__main__":
+    main()
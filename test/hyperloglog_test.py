@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+"""
+Checks the estimates of HyperLogLog sketches are within their error bound,
+and that merged sketches of shards of items equal the sketch of all items,
+printing the results for testing. The memory and time of counting in the
+exact and approx count modes are compared by test.hyperloglog_benchmark
+"""
+
+from src.hyperloglog import HyperLogLog
+
+COUNTS = (100, 10000, 1000000)
+NUM_SHARDS = 8
+
+
+def check_sketches() -> None:
+    """
+    Checks the estimates, merging and serialization of sketches
+    """
+    for count in COUNTS:
+        sketch = HyperLogLog()
+        sketch.update(f"user{i}" for i in range(count))
+        error = (len(sketch) - count) / count
+        # within 3 standard errors, and the hashes of the items are fixed
+        assert abs(error) <= 3 * sketch.error, f"{count} items: {error:0.2%} error"
+        print(f"{count:,} items: estimated {len(sketch):,} ({error:+0.2%})")
+
+    items = [f"user{i}" for i in range(100000)]
+    sketch = HyperLogLog()
+    sketch.update(items)
+    shards = [HyperLogLog() for _ in range(NUM_SHARDS)]
+    for i, item in enumerate(items):
+        shards[i % NUM_SHARDS].add(item)
+    merged = shards[0].union(*shards[1:])
+    assert merged.to_json() == sketch.to_json(), "merged shards differ"
+    restored = HyperLogLog.from_json(sketch.to_json())
+    assert len(restored) == len(sketch), "restored sketch differs"
+    assert len(sketch.union(items[:10])) == len(sketch), "items counted twice"
+    try:
+        sketch.merge(HyperLogLog(10))
+        raise AssertionError("sketches of different precisions merged")
+    except ValueError:
+        pass
+    print(f"Merged {NUM_SHARDS} shards: estimated {len(merged):,}; sketches match")
+
+
+def main() -> None:
+    """
+    Used for testing
+    """
+    check_sketches()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+#!/usr/bin/python3
+
+"""
+Serves a synthetic user's repos from a local stand-in for the GitHub GraphQL
+and REST endpoints queried by GitHubApiQueries, for reproducible end-to-end
+runs and benchmarks without a token, e.g.
+python -m test.mock_github_server 1000 8765
+then GITHUB_STATS_API_URL=http://127.0.0.1:8765/ python git_stats_imgs.py
+or with faults injected at the given rates, e.g.
+python -m test.mock_github_server 1000 8765 0.02 0 timeout=0.01,reset=0.01
+"""
+
+from aiohttp import web
+from asyncio import sleep
+from hashlib import sha1
+from json import dumps, loads
+from random import Random
+from re import findall, search
+from socket import SOL_SOCKET, SO_LINGER
+from struct import pack
+from sys import argv
+from time import time
+from typing import Any, Dict, List, Optional, Set
+
+HOST = "127.0.0.1"
+PORT = 8765
+USERNAME = "octocat"
+PAGE_SIZE = 100  # repos per page of GraphQL connections, as on GitHub
+CONTRIBUTED_SHARE = 0.2  # share of repos the user contributed to but not owns
+NUM_WEEKS = 12  # weeks of contributor stats per author
+CONTRIBUTION_YEARS = [2021, 2022, 2023, 2024]
+LANGUAGES = {
+    "Python": "#3572A5",
+    "JavaScript": "#f1e05a",
+    "TypeScript": "#3178c6",
+    "Go": "#00ADD8",
+    "Rust": "#dea584",
+    "C": "#555555",
+    "Shell": "#89e051",
+    "HTML": "#e34c26",
+}
+SCENARIOS = {"small": 10, "medium": 1000, "large": 50000}  # repos of each
+SEED = 42
+# faults injected into responses at configurable rates: 202 Accepted of
+# contributor stats, 403 secondary rate limits with Retry-After, responses
+# delayed past client timeouts, truncated JSON bodies and connection resets
+FAULTS = ("accepted", "secondary_limit", "timeout", "truncated", "reset")
+RETRY_AFTER = 1  # seconds asked to wait by injected secondary rate limits
+# seconds injected timeouts delay responses by, past the default request
+# timeout of GitHubApiQueries
+HANG = 90.0
+
+
+def parse_faults(spec: str) -> Dict[str, float]:
+    """
+    :param spec: rates of faults, e.g. timeout=0.01,reset=0.02
+    :return: rate of each fault by name
+    """
+    faults = dict()
+    for item in filter(None, spec.split(",")):
+        name, _, rate = item.partition("=")
+        if name not in FAULTS:
+            raise ValueError(f"Unknown fault {name}, expected one of {FAULTS}")
+        faults[name] = float(rate)
+    if sum(faults.values()) > 1:
+        raise ValueError(f"Rates of faults {spec} add up to more than 1")
+    return faults
+
+
+###############################################################################
+# SyntheticData class
+###############################################################################
+
+
+class SyntheticData(object):
+    """
+    Deterministic repos of a user, with their languages, contributor stats,
+    collaborators and views, generated from a seed
+    """
+
+    def __init__(self, num_repos: int, username: str = USERNAME, seed: int = SEED):
+        """
+        :param num_repos: number of repos, e.g. 10, 1,000 or 50,000
+        :param username: login of the user
+        :param seed: seed of the generated data
+        """
+        self.username = username
+        self.seed = seed
+        rand = Random(seed)
+        languages = list(LANGUAGES)
+
+        self.owned: List[Dict[str, Any]] = []
+        self.contributed: List[Dict[str, Any]] = []
+        for i in range(num_repos):
+            is_owned = rand.random() >= CONTRIBUTED_SHARE
+            owner = username if is_owned else f"org{rand.randrange(20)}"
+            node = {
+                "nameWithOwner": f"{owner}/repo-{i}",
+                "stargazers": {"totalCount": int(rand.paretovariate(1.5)) - 1},
+                "forkCount": rand.randrange(5),
+                "isFork": rand.random() < 0.1,
+                "isEmpty": rand.random() < 0.02,
+                "isArchived": rand.random() < 0.05,
+                "isPrivate": rand.random() < 0.3,
+                "languages": {
+                    "edges": [
+                        {
+                            "size": rand.randrange(1000, 500000),
+                            "node": {"name": name, "color": LANGUAGES[name]},
+                        }
+                        for name in rand.sample(languages, rand.randrange(1, 4))
+                    ]
+                },
+            }
+            (self.owned if is_owned else self.contributed).append(node)
+        self.nodes = self.owned + self.contributed
+        self.repos: Dict[str, int] = {
+            node["nameWithOwner"]: i for i, node in enumerate(self.nodes)
+        }
+
+    def contributors(self, index: int) -> List[Dict[str, Any]]:
+        """
+        :param index: index of the repo
+        :return: response of /stats/contributors, the user and other authors
+        """
+        rand = Random(self.seed * 1000003 + index)
+        authors = [self.username] + [
+            f"user{rand.randrange(1000)}" for _ in range(rand.randrange(4))
+        ]
+        result = []
+        for author in authors:
+            weeks = [
+                {
+                    "w": 1700000000 + 604800 * week,
+                    "a": rand.randrange(200),
+                    "d": rand.randrange(100),
+                    "c": rand.randrange(5),
+                }
+                for week in range(NUM_WEEKS)
+            ]
+            result.append(
+                {
+                    "author": {"login": author},
+                    "total": sum(week["c"] for week in weeks),
+                    "weeks": weeks,
+                }
+            )
+        return result
+
+    def collaborators(self, index: int) -> List[Dict[str, str]]:
+        """
+        :param index: index of the repo
+        :return: response of /collaborators
+        """
+        rand = Random(self.seed * 1000033 + index)
+        return [{"login": self.username}] + [
+            {"login": f"user{rand.randrange(1000)}"} for _ in range(rand.randrange(3))
+        ]
+
+    def views(self, index: int) -> Dict[str, Any]:
+        """
+        :param index: index of the repo
+        :return: response of /traffic/views of the last 14 days
+        """
+        rand = Random(self.seed * 1000037 + index)
+        views = [
+            {"timestamp": f"2024-01-{day:02d}T00:00:00Z", "count": rand.randrange(20)}
+            for day in range(1, 15)
+        ]
+        return {"count": sum(view["count"] for view in views), "views": views}
+
+
+###############################################################################
+# MockGitHub class
+###############################################################################
+
+
+class MockGitHub(object):
+    """
+    aiohttp stand-in for the GitHub API endpoints queried by GitHubApiQueries,
+    with a fixed latency, a probability of 202 Accepted responses while
+    contributor stats are computed, ETags answered with 304 Not Modified,
+    per-token rate limits, counting the requests made against them, and
+    faults injected at random into responses at configurable rates
+    """
+
+    def __init__(
+        self,
+        data: SyntheticData,
+        latency: float = 0.0,
+        accepted_probability: float = 0.0,
+        rate_limit: int = 5000,
+        faults: Optional[Dict[str, float]] = None,
+        fault_seed: int = SEED,
+    ):
+        """
+        :param data: synthetic repos to serve
+        :param latency: seconds to wait before answering each request
+        :param accepted_probability: probability of answering the first
+        request of a repo's contributor stats with 202 Accepted
+        :param rate_limit: requests per token of each of the REST and GraphQL
+        APIs, after which requests are answered with 403
+        :param faults: probability of injecting each fault of FAULTS into a
+        response, e.g. {"timeout": 0.01}, from parse_faults
+        :param fault_seed: seed of the faults injected
+        """
+        self.data = data
+        self.latency = latency
+        self.accepted_probability = accepted_probability
+        self.rate_limit = rate_limit
+        self.reset = int(time()) + 3600
+        self.__computed: Set[str] = set()
+        # requests counted against the rate limit of each token by API
+        self.used: Dict[str, Dict[str, int]] = dict()
+        self.faults = faults or dict()
+        self.__fault_rand = Random(fault_seed)
+        self.stats = {"graphql": 0, "core": 0, "not_modified": 0}
+        # faults injected by name, accepted counting all 202 responses
+        self.stats.update({name: 0 for name in FAULTS})
+
+    def app(self) -> web.Application:
+        """
+        :return: the application serving the mock API
+        """
+        app = web.Application()
+        app.router.add_post("/graphql", self.graphql)
+        app.router.add_get("/rate_limit", self.rate_limits)
+        app.router.add_get("/repos/{owner}/{name}", self.repo)
+        app.router.add_get("/repos/{owner}/{name}/{path:.+}", self.repo)
+        app.router.add_get("/__stats", self.mock_stats)
+        return app
+
+    def __limit(self, api: str, token: str) -> Dict[str, str]:
+        """
+        :return: rate limit headers of a request of the token to the API
+        """
+        used = self.used.setdefault(token, {"graphql": 0, "core": 0})[api]
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(max(0, self.rate_limit - used)),
+            "X-RateLimit-Reset": str(self.reset),
+            "X-RateLimit-Resource": api,
+        }
+
+    def __fault(self, request: web.Request) -> Optional[str]:
+        """
+        :return: the fault to inject into the response to the request, if any
+        """
+        if not self.faults:
+            return None
+        draw = self.__fault_rand.random()
+        for name in FAULTS:
+            if name == "accepted" and "/stats/" not in request.path:
+                # only statistics are computed in the background on GitHub
+                continue
+            rate = self.faults.get(name, 0.0)
+            if draw < rate:
+                return name
+            draw -= rate
+        return None
+
+    async def __respond(
+        self, request: web.Request, api: str, body: Any, status: int = 200
+    ) -> web.Response:
+        """
+        :return: the JSON response, or 304 if the ETag matches, or 403 if the
+        token exceeded its rate limit, or with a fault injected
+        """
+        token = request.headers.get("Authorization", "")
+        if not token.startswith("Bearer ") or len(token) <= len("Bearer "):
+            return web.json_response({"message": "Bad credentials"}, status=401)
+        await sleep(self.latency)
+
+        fault = self.__fault(request)
+        if fault is not None:
+            self.stats[fault] += 1
+        if fault == "reset":
+            # close the connection with a TCP reset rather than a clean close
+            sock = request.transport.get_extra_info("socket")
+            sock.setsockopt(SOL_SOCKET, SO_LINGER, pack("ii", 1, 0))
+            request.transport.abort()
+            return web.Response()
+        if fault == "timeout":
+            await sleep(HANG)
+        if fault == "secondary_limit":
+            return web.json_response(
+                {"message": "You have exceeded a secondary rate limit."},
+                status=403,
+                headers={**self.__limit(api, token), "Retry-After": str(RETRY_AFTER)},
+            )
+        if fault == "accepted":
+            body, status = {}, 202
+
+        headers = self.__limit(api, token)
+        if headers["X-RateLimit-Remaining"] == "0":
+            return web.json_response(
+                {"message": "API rate limit exceeded"}, status=403, headers=headers
+            )
+
+        text = dumps(body)
+        etag = '"' + sha1(text.encode()).hexdigest() + '"'
+        if status == 200 and request.headers.get("If-None-Match") == etag:
+            # conditional requests answered with 304 are not counted
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers={**headers, "ETag": etag})
+
+        self.used[token][api] += 1
+        self.stats[api] += 1
+        headers = self.__limit(api, token)
+        if status == 200:
+            headers["ETag"] = etag
+        if fault == "truncated":
+            text = text[: len(text) // 2]
+        return web.Response(
+            text=text, status=status, content_type="application/json", headers=headers
+        )
+
+    @staticmethod
+    def __page(nodes: List[Dict], cursor: Optional[str]) -> Dict[str, Any]:
+        """
+        :return: the page of a GraphQL connection after the cursor
+        """
+        start = int(cursor) if cursor else 0
+        end = min(start + PAGE_SIZE, len(nodes))
+        return {
+            "pageInfo": {"hasNextPage": end < len(nodes), "endCursor": str(end)},
+            "nodes": nodes[start:end],
+        }
+
+    async def graphql(self, request: web.Request) -> web.Response:
+        """
+        :return: the viewer's repos or contributions, or an organization's
+        repos or members, by the fields queried, paged by their cursors
+        """
+        query = (await request.json()).get("query", "")
+        cursors = [
+            None if cursor == "null" else loads(cursor)
+            for cursor in findall(r"after:\s*(null|\"[^\"]*\")", query)
+        ]
+        data = self.data
+
+        if "contributionYears" in query:
+            viewer = {
+                "contributionsCollection": {"contributionYears": CONTRIBUTION_YEARS}
+            }
+            result = {"viewer": viewer}
+        elif search(r"year\d{4}:", query):
+            result = {
+                "viewer": {
+                    f"year{year}": {
+                        "contributionCalendar": {
+                            "totalContributions": 100 + int(year) % 7
+                        }
+                    }
+                    for year in findall(r"year(\d{4}):", query)
+                }
+            }
+        elif "membersWithRole" in query:
+            members = [{"login": data.username}] + [
+                {"login": f"user{i}"} for i in range(3)
+            ]
+            result = {
+                "organization": {"membersWithRole": self.__page(members, cursors[0])}
+            }
+        elif "organization(" in query:
+            result = {
+                "organization": {
+                    "login": "mock-org",
+                    "name": "Mock Organization",
+                    "repositories": self.__page(data.nodes, cursors[0]),
+                }
+            }
+        else:
+            result = {
+                "viewer": {
+                    "login": data.username,
+                    "name": "The Octocat",
+                    "repositories": self.__page(data.owned, cursors[0]),
+                    "repositoriesContributedTo": self.__page(
+                        data.contributed, cursors[1]
+                    ),
+                }
+            }
+        return await self.__respond(request, "graphql", {"data": result})
+
+    async def repo(self, request: web.Request) -> web.Response:
+        """
+        :return: the repo, or its contributor stats, collaborators, views or
+        languages by the path requested
+        """
+        name = f"{request.match_info['owner']}/{request.match_info['name']}"
+        path = request.match_info.get("path", "")
+        index = self.data.repos.get(name)
+        if index is None:
+            return await self.__respond(
+                request, "core", {"message": "Not Found"}, status=404
+            )
+
+        if path == "stats/contributors":
+            if name not in self.__computed:
+                self.__computed.add(name)
+                # the same repos are accepted in every run with the same seed
+                rand = Random(self.data.seed * 1000039 + index)
+                if rand.random() < self.accepted_probability:
+                    self.stats["accepted"] += 1
+                    return await self.__respond(request, "core", {}, status=202)
+            body = self.data.contributors(index)
+        elif path == "collaborators":
+            body = self.data.collaborators(index)
+        elif path == "traffic/views":
+            body = self.data.views(index)
+        elif path == "languages":
+            node = self.data.nodes[index]
+            body = {
+                edge["node"]["name"]: edge["size"]
+                for edge in node["languages"]["edges"]
+            }
+        elif path == "":
+            node = self.data.nodes[index]
+            body = {
+                "full_name": name,
+                "stargazers_count": node["stargazers"]["totalCount"],
+                "forks": node["forkCount"],
+            }
+        else:
+            body = []
+        return await self.__respond(request, "core", body)
+
+    async def rate_limits(self, request: web.Request) -> web.Response:
+        """
+        :return: the remaining rate limits of the token
+        """
+        token = request.headers.get("Authorization", "")
+        resources = dict()
+        for api in ("core", "graphql"):
+            headers = self.__limit(api, token)
+            resources[api] = {
+                "limit": self.rate_limit,
+                "remaining": int(headers["X-RateLimit-Remaining"]),
+                "reset": self.reset,
+            }
+        # requests of the rate limits do not count against them
+        return web.json_response({"resources": resources, "rate": resources["core"]})
+
+    async def mock_stats(self, _: web.Request) -> web.Response:
+        """
+        :return: the requests counted by API, 304 and 202 responses and the
+        faults injected, for tests
+        """
+        return web.json_response(self.stats)
+
+
+def serve(
+    num_repos: int,
+    port: int = PORT,
+    latency: float = 0.0,
+    accepted_probability: float = 0.0,
+    rate_limit: int = 5000,
+    faults: Optional[Dict[str, float]] = None,
+    fault_seed: int = SEED,
+) -> None:
+    """
+    Serves the mock API until stopped, e.g. in a process of a benchmark
+    """
+    mock = MockGitHub(
+        SyntheticData(num_repos),
+        latency,
+        accepted_probability,
+        rate_limit,
+        faults,
+        fault_seed,
+    )
+    web.run_app(mock.app(), host=HOST, port=port, print=None)
+
+
+def main() -> None:
+    num_repos = int(argv[1]) if len(argv) > 1 else SCENARIOS["small"]
+    port = int(argv[2]) if len(argv) > 2 else PORT
+    latency = float(argv[3]) if len(argv) > 3 else 0.0
+    accepted_probability = float(argv[4]) if len(argv) > 4 else 0.0
+    faults = parse_faults(argv[5]) if len(argv) > 5 else None
+    print(f"Serving {num_repos:,} repos of {USERNAME} on http://{HOST}:{port}/")
+    serve(num_repos, port, latency, accepted_probability, faults=faults)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks compiling and applying repository filter patterns at org scale
+"""
+
+from fnmatch import fnmatchcase
+from random import Random
+from sys import argv
+from time import perf_counter
+
+from src.repo_filter import RepoFilter
+
+NUM_PATTERNS = 10000
+NUM_REPOS = 50000
+NUM_OWNERS = 50
+NUM_VERIFIED = 500  # repo names cross-checked against a naive fnmatch loop
+SEED = 42
+
+
+def generate_patterns(rand: Random, count: int) -> list:
+    """
+    :return: a mix of exact names, owner globs, wildcard globs and negations
+    """
+    patterns = []
+    for i in range(count):
+        owner = f"owner{rand.randrange(NUM_OWNERS)}"
+        kind = rand.random()
+        if kind < 0.5:
+            patterns.append(f"{owner}/repo-{rand.randrange(NUM_REPOS)}")
+        elif kind < 0.9:
+            patterns.append(f"{owner}/legacy-{i}-*")
+        elif kind < 0.98:
+            patterns.append(f"*/archive-{i}-?")
+        else:
+            patterns.append(f"!{owner}/legacy-{i}-keep*")
+    return patterns
+
+
+def generate_repos(rand: Random, count: int) -> list:
+    """
+    :return: repo names in owner/name format, some of which match patterns
+    """
+    repos = []
+    for i in range(count):
+        owner = f"owner{rand.randrange(NUM_OWNERS)}"
+        kind = rand.random()
+        if kind < 0.6:
+            repos.append(f"{owner}/repo-{i}")
+        elif kind < 0.9:
+            repos.append(f"{owner}/legacy-{rand.randrange(NUM_PATTERNS)}-x")
+        else:
+            repos.append(f"{owner}/archive-{rand.randrange(NUM_PATTERNS)}-a")
+    return repos
+
+
+def naive_is_excluded(patterns: list, name: str) -> bool:
+    positive = [p for p in patterns if not p.startswith("!")]
+    negated = [p[1:] for p in patterns if p.startswith("!")]
+    return any(fnmatchcase(name, p) for p in positive) and not any(
+        fnmatchcase(name, p) for p in negated
+    )
+
+
+def main() -> None:
+    num_patterns = int(argv[1]) if len(argv) > 1 else NUM_PATTERNS
+    num_repos = int(argv[2]) if len(argv) > 2 else NUM_REPOS
+
+    rand = Random(SEED)
+    patterns = generate_patterns(rand, num_patterns)
+    repos = generate_repos(rand, num_repos)
+
+    start = perf_counter()
+    repo_filter = RepoFilter(exclude_patterns=patterns)
+    compile_time = perf_counter() - start
+
+    start = perf_counter()
+    included = repo_filter.filter_names(repos)
+    filter_time = perf_counter() - start
+
+    included_set = set(included)
+    for name in repos[:NUM_VERIFIED]:
+        assert (name not in included_set) == naive_is_excluded(patterns, name), name
+
+    print(f"Patterns: {num_patterns:,} | Repos: {num_repos:,}")
+    print(f"Compile time: {compile_time * 1000:0.1f} ms")
+    print(
+        f"Filter time: {filter_time * 1000:0.1f} ms "
+        f"({num_repos / filter_time:,.0f} repos/s)"
+    )
+    print(f"Excluded: {num_repos - len(included):,}")
+
+
+if __name__ == "__main__":
+    main()
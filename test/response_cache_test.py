@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""
+Checks the response cache shared by the users of a batch shares the data of
+shareable repo paths, but not failures: a path answered with an error or with
+too many 202 responses for the first user is requested again for the next,
+and prints the results for testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import run
+from typing import Dict, Tuple
+
+from src.github_api_queries import GitHubApiQueries
+
+HOST = "127.0.0.1"
+CONTRIBUTORS = [{"author": {"login": "octocat"}, "total": 1, "weeks": []}]
+LANGUAGES = {"Python": 1000}
+MAX_ATTEMPTS = 60  # attempts of a request, each answered with 202
+
+
+def mock_app(requests: Dict[str, int]) -> web.Application:
+    """
+    :param requests: number of requests of each path, counted by the app
+    :return: app answering the first request of the contributors of a repo
+    with a rate limit error, and the languages of a repo with 202 responses
+    until its first request has run out of attempts
+    """
+
+    async def contributors(request: web.Request) -> web.Response:
+        count = requests[request.path] = requests.get(request.path, 0) + 1
+        if count == 1:
+            return web.json_response({"message": "API rate limit exceeded"}, status=403)
+        return web.json_response(CONTRIBUTORS)
+
+    async def languages(request: web.Request) -> web.Response:
+        count = requests[request.path] = requests.get(request.path, 0) + 1
+        if count <= MAX_ATTEMPTS:
+            return web.json_response({}, status=202)
+        return web.json_response(LANGUAGES)
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{repo}/stats/contributors", contributors)
+    app.router.add_get("/repos/{owner}/{repo}/languages", languages)
+    return app
+
+
+async def main() -> None:
+    """
+    Used for testing
+    """
+    requests: Dict[str, int] = dict()
+    runner = web.AppRunner(mock_app(requests))
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    api_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+    cache: Dict[Tuple, object] = dict()
+
+    try:
+        async with ClientSession() as session:
+
+            def user(username: str) -> GitHubApiQueries:
+                return GitHubApiQueries(
+                    username=username,
+                    access_token="mock-token",
+                    session=session,
+                    cache=cache,
+                    api_url=api_url,
+                    retry_delay=0,
+                )
+
+            first, second, third = user("first"), user("second"), user("third")
+            path = "/repos/octo/a/stats/contributors"
+            assert "message" in await first.query_rest(path), "error not returned"
+            assert await second.query_rest(path) == CONTRIBUTORS, "error shared"
+            assert await third.query_rest(path) == CONTRIBUTORS
+            assert requests[path] == 2, f"{requests[path]} requests"
+
+            path = "/repos/octo/a/languages"
+            assert await first.query_rest(path) == dict(), "202 not exhausted"
+            assert await second.query_rest(path) == LANGUAGES, "failure shared"
+            assert await third.query_rest(path) == LANGUAGES
+            assert requests[path] == MAX_ATTEMPTS + 1, f"{requests[path]} requests"
+    finally:
+        await runner.cleanup()
+
+    print(
+        f"Failures requested again, data shared: {len(cache)} responses cached, "
+        f"requests by path {requests}"
+    )
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks the startup of each run mode by importing its modules in fresh
+interpreters with -X importtime, reporting the median import time and the
+slowest modules imported, and fails if any exceeds its budget or imports a
+module that should be deferred to first use, e.g.
+python -m test.startup_benchmark
+python -m test.startup_benchmark src.generate_images --runs=20
+"""
+
+from os.path import abspath, dirname
+from statistics import median
+from subprocess import run
+from sys import argv, executable
+from typing import Dict, List, Tuple
+
+ROOT = dirname(dirname(abspath(__file__)))
+# milliseconds each module may take to import, including its own imports
+BUDGETS = {
+    # the entry point, which imports only the modules of the mode run
+    "git_stats_imgs": 10.0,
+    # a single run of the default mode, e.g. by cron
+    "src.generate_images": 250.0,
+}
+# imported by the modules with budgets only when requests are made, not when
+# e.g. rendering an artifact; the badge server needs aiohttp to start
+DEFERRED = ("aiohttp", "requests")
+DEFAULT_RUNS = 10
+NUM_SLOWEST = 5
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Imports the module in a fresh interpreter
+    :return: name, own microseconds and cumulative microseconds of each module
+    imported, in the order they finished importing, without those imported by
+    the interpreter's own startup
+    """
+    process = run(
+        [executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times.append((name.strip(), int(own), int(cumulative)))
+        if name.strip() == "site":
+            times.clear()
+    return times
+
+
+def main() -> None:
+    options = dict(
+        arg[2:].partition("=")[::2] for arg in argv[1:] if arg.startswith("--")
+    )
+    names = [arg for arg in argv[1:] if not arg.startswith("--")]
+    modules = names[0].split(",") if names else list(BUDGETS)
+    runs = int(options.get("runs", DEFAULT_RUNS))
+
+    failures: List[str] = []
+    for module in modules:
+        totals = []
+        own_times: Dict[str, List[int]] = dict()
+        for _ in range(runs):
+            times = import_times(module)
+            totals.append(next(total for name, _, total in times if name == module))
+            for name, own, _ in times:
+                own_times.setdefault(name, []).append(own)
+        total = median(totals) / 1000
+        print(f"{module}: {total:0.1f}ms (median of {runs} runs)")
+        slowest = sorted(
+            own_times.items(), key=lambda item: median(item[1]), reverse=True
+        )[:NUM_SLOWEST]
+        for name, own in slowest:
+            print(f"  {name}: {median(own) / 1000:0.1f}ms")
+
+        if module not in BUDGETS:
+            continue
+        if total > BUDGETS[module]:
+            failures.append(
+                f"{module}: {total:0.1f}ms exceeds {BUDGETS[module]:0.1f}ms"
+            )
+        deferred = sorted({name.split(".")[0] for name in own_times} & set(DEFERRED))
+        if deferred:
+            failures.append(f"{module}: imports {', '.join(deferred)} eagerly")
+
+    for failure in failures:
+        print(f"Regression: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+"""
+Fetches a synthetic user's stats from the mock GitHub API with many
+concurrent StatsClient calls in one event loop, checking each returns the
+same stats, that environment variables are not read, that no db file is
+written and that contributors counted approximately are estimated with a
+sketch, and prints the results for testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import gather, run
+from os import chdir, environ, getcwd, listdir
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from src.hyperloglog import APPROX, HyperLogLog
+from src.stats_client import StatsClient, StatsConfig
+from test.mock_github_server import HOST, USERNAME, MockGitHub, SyntheticData
+
+NUM_REPOS = 20
+NUM_CALLS = 200
+
+
+async def main() -> None:
+    """
+    Used for testing
+    """
+    mock = MockGitHub(SyntheticData(NUM_REPOS))
+    runner = web.AppRunner(mock.app())
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    api_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+
+    # options of the command line must not apply to the library
+    environ["EXCLUDED_LANGS"] = "Python"
+    cwd = getcwd()
+    try:
+        with TemporaryDirectory() as temp_dir:
+            chdir(temp_dir)
+            async with ClientSession() as session:
+                client = StatsClient(
+                    StatsConfig(api_url=api_url, exclude_langs=("Go",)), session
+                )
+                start = perf_counter()
+                results = await gather(
+                    # a token per call, as of users of a service, so each call
+                    # has the rate limits of a token to itself
+                    *[client.fetch(USERNAME, f"token-{i}") for i in range(NUM_CALLS)]
+                )
+                elapsed = perf_counter() - start
+                languages = await client.fetch(
+                    USERNAME, "mock-token", fields=["languages"]
+                )
+                approx = await StatsClient(
+                    StatsConfig(api_url=api_url, count_mode=APPROX), session
+                ).fetch(USERNAME, "mock-token", fields=["contributors"])
+            assert not listdir(temp_dir), "files were written"
+    finally:
+        chdir(cwd)
+        del environ["EXCLUDED_LANGS"]
+        await runner.cleanup()
+
+    stats = results[0]
+    assert all(result == stats for result in results), "results differ"
+    assert "Python" in stats.languages and "Go" not in stats.languages
+    assert stats.excluded_languages == ["Go"]
+    assert languages.languages == stats.languages and languages.views is None
+    assert isinstance(approx.contributors, HyperLogLog)
+    assert abs(len(approx.contributors) - len(stats.contributors)) <= 1
+    requests = sum(
+        sum(endpoint.statuses.values())
+        for endpoint in client.metrics.endpoints.values()
+    )
+    print(
+        f"{NUM_CALLS} concurrent calls in {elapsed:0.2f}s "
+        f"({NUM_CALLS / elapsed:0.1f} calls/s, {requests:,} requests): "
+        f"{len(stats.repos)} repos, {stats.lines_changed} lines changed, "
+        f"{len(stats.languages)} languages; results match"
+    )
+
+
+if __name__ == "__main__":
+    run(main())
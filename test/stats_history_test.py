@@ -0,0 +1,206 @@
+#!/usr/bin/python3
+
+"""
+Checks samples appended to a stats history are read back as written, that a
+sample partly written by an interrupted run is ignored and overwritten, and
+that years of daily samples load and render into the trends image within
+budget, then records the stats of a synthetic user fetched from the mock
+GitHub API over two runs and renders their trends, printing the results for
+testing, e.g.
+python -m test.stats_history_test
+python -m test.stats_history_test 36500
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import run
+from math import isnan
+from os.path import getsize, isfile, join
+from random import Random
+from sys import argv
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict, Tuple
+
+from src.db.db import GitRepoStatsDB
+from src.env_vars import EnvironmentVariables
+from src.generate_images import (
+    TEMPLATE_PATH,
+    TRENDS_FILE_NAME,
+    GenerateImages,
+    trends_values,
+)
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_history import METRICS, StatsHistory
+from src.stats_plan import StatsPlan
+from src.svg_template import SvgTemplate
+from test.mock_github_server import HOST, USERNAME, MockGitHub, SyntheticData
+
+NUM_SAMPLES = 3650  # ten years of daily runs
+DAY = 24 * 60 * 60
+START = 1500000000.0
+BUDGET = 50.0  # milliseconds to load and render the trends of the samples
+NUM_REPOS = 50
+SEED = 42
+
+
+def synthetic_sample(rand: Random, day: int) -> Tuple[Dict, Dict]:
+    """
+    :return: metrics and languages of a day, growing over the days, with
+    languages used only in later days and some metrics not computed
+    """
+    metrics = {
+        name: float(day * (i + 1) + rand.randrange(100))
+        for i, name in enumerate(METRICS)
+    }
+    if day % 7 == 0:
+        # e.g. a run planned with only the languages image
+        del metrics["views"]
+    languages = {"Python": 60.0 - day / 365, "Shell": 10.0}
+    if day >= NUM_SAMPLES // 2:
+        languages["Rust"] = day / 365
+    return metrics, languages
+
+
+def check_samples(path: str, num_samples: int) -> None:
+    """
+    Checks the samples of the history are read back as written, and times
+    loading and rendering them
+    """
+    rand = Random(SEED)
+    history = StatsHistory(path)
+    samples = [synthetic_sample(rand, day) for day in range(num_samples)]
+    for day, (metrics, languages) in enumerate(samples):
+        history.append(metrics, languages, START + day * DAY)
+
+    begin = perf_counter()
+    series = history.read()
+    loaded = perf_counter()
+    values = trends_values(series, START + num_samples * DAY)
+    SvgTemplate.load(f"{TEMPLATE_PATH}{TRENDS_FILE_NAME}").render(values)
+    rendered = perf_counter()
+
+    assert len(series) == num_samples, "samples differ"
+    for day in (0, 7, num_samples // 2, num_samples - 1):
+        metrics, languages = samples[day]
+        assert series.timestamps[day] == START + day * DAY
+        for name in METRICS:
+            value = series.metrics[name][day]
+            assert value == metrics[name] if name in metrics else isnan(value)
+        for name in series.languages:
+            # percents are stored as 32-bit floats
+            percent = series.language(name)[day]
+            assert abs(percent - languages.get(name, 0)) < 1e-4, name
+    assert series.languages == ["Python", "Shell", "Rust"]
+    assert sorted(series.latest_languages()) == ["Python", "Rust", "Shell"]
+
+    total = (rendered - begin) * 1000
+    print(
+        f"{num_samples:,} samples ({getsize(path) / 1024:0.0f} KB) loaded in "
+        f"{(loaded - begin) * 1000:0.1f}ms, rendered in "
+        f"{(rendered - loaded) * 1000:0.1f}ms"
+    )
+    if num_samples == NUM_SAMPLES:
+        assert total <= BUDGET, f"{total:0.1f}ms exceeds {BUDGET:0.1f}ms"
+
+
+def check_interrupted(path: str) -> None:
+    """
+    Checks a sample partly written by an interrupted run is ignored, then
+    overwritten by the next sample
+    """
+    history = StatsHistory(path)
+    history.append({"stargazers": 1}, {"Python": 100.0}, START)
+    history.append({"stargazers": 2}, {"Go": 100.0}, START + DAY)
+    with open(path, "r+b") as f:
+        f.truncate(getsize(path) - 3)
+    assert len(history.read()) == 1, "partly written sample read"
+
+    history.append({"stargazers": 3}, {"Go": 100.0}, START + 2 * DAY)
+    series = history.read()
+    assert list(series.metrics["stargazers"]) == [1, 3]
+    # the name of the language of the partly written sample was complete
+    assert series.languages == ["Python", "Go"]
+    assert series.latest_languages() == {"Go": 100.0}
+    print("Partly written sample ignored and overwritten")
+
+
+async def check_runs(directory: str) -> None:
+    """
+    Records the stats of two runs of a synthetic user and renders the trends
+    """
+    runner = web.AppRunner(MockGitHub(SyntheticData(NUM_REPOS)).app())
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    api_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+    history = StatsHistory(join(directory, "history", "stats_history.bin"))
+
+    try:
+        async with ClientSession() as session:
+            for _ in range(2):
+                stats = GitHubRepoStats(
+                    environment_vars=EnvironmentVariables(
+                        username=USERNAME,
+                        access_token="mock-token",
+                        db=GitRepoStatsDB(in_memory=True),
+                    ),
+                    session=session,
+                    queries=GitHubApiQueries(
+                        username=USERNAME,
+                        access_token="mock-token",
+                        session=session,
+                        api_url=api_url,
+                    ),
+                )
+                images = GenerateImages(
+                    stats=stats,
+                    username=USERNAME,
+                    output_dir=directory,
+                    history=history,
+                )
+                await images.record_history()
+                await images.render()
+            # a run without any stats recorded does not append a sample
+            await GenerateImages(
+                stats=stats,
+                username=USERNAME,
+                output_dir=directory,
+                plan=StatsPlan.parse("trends"),
+                history=history,
+            ).record_history()
+            # recorded, but not rendered, if the images selected leave it out
+            await GenerateImages(
+                stats=stats,
+                username=USERNAME,
+                output_dir=join(directory, "languages"),
+                plan=StatsPlan.parse("languages"),
+                history=history,
+            ).render()
+    finally:
+        await runner.cleanup()
+
+    assert not isfile(join(directory, "languages", TRENDS_FILE_NAME))
+    series = history.read()
+    assert len(series) == 2, "runs not recorded, or empty samples recorded"
+    assert series.metrics["stargazers"][-1] == await stats.stargazers
+    assert series.metrics["repos"][-1] == len(await stats.repos)
+    with open(join(directory, TRENDS_FILE_NAME)) as f:
+        trends = f.read()
+    assert "{{" not in trends and "<polyline" in trends, "trends not rendered"
+    print(f"Recorded 2 runs and rendered {TRENDS_FILE_NAME} ({len(trends):,} bytes)")
+
+
+def main() -> None:
+    """
+    Used for testing
+    """
+    num_samples = int(argv[1]) if len(argv) > 1 else NUM_SAMPLES
+    with TemporaryDirectory() as directory:
+        check_samples(join(directory, "samples.bin"), num_samples)
+        check_interrupted(join(directory, "interrupted.bin"))
+        run(check_runs(directory))
+
+
+if __name__ == "__main__":
+    main()
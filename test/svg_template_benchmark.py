@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+"""
+Benchmarks rendering badges from precompiled SVG templates
+"""
+
+from re import sub
+from sys import argv
+from time import perf_counter
+
+from src.generate_images import TEMPLATE_PATH, OVERVIEW_FILE_NAME, LANGUAGES_FILE_NAME
+from src.svg_template import SvgTemplate, THEMES
+
+NUM_BADGES = 10000
+
+OVERVIEW_VALUES = {
+    "name": "The Octocat's",
+    "views": "12,345",
+    "forks_and_stars": "321     |   12.34K",
+    "contributions": "4,567",
+    "lines_changed_label": "Lines of code changes",
+    "lines_changed": "1,234,567",
+    "avg_contribution_percent_label": "Avg contributions [weighted]",
+    "avg_contribution_percent": "51.23% [78.90%]",
+    "repos": "123 [45.6%]",
+    "collaborators_and_contributors": "89",
+    "views_from_date": "Repo views (as of 2024-01-01)",
+}
+LANGUAGES_VALUES = {
+    "lang_count": "12 [+3]",
+    "progress": '<span class="progress-item"></span>' * 12,
+    "lang_list": "<li><span class='lang'>Python</span></li>" * 12,
+}
+
+
+def render_legacy(path: str, values: dict, theme: str) -> str:
+    """
+    The previous approach: read the template and substitute each slot in turn
+    """
+    with open(path, "r") as f:
+        output = f.read()
+    for name, value in {**THEMES[theme], **values}.items():
+        output = sub("{{ " + name + " }}", value, output)
+    return output
+
+
+def main() -> None:
+    num_badges = int(argv[1]) if len(argv) > 1 else NUM_BADGES
+    themes = list(THEMES)
+    templates = [
+        (TEMPLATE_PATH + OVERVIEW_FILE_NAME, OVERVIEW_VALUES),
+        (TEMPLATE_PATH + LANGUAGES_FILE_NAME, LANGUAGES_VALUES),
+    ]
+    jobs = [
+        (*templates[i % len(templates)], themes[i % len(themes)])
+        for i in range(num_badges)
+    ]
+
+    start = perf_counter()
+    rendered = [
+        SvgTemplate.load(path).render(values, theme) for path, values, theme in jobs
+    ]
+    compiled_time = perf_counter() - start
+
+    start = perf_counter()
+    legacy = [render_legacy(path, values, theme) for path, values, theme in jobs]
+    legacy_time = perf_counter() - start
+
+    assert rendered == legacy, "compiled and legacy renders differ"
+
+    print(f"Badges: {num_badges:,} across {len(themes)} themes")
+    print(
+        f"Compiled templates: {compiled_time * 1000:0.1f} ms "
+        f"({num_badges / compiled_time:,.0f} badges/s)"
+    )
+    print(
+        f"Legacy re.sub per slot: {legacy_time * 1000:0.1f} ms "
+        f"({num_badges / legacy_time:,.0f} badges/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+
+"""
+Checks the token pool selects the token with the most remaining requests,
+rests tokens hitting primary or secondary rate limits, pins the requests of
+a repo to a token with access to it and falls back on other tokens when one
+is denied access, then spreads requests of the REST and GraphQL APIs over
+the tokens' rate limits of the mock GitHub API, and prints the results for
+testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import gather, run
+from time import time
+from typing import Dict
+
+from src.github_api_queries import GitHubApiQueries
+from src.token_pool import CORE, DEFAULT_RETRY_AFTER, GRAPHQL, TokenPool
+from test.mock_github_server import HOST, MockGitHub, SyntheticData
+
+TOKENS = ["primary", "second", "third"]
+RATE_LIMIT = 40  # requests per token of each API of the mock API
+NUM_REQUESTS = 60  # of each API, more than one token's rate limit allows
+REPO = "octo/private"  # repo only the second token has access to
+
+
+def limits(remaining: int, **headers: str) -> Dict[str, str]:
+    """
+    :return: rate limit headers of a response reporting the remaining requests
+    """
+    return {"X-RateLimit-Remaining": str(remaining), **headers}
+
+
+def check_selection() -> None:
+    """
+    Checks tokens are selected by their remaining requests, and then by the
+    fewest requests made with them
+    """
+    pool = TokenPool(TOKENS)
+    # tokens not yet answered are used in turn
+    assert [pool.select(CORE) for _ in TOKENS] == TOKENS, "unanswered tokens"
+    pool.record("primary", CORE, 200, limits(100))
+    pool.record("second", CORE, 200, limits(4000))
+    pool.record("third", CORE, 200, limits(2000))
+    assert pool.select(CORE) == "second", "most remaining not selected"
+    # the remaining requests are of each resource
+    pool.record("second", GRAPHQL, 200, limits(10))
+    assert pool.select(GRAPHQL) in ("primary", "third")
+    assert pool.select(CORE) == "second"
+    print("Tokens selected by remaining requests")
+
+
+def check_resting() -> None:
+    """
+    Checks tokens hitting primary or secondary rate limits are rested, and
+    forbidden responses without a rate limit are not
+    """
+    now = time()
+    pool = TokenPool(TOKENS)
+    reset = str(int(now) + 3600)
+    assert pool.record("primary", CORE, 403, limits(0, **{"X-RateLimit-Reset": reset}))
+    assert pool.record("second", CORE, 403, limits(900, **{"Retry-After": "30"}))
+    assert not pool.record("third", CORE, 403, limits(900)), "denied as limited"
+    assert pool.has_available(set()) and not pool.has_available({"third"})
+    assert [pool.select(CORE) for _ in range(3)] == ["third"] * 3
+
+    # a 429 is a rate limit, with or without a time to wait
+    assert pool.record("third", CORE, 429, limits(900))
+    assert not pool.has_available(set())
+    # with all tokens resting, the one available soonest is used
+    assert pool.select(CORE) == "second", "soonest available not selected"
+    report = pool.report()
+    assert "1 rate limited" in report and "3 rate limited" not in report
+    print(
+        f"Tokens rested after 403 and 429 responses, 429 without Retry-After "
+        f"for {DEFAULT_RETRY_AFTER}s"
+    )
+
+
+def check_pins() -> None:
+    """
+    Checks the requests of a repo are pinned to the token found to have
+    access to it, unless it is resting, and that denied tokens are skipped
+    """
+    pool = TokenPool(TOKENS)
+    pool.record("primary", CORE, 200, limits(4000))
+    pool.record("second", CORE, 200, limits(100))
+    pool.record("third", CORE, 200, limits(50))
+    pool.pin(REPO, "second")
+    assert pool.select(CORE, REPO) == "second", "pinned token not selected"
+    assert pool.select(CORE, "octo/public") == "primary"
+
+    assert pool.select(CORE, "octo/other", {"primary", "second"}) == "third"
+    assert pool.select(CORE, "octo/other", set(TOKENS)) is None, "denied selected"
+
+    pool.record("second", CORE, 429, limits(100))
+    assert pool.select(CORE, REPO) != "second", "resting pinned token selected"
+    print("Requests of repos pinned, denied tokens skipped")
+
+
+def mock_app(requests: Dict[str, int]) -> web.Application:
+    """
+    :param requests: number of requests made with each token, counted by the
+    app
+    :return: app answering requests of the repo with 404 unless made with the
+    second token, and the first request of the primary token to any other
+    repo with a 429 without a time to wait
+    """
+
+    async def repo(request: web.Request) -> web.Response:
+        token = request.headers["Authorization"].split()[-1]
+        requests[token] = requests.get(token, 0) + 1
+        name = f"{request.match_info['owner']}/{request.match_info['name']}"
+        if name == REPO and token != "second":
+            return web.json_response({"message": "Not Found"}, status=404)
+        if name != REPO and token == "primary" and requests[token] == 1:
+            return web.json_response(
+                {"message": "Too many requests"}, status=429, headers=limits(900)
+            )
+        return web.json_response({"full_name": name}, headers=limits(900))
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{name}", repo)
+    return app
+
+
+async def check_queries() -> None:
+    """
+    Checks queries fall back on the token with access to a repo and pin it,
+    retry a 429 with another token, and spread requests of both APIs over the
+    rate limits of the tokens, retrying queries of a token that used up its
+    rate limit with another
+    """
+    requests: Dict[str, int] = dict()
+    runner = web.AppRunner(mock_app(requests))
+    await runner.setup()
+    await web.TCPSite(runner, HOST, 0).start()
+    app_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+
+    data = SyntheticData(10)
+    mock = MockGitHub(data, rate_limit=RATE_LIMIT)
+    mock_runner = web.AppRunner(mock.app())
+    await mock_runner.setup()
+    await web.TCPSite(mock_runner, HOST, 0).start()
+    api_url = f"http://{HOST}:{mock_runner.addresses[0][1]}/"
+
+    try:
+        async with ClientSession() as session:
+
+            def new_queries(url: str) -> GitHubApiQueries:
+                return GitHubApiQueries(
+                    username="octocat",
+                    access_token=TOKENS[0],
+                    session=session,
+                    tokens=TokenPool(TOKENS),
+                    api_url=url,
+                    retry_delay=0,
+                )
+
+            queries = new_queries(app_url)
+            result = await queries.query_rest("/repos/octo/public")
+            assert result == {"full_name": "octo/public"}, "429 returned as data"
+            assert await queries.query_rest(f"/repos/{REPO}") == {"full_name": REPO}
+            denied = sum(requests.values())
+            for _ in range(5):
+                assert await queries.query_rest(f"/repos/{REPO}") == {"full_name": REPO}
+            assert sum(requests.values()) == denied + 5, "pinned token not used"
+
+            queries = new_queries(api_url)
+            rest = await gather(
+                *[
+                    queries.query_rest(f"/repos/{repo}")
+                    for repo in list(data.repos) * (NUM_REQUESTS // len(data.repos))
+                ]
+            )
+            # a token whose GraphQL rate limit was used up, e.g. by another run
+            mock.used[f"Bearer {TOKENS[1]}"]["graphql"] = RATE_LIMIT
+            graphql = [
+                await queries.query(GitHubApiQueries.org_repos_overview("mock-org"))
+                for _ in range(NUM_REQUESTS)
+            ]
+            viewer = await queries.query(GitHubApiQueries.repos_overview())
+    finally:
+        await runner.cleanup()
+        await mock_runner.cleanup()
+
+    assert all("message" not in result for result in rest), "REST rate limited"
+    assert all("data" in result for result in graphql), "GraphQL rate limited"
+    assert "data" in viewer, "viewer query failed"
+    used = {token.split()[-1]: counts for token, counts in mock.used.items()}
+    assert sum(counts["core"] for counts in used.values()) == NUM_REQUESTS
+    assert all(counts["graphql"] <= RATE_LIMIT for counts in used.values())
+    assert queries.tokens.report().count(" 1 rate limited") == 1, "not rotated"
+    print(
+        f"Denied and rate limited requests retried with other tokens; "
+        f"{NUM_REQUESTS} REST and {NUM_REQUESTS + 1} GraphQL requests spread "
+        f"over tokens of {RATE_LIMIT} requests: {used}"
+    )
+
+
+def main() -> None:
+    """
+    Used for testing
+    """
+    check_selection()
+    check_resting()
+    check_pins()
+    run(check_queries())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+
+"""
+Applies the recorded webhook payloads in test/fixtures/webhooks to saved
+stats, checking the changes each makes, and prints the results for testing
+"""
+
+from hashlib import sha256
+from hmac import new as new_hmac
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from typing import Any, Dict
+
+from src.env_vars import EnvironmentVariables
+from src.github_repo_stats import GitHubRepoStats
+from src.webhooks import WebhookEvent, verify_signature
+
+FIXTURES_DIR = join(dirname(__file__), "fixtures", "webhooks")
+USERNAME = "octocat"
+REPOS = ["octocat/Hello-World", "octocat/Spoon-Knife"]
+
+# saved stats of the last run, as exported by GitHubRepoStats.export_state
+STATE: Dict[str, Any] = {
+    "total_contributions": 1234,
+    "repo_lines_changed": {
+        repo: {
+            "additions": 100,
+            "deletions": 10,
+            "commits": 5,
+            "others_changes": 20,
+            "contributors": [USERNAME, "hubot"],
+            "other_authors": ["hubot"],
+            "authors": {USERNAME: [100, 10, 5]},
+        }
+        for repo in REPOS
+    },
+    "repo_collaborators": {repo: [USERNAME, "hubot"] for repo in REPOS},
+    "repo_views": {},
+    "listing": {
+        "name": "The Octocat",
+        "stargazers": 80 + 40,
+        "forks": 9 + 4,
+        "languages": {"Python": {"size": 1000, "occurrences": 2, "prop": 100.0}},
+        "excluded_languages": [],
+        "repos": REPOS,
+        "empty_repos": [],
+        "repo_counts": {"octocat/Hello-World": [80, 9], "octocat/Spoon-Knife": [40, 4]},
+    },
+}
+
+# changes expected from each fixture: stargazers, forks, pull requests and
+# issues counted, repos with lines changed invalidated, whether total
+# contributions and the listing are invalidated
+EXPECTED = {
+    "push": (120, 13, 0, 0, {"octocat/Hello-World"}, True, False),
+    "push_new_repo": (120, 13, 0, 0, set(), True, True),
+    "pull_request_opened": (120, 13, 1, 0, set(), True, False),
+    "pull_request_merged": (120, 13, 0, 0, {"octocat/Hello-World"}, False, False),
+    "issues_opened": (120, 13, 0, 1, set(), True, False),
+    "star_created": (121, 13, 0, 0, set(), False, False),
+    "fork": (121, 14, 0, 0, set(), False, False),
+    "ping": (120, 13, 0, 0, set(), False, False),
+}
+
+
+def main() -> None:
+    """
+    Used for testing
+    """
+    with TemporaryDirectory() as temp_dir:
+        for name, expected in EXPECTED.items():
+            environment_vars = EnvironmentVariables(
+                username=USERNAME,
+                access_token="",
+                db_path=join(temp_dir, f"{name}_db.json"),
+            )
+            stats = GitHubRepoStats(environment_vars=environment_vars, session=None)
+            stats.import_state(STATE)
+
+            event = WebhookEvent.load(join(FIXTURES_DIR, f"{name}.json"))
+            is_changed = event.apply(stats)
+
+            has_listing = stats.has_listing()
+            result = (
+                stats._stargazers if has_listing else 120,
+                stats._forks if has_listing else 13,
+                environment_vars.pull_requests_count,
+                environment_vars.issues_count,
+                set(REPOS) - set(stats._repo_lines_changed),
+                stats._total_contributions is None,
+                not has_listing,
+            )
+            assert result == expected, f"{name}: {result} != {expected}"
+            assert is_changed == (name != "ping"), name
+            action = f" {event.action}" if event.action else ""
+            print(f"{name}: {event.event}{action} -> {result}")
+
+        # a push to a listed repo after one invalidated the listing
+        stats = GitHubRepoStats(
+            environment_vars=EnvironmentVariables(
+                username=USERNAME,
+                access_token="",
+                db_path=join(temp_dir, "sequence_db.json"),
+            ),
+            session=None,
+        )
+        stats.import_state(STATE)
+        for name in ("push_new_repo", "push"):
+            WebhookEvent.load(join(FIXTURES_DIR, f"{name}.json")).apply(stats)
+        assert not stats.has_listing(), "listing not invalidated"
+        invalidated = set(REPOS) - set(stats._repo_lines_changed)
+        assert invalidated == {"octocat/Hello-World"}, invalidated
+        print(f"push_new_repo, push: -> {invalidated}")
+
+    secret = "It's a Secret to Everybody"
+    body = b"Hello, World!"
+    signature = "sha256=" + new_hmac(secret.encode(), body, sha256).hexdigest()
+    assert verify_signature(secret, body, signature)
+    assert not verify_signature(secret, body + b"!", signature)
+    assert not verify_signature(secret, body, None)
+    print("signature: verified")
+
+
+if __name__ == "__main__":
+    main()
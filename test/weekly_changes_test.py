@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+
+"""
+Fetches a synthetic user's stats from the mock GitHub API, then checks the
+stats of windows of weeks summarized from the stored weekly changes: that
+calendar years add up to the lifetime lines changed, that a window of all
+weeks matches the lifetime stats, and that the store is carried over by
+saved state and stats artifacts, and prints the results for testing
+"""
+
+from aiohttp import ClientSession, web
+from asyncio import run
+from datetime import date
+from json import dumps, loads
+from time import perf_counter
+
+from src.db.db import GitRepoStatsDB
+from src.env_vars import EnvironmentVariables
+from src.github_api_queries import GitHubApiQueries
+from src.github_repo_stats import GitHubRepoStats
+from src.stats_artifact import StatsArtifact
+from src.stats_plan import FIELDS
+from src.weekly_changes import StatsWindow
+from test.mock_github_server import HOST, USERNAME, MockGitHub, SyntheticData
+
+NUM_REPOS = 200
+# the weeks of the synthetic contributor stats start in November 2023
+YEARS = (2023, 2024)
+
+
+def new_stats(session: ClientSession, api_url: str) -> GitHubRepoStats:
+    """
+    :return: stats of the synthetic user, with a db held in memory
+    """
+    return GitHubRepoStats(
+        environment_vars=EnvironmentVariables(
+            username=USERNAME,
+            access_token="mock-token",
+            db=GitRepoStatsDB(in_memory=True),
+        ),
+        session=session,
+        queries=GitHubApiQueries(
+            username=USERNAME,
+            access_token="mock-token",
+            session=session,
+            api_url=api_url,
+        ),
+        weekly_changes=True,
+    )
+
+
+async def main() -> None:
+    """
+    Used for testing
+    """
+    runner = web.AppRunner(MockGitHub(SyntheticData(NUM_REPOS)).app())
+    await runner.setup()
+    site = web.TCPSite(runner, HOST, 0)
+    await site.start()
+    api_url = f"http://{HOST}:{runner.addresses[0][1]}/"
+
+    try:
+        async with ClientSession() as session:
+            stats = new_stats(session, api_url)
+            additions, deletions = await stats.lines_changed
+            weekly_changes = await stats.weekly_changes
+            repos = await stats.repos
+            state = loads(dumps(stats.export_state()))
+            # the weekly changes are only collected if selected
+            assert not (await StatsArtifact.from_stats(stats)).has_field(
+                "weekly_changes"
+            )
+            artifact = await StatsArtifact.from_stats(stats, fields=FIELDS)
+            artifact = StatsArtifact(loads(artifact.to_json()))
+    finally:
+        await runner.cleanup()
+
+    start = perf_counter()
+    years = [weekly_changes.summarize(StatsWindow(year=y), repos) for y in YEARS]
+    elapsed = perf_counter() - start
+    assert sum(year.additions for year in years) == additions, "additions differ"
+    assert sum(year.deletions for year in years) == deletions, "deletions differ"
+
+    all_weeks = StatsWindow(days=(date.today() - date(2023, 1, 1)).days)
+    summary = weekly_changes.summarize(all_weeks, repos)
+    assert (summary.additions, summary.deletions) == (additions, deletions)
+    assert summary.avg_contribution_percent == await stats.avg_contribution_percent
+    assert (
+        summary.avg_contribution_percent_weighted
+        == await stats.avg_contribution_percent_weighted
+    )
+    assert weekly_changes.summarize(StatsWindow(year=2022), repos).additions == 0
+
+    # summarized again without fetching, from the saved state and artifact
+    restored = new_stats(None, api_url)
+    restored.import_state(state)
+    assert (await restored.weekly_changes).summarize(all_weeks, repos) == summary
+    loaded = await artifact.weekly_changes
+    assert loaded.summarize(all_weeks, await artifact.repos) == summary
+
+    for spec in ("30", "0d", "x2024", "20245"):
+        try:
+            StatsWindow.parse(spec)
+            raise AssertionError(f"invalid window {spec} parsed")
+        except ValueError:
+            pass
+
+    for year, result in zip(YEARS, years):
+        print(
+            f"{year}: +{result.additions:,} -{result.deletions:,} lines, "
+            f"{result.avg_contribution_percent} "
+            f"[{result.avg_contribution_percent_weighted}]"
+        )
+    print(
+        f"{len(weekly_changes.repos)} repos summarized per year in "
+        f"{elapsed / len(YEARS) * 1000:0.2f}ms; windows match lifetime stats, "
+        f"saved state and artifact"
+    )
+
+
+if __name__ == "__main__":
+    run(main())